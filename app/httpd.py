@@ -0,0 +1,67 @@
+import logging
+import threading
+import http.server
+
+# Largest request body read; Sonarr's webhook events are a few KB
+MAX_BODY = 256 * 1024
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    # Filled in by serve(): {(method, path): handler}
+    routes = {}
+
+    def handle_request(self, method):
+        path = self.path.split('?', 1)[0]
+        handler = self.routes.get((method, path))
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        body_read = False
+        if handler is None:
+            status, content_type, body = 404, 'text/plain', 'Not found\n'
+        elif length < 0:
+            status, content_type, body = 400, 'text/plain', 'Invalid Content-Length\n'
+        elif length > MAX_BODY:
+            status, content_type, body = 413, 'text/plain', 'Request body too large\n'
+        else:
+            body_read = True
+            try:
+                status, content_type, body = handler(self.headers, self.rfile.read(length) if length else b'')
+            except Exception as e:
+                logging.getLogger('stream_harvestarr').error('HTTP {} {} failed: {}'.format(method, path, e))
+                status, content_type, body = 500, 'text/plain', 'Internal error\n'
+        data = body.encode('utf-8')
+        if length and not body_read:
+            # The body was never read, so the connection can't be reused
+            self.close_connection = True
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def log_message(self, format, *args):
+        logging.getLogger('stream_harvestarr').debug('HTTP {} - {}'.format(self.address_string(), format % args))
+
+
+def serve(host, port, routes):
+    """Serve ``routes`` from a background thread for the life of the process
+    - ``routes``: {(method, path): handler}; a handler takes the request
+      headers and body and returns ``(status, content_type, body)``
+
+    returns:
+        ``ThreadingHTTPServer``: already serving
+    """
+    handler = type('Handler', (_Handler,), {'routes': dict(routes)})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='httpd', daemon=True)
+    thread.start()
+    return server
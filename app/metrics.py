@@ -0,0 +1,136 @@
+import time
+import threading
+import contextlib
+from throttle import domain_of
+
+
+# Histogram bucket upper bounds, in seconds
+FAST_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SLOW_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+# name: (type, help, buckets)
+DEFINITIONS = {
+    'stream_harvestarr_cycles_total': (
+        'counter', 'Harvest cycles run', None),
+    'stream_harvestarr_cycle_duration_seconds': (
+        'histogram', 'Wall time of a harvest cycle', SLOW_BUCKETS),
+    'stream_harvestarr_last_cycle_duration_seconds': (
+        'gauge', 'Wall time of the most recent harvest cycle', None),
+    'stream_harvestarr_phase_duration_seconds': (
+        'histogram', 'Wall time of each phase of a harvest cycle', SLOW_BUCKETS),
+    'stream_harvestarr_sonarr_requests_total': (
+        'counter', 'Sonarr API requests by method and HTTP status', None),
+    'stream_harvestarr_sonarr_request_duration_seconds': (
+        'histogram', 'Sonarr API request latency until the response headers arrive', FAST_BUCKETS),
+    'stream_harvestarr_crawl_duration_seconds': (
+        'gauge', 'Wall time of the latest crawl of a playlist', None),
+    'stream_harvestarr_crawl_entries': (
+        'gauge', 'Entries read by the latest crawl of a playlist', None),
+    'stream_harvestarr_episodes_total': (
+        'counter', 'Wanted episodes by search or download result', None),
+    'stream_harvestarr_downloaded_bytes_total': (
+        'counter', 'Bytes downloaded by yt-dlp', None),
+    'stream_harvestarr_download_throughput_bytes_per_second': (
+        'gauge', 'Average speed of the latest finished download per site', None),
+    'stream_harvestarr_rate_limits_total': (
+        'counter', 'Rate limits reported by each site', None),
+    'stream_harvestarr_rate_limit_backoff_seconds': (
+        'gauge', 'Current rate limit backoff per site; 0 once recovered', None),
+}
+
+
+class Metrics(object):
+    """Process-wide counters, gauges and histograms.
+
+    Only the names in DEFINITIONS are accepted, so a typo fails loudly
+    instead of exporting a second series. Rendered in the Prometheus text
+    exposition format by render().
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # {name: {labels: value}}; histograms hold [bucket counts..., sum, count]
+        self.values = {name: {} for name in DEFINITIONS}
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[name][key] = value
+
+    def observe(self, name, value, **labels):
+        buckets = DEFINITIONS[name][2]
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values[name]
+            if key not in series:
+                series[key] = [0] * (len(buckets) + 2)
+            counts = series[key]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """Observe the wall time of a ``with`` block in histogram ``name``"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(name, time.time() - start, **labels)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for name, (kind, help_text, buckets) in DEFINITIONS.items():
+                lines.append('# HELP {} {}'.format(name, help_text))
+                lines.append('# TYPE {} {}'.format(name, kind))
+                for key, value in sorted(self.values[name].items()):
+                    if kind != 'histogram':
+                        lines.append('{}{} {}'.format(name, format_labels(key), value))
+                        continue
+                    for bound, count in zip(buckets, value):
+                        lines.append('{}_bucket{} {}'.format(name, format_labels(key + (('le', bound),)), count))
+                    lines.append('{}_bucket{} {}'.format(name, format_labels(key + (('le', '+Inf'),)), value[-1]))
+                    lines.append('{}_sum{} {}'.format(name, format_labels(key), value[-2]))
+                    lines.append('{}_count{} {}'.format(name, format_labels(key), value[-1]))
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(key):
+    if not key:
+        return ''
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(label, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for label, value in key
+    ))
+
+
+metrics = Metrics()
+
+
+def ytdl_metrics_hook(d):
+    """yt-dlp progress hook counting finished downloads' bytes and speed"""
+    if d['status'] != 'finished':
+        return
+    size = d.get('total_bytes') or d.get('downloaded_bytes') or 0
+    metrics.inc('stream_harvestarr_downloaded_bytes_total', size)
+    elapsed = d.get('elapsed')
+    if size and elapsed:
+        domain = domain_of(d.get('info_dict', {}).get('webpage_url') or '')
+        metrics.set('stream_harvestarr_download_throughput_bytes_per_second', size / elapsed, domain=domain)
+
+
+def sonarr_metrics_hook(res, *args, **kwargs):
+    """requests response hook counting and timing every Sonarr call"""
+    method = res.request.method
+    metrics.inc('stream_harvestarr_sonarr_requests_total', method=method, status=res.status_code)
+    metrics.observe('stream_harvestarr_sonarr_request_duration_seconds', res.elapsed.total_seconds(), method=method)
@@ -0,0 +1,201 @@
+import re
+from datetime import datetime
+from rapidfuzz import fuzz, process, utils as fuzz_utils
+from utils import title_pattern
+
+
+# Redirects (url/url_transparent results) followed before giving up
+MAX_REDIRECTS = 5
+# A fuzzy match must beat the next different title by this many points
+FUZZY_MARGIN = 5
+# ... and be uploaded within this many days of the episode's air date
+FUZZY_MAX_DAYS = 3
+
+NUMBER = re.compile(r'\d+')
+
+
+def follow_redirects(ydl, result):
+    """Resolve a top-level ``url``/``url_transparent`` result.
+
+    With ``process=False`` yt-dlp hands back redirects as-is instead of
+    following them: YouTube ``watch?list=`` URLs, regional redirects and
+    extractors that pass a playlist on to another extractor. Extract the
+    target the same way until a playlist or video comes back.
+    returns:
+        the final unprocessed result
+    """
+    for _ in range(MAX_REDIRECTS):
+        if result is None or result.get('_type') not in ('url', 'url_transparent'):
+            return result
+        result = ydl.extract_info(
+            result['url'],
+            ie_key=result.get('ie_key'),
+            download=False,
+            process=False
+        )
+    raise ValueError('More than {} redirects'.format(MAX_REDIRECTS))
+
+
+def flatten_entries(result, known=None, stop_after=0):
+    """Yield the video entries of an unprocessed yt-dlp result.
+
+    ``result`` is what ``extract_info(..., process=False)`` returns: entries
+    are left as flat ``url`` results so no per-video page is fetched, and
+    further playlist pages are only requested as the generator is consumed.
+    YouTube channel pages come back as one nested playlist per tab, so
+    recurse into those, skipping the Shorts tab the same way the old match
+    filter did. A bare video result (no ``entries``) is yielded as-is.
+
+    - ``known``: set of video ids already cached
+    - ``stop_after``: stop walking a (sub)playlist after this many
+      consecutive ``known`` entries; 0 walks everything
+    """
+    if result is None:
+        return
+    if 'entries' not in result:
+        yield result
+        return
+    streak = 0
+    for entry in result['entries']:
+        if entry is None:
+            continue
+        if 'entries' in entry:
+            tab_url = entry.get('webpage_url') or entry.get('url') or ''
+            if tab_url.rstrip('/').endswith('/shorts'):
+                continue
+            yield from flatten_entries(entry, known, stop_after)
+            continue
+        url = entry.get('webpage_url') or entry.get('url') or ''
+        if '/shorts/' in url:
+            continue
+        if known is not None and entry.get('id') in known:
+            streak += 1
+            if stop_after and streak >= stop_after:
+                yield entry
+                return
+        else:
+            streak = 0
+        yield entry
+
+
+def playlist_entry(entry):
+    """Reduce a flat yt-dlp entry to the fields the title index needs.
+
+    Prefer webpage_url over url: full extractions only set url for single
+    non-merge formats (see issue #114), while flat entries only carry url.
+    """
+    url = entry.get('webpage_url') or entry.get('url')
+    return {
+        'id': entry.get('id') or url,
+        'title': entry.get('title') or '',
+        'upload_date': entry.get('upload_date'),
+        'webpage_url': url,
+        'ie_key': entry.get('ie_key') or entry.get('extractor_key'),
+    }
+
+
+class PlaylistIndex(object):
+    """In-memory title index over one crawl of a series/service URL.
+
+    Built once per cycle per distinct playlist so every wanted episode of a
+    series is resolved locally instead of re-crawling the site with a new
+    ``matchtitle`` each time.
+
+    ``stale`` marks an index served from the playlist cache because the
+    crawl failed or was skipped; a miss against it proves nothing.
+    """
+
+    def __init__(self, url, entries, stale=False):
+        self.url = url
+        self.entries = [e for e in entries if e['webpage_url']]
+        self.stale = stale
+        # Normalised titles for fuzzy matching, built on first use
+        self.choices = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(self, title, playlistreverse=True):
+        """Return the first entry whose title matches ``title``, or None.
+
+        Uses the same ``upperescape()`` pattern and case-insensitive
+        ``re.search`` that yt-dlp's ``matchtitle`` applied, walking the
+        entries in the order yt-dlp would have with ``playlistreverse``.
+        """
+        pattern = title_pattern(title)
+        entries = reversed(self.entries) if playlistreverse else self.entries
+        for entry in entries:
+            if pattern.search(entry['title']):
+                # A single-video "playlist" that resolves to itself is
+                # not a match (mirrors the old ytsearch() guard).
+                if entry['webpage_url'] == self.url:
+                    return None
+                return entry
+        return None
+
+    def fuzzy_search(self, title, airdate=None, threshold=90):
+        """Return the best scoring entry for ``title``, or None.
+
+        Every entry is scored in one rapidfuzz pass (plain ratio over
+        lowercased, punctuation-stripped titles). Sibling titles score high
+        against each other ("Episode 10" vs "Episode 1", "Part 2" vs
+        "Part 1"), so a candidate is dropped when the numbers in its title
+        differ from ``title``'s or its upload date is more than
+        ``FUZZY_MAX_DAYS`` from ``airdate``, and the best remaining title
+        must beat the next different one by ``FUZZY_MARGIN``. Entries with
+        the best title itself (re-uploads) are ranked by how close their
+        upload date is to ``airdate``.
+
+        - ``airdate``: Sonarr ``airDateUtc`` string, or None
+        - ``threshold``: minimum score (0-100) to accept
+        returns:
+            ``(entry, score)`` or None
+        """
+        if self.choices is None:
+            self.choices = [fuzz_utils.default_process(e['title']) for e in self.entries]
+        query = fuzz_utils.default_process(title)
+        scored = process.extract(
+            query,
+            self.choices,
+            scorer=fuzz.ratio,
+            processor=None,
+            score_cutoff=max(threshold - FUZZY_MARGIN, 0),
+            limit=None
+        )
+        aired = None
+        if airdate:
+            aired = datetime.strptime(airdate[:10], '%Y-%m-%d')
+
+        def distance(entry):
+            if aired is None or not entry['upload_date']:
+                return None
+            try:
+                return abs((datetime.strptime(entry['upload_date'], '%Y%m%d') - aired).days)
+            except ValueError:
+                return None
+
+        numbers = [int(n) for n in NUMBER.findall(query)]
+        candidates = []
+        for choice, score, i in scored:
+            entry = self.entries[i]
+            if entry['webpage_url'] == self.url:
+                continue
+            if [int(n) for n in NUMBER.findall(choice)] != numbers:
+                continue
+            days = distance(entry)
+            if days is not None and days > FUZZY_MAX_DAYS:
+                continue
+            candidates.append((score, choice, entry))
+        if not candidates:
+            return None
+        best, choice, _ = max(candidates, key=lambda c: c[0])
+        if best < threshold:
+            return None
+        if any(c[1] != choice and c[0] > best - FUZZY_MARGIN for c in candidates):
+            return None
+        same = [c[2] for c in candidates if c[1] == choice]
+
+        def closeness(entry):
+            days = distance(entry)
+            return float('inf') if days is None else days
+        return min(same, key=closeness), best
@@ -0,0 +1,74 @@
+import sys
+import importlib.util
+import multiprocessing
+import concurrent.futures
+import yt_dlp
+from yt_dlp.postprocessor import get_postprocessor
+
+
+class DeferredPostProcessor(yt_dlp.YoutubeDL):
+    """YoutubeDL that downloads but leaves post-processing for later.
+
+    Instead of merging formats and converting/embedding subtitles in the
+    downloading thread, each finished download is recorded in ``deferred``
+    as a picklable job for run_postprocessors(), so the next download can
+    start while ffmpeg works on this one in another process.
+    """
+
+    def __init__(self, params=None, auto_init=True):
+        super().__init__(params, auto_init)
+        self.deferred = []
+
+    def post_process(self, filename, info, files_to_move=None):
+        # Per-download postprocessors (format merger, fixups) are bound to
+        # this instance; send their keys and rebuild them in the worker.
+        pps = info.pop('__postprocessors', None) or []
+        job = self.sanitize_info(dict(info))
+        job.pop('__files_to_move', None)
+        self.deferred.append((filename, job, dict(files_to_move or {}), [pp.pp_key() for pp in pps]))
+        info['filepath'] = filename
+        return info
+
+
+def run_postprocessors(ydl_opts, deferred):
+    """Post-process downloads recorded by DeferredPostProcessor.
+
+    Runs in a worker process.
+    - ``ydl_opts``: the download's yt-dlp options, without hooks
+    - ``deferred``: ``DeferredPostProcessor.deferred``
+
+    returns:
+        ``list``: final path of each file, as post_hooks would have seen it
+    """
+    files = []
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        for filename, info, files_to_move, pp_keys in deferred:
+            info['__postprocessors'] = [get_postprocessor(key)(ydl) for key in pp_keys]
+            info = ydl.post_process(filename, info, files_to_move)
+            files.append(info['filepath'])
+    return files
+
+
+def postprocess_opts(ydl_opts):
+    """Strip the options a worker process can't (or shouldn't) receive"""
+    return {key: value for key, value in ydl_opts.items()
+            if key not in ('post_hooks', 'progress_hooks')}
+
+
+def process_pool(workers):
+    """Process pool for run_postprocessors() whose workers import only this module.
+
+    Started with forkserver explicitly: it is the default on the
+    python:3.14 image anyway, and unlike fork it is safe while download
+    threads are running. forkserver and spawn workers re-run the parent's
+    ``__main__``, which here is stream_harvestarr.py: it would parse the
+    command line and attach another set of handlers to the shared log file
+    in every worker. Workers run ``__main__`` by module name when it has a
+    spec, so a script's ``__main__`` is given this module's spec instead.
+    """
+    main = sys.modules['__main__']
+    if getattr(main, '__spec__', None) is None:
+        main.__spec__ = importlib.util.find_spec(__name__)
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload([__name__])
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context)
@@ -0,0 +1,130 @@
+import os
+import time
+import glob
+import cProfile
+import logging
+import threading
+import contextlib
+import collections
+import tracemalloc
+from datetime import datetime
+from metrics import metrics
+
+# Cycles whose --profile output is kept in the log directory
+PROFILE_KEEP = 24
+# Lines listed in each tracemalloc report
+TRACEMALLOC_TOP = 25
+
+
+class Cycle(object):
+    """Timing spans and episode counts for one harvest cycle.
+
+    Spans are named ``phase`` or ``phase/series``; time spent in spans of
+    the same name adds up, so a series downloading several episodes (on
+    several threads) reports its total. summary() turns it all into one
+    key=value log line.
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        self.lock = threading.Lock()
+        self.spans = collections.OrderedDict()
+        self.counts = collections.Counter()
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """Time the ``with`` block under ``name``"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            with self.lock:
+                self.spans[name] = self.spans.get(name, 0) + elapsed
+            logging.getLogger('stream_harvestarr').debug('Span {} took {:.2f}s'.format(name, elapsed))
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """A top-level span, also exported as a phase duration metric"""
+        with self.span(name), metrics.timer('stream_harvestarr_phase_duration_seconds', phase=name):
+            yield
+
+    def count(self, key, value=1):
+        with self.lock:
+            self.counts[key] += value
+
+    def summary(self, slowest=3):
+        """Return the cycle as a ``key=value`` line: wall time, counts,
+        phase times and the slowest per-series spans"""
+        fields = [('duration', '{:.2f}s'.format(time.time() - self.start))]
+        with self.lock:
+            fields.extend(sorted(self.counts.items()))
+            phases = [(name, elapsed) for name, elapsed in self.spans.items() if '/' not in name]
+            series = [(name, elapsed) for name, elapsed in self.spans.items() if '/' in name]
+        fields.extend(('phase.{}'.format(name), '{:.2f}s'.format(elapsed)) for name, elapsed in phases)
+        series.sort(key=lambda span: span[1], reverse=True)
+        if series:
+            fields.append(('slowest', ','.join(
+                '{}={:.2f}s'.format(name, elapsed) for name, elapsed in series[:slowest]
+            )))
+        return ' '.join(
+            '{}={}'.format(key, '"{}"'.format(value) if ' ' in str(value) else value)
+            for key, value in fields
+        )
+
+
+class CycleProfiler(object):
+    """cProfile and tracemalloc output for every cycle (--profile).
+
+    Writes ``cycle-<time>.prof`` (open with pstats or snakeviz) and
+    ``cycle-<time>-memory.txt`` (largest allocations, and what grew since
+    the previous cycle) to ``directory``, keeping the last PROFILE_KEEP
+    cycles. cProfile only sees the thread that runs the cycle, not
+    download or Sonarr worker threads.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.previous = None
+        tracemalloc.start()
+
+    @contextlib.contextmanager
+    def cycle(self):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self.write(profiler)
+
+    def write(self, profiler):
+        logger = logging.getLogger('stream_harvestarr')
+        prefix = os.path.join(self.directory, 'cycle-{}'.format(datetime.now().strftime('%Y%m%d-%H%M%S-%f')))
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ])
+        try:
+            profiler.dump_stats(prefix + '.prof')
+            with open(prefix + '-memory.txt', 'w') as f:
+                current, peak = tracemalloc.get_traced_memory()
+                f.write('Traced memory: {:.1f} MiB now, {:.1f} MiB peak\n\n'.format(current / 2**20, peak / 2**20))
+                f.write('Top {} allocations by line:\n'.format(TRACEMALLOC_TOP))
+                for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                    f.write('{}\n'.format(stat))
+                if self.previous is not None:
+                    f.write('\nTop {} changes since the previous cycle:\n'.format(TRACEMALLOC_TOP))
+                    for stat in snapshot.compare_to(self.previous, 'lineno')[:TRACEMALLOC_TOP]:
+                        f.write('{}\n'.format(stat))
+        except OSError as e:
+            logger.warning('Could not write profile to {}: {}'.format(self.directory, e))
+            return
+        self.previous = snapshot
+        tracemalloc.reset_peak()
+        logger.info('Profile written to {}.prof'.format(prefix))
+        for old in sorted(glob.glob(os.path.join(self.directory, 'cycle-*.prof')))[:-PROFILE_KEEP]:
+            for path in (old, old[:-len('.prof')] + '-memory.txt'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,164 @@
+import json
+import codecs
+
+# Bytes read from the socket per step when streaming a response
+CHUNK_SIZE = 65536
+
+
+class Record(object):
+    """Compact stand-in for one Sonarr JSON object.
+
+    Keeps only the fields listed in ``__slots__`` and answers the dict
+    operations the harvester uses (``r['key']``, ``r.get()``, ``in``,
+    ``dict(r)``), so it can replace the parsed dict without touching
+    callers. A field missing from the JSON reads as absent.
+    """
+    __slots__ = ()
+
+    def __init__(self, data):
+        for field in self.__slots__:
+            setattr(self, field, data.get(field))
+
+    def __getitem__(self, key):
+        if key not in self.__slots__ or getattr(self, key) is None:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        if key in self:
+            return getattr(self, key)
+        return default
+
+    def keys(self):
+        return [field for field in self.__slots__ if getattr(self, field) is not None]
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, dict(self))
+
+
+class SeriesRecord(Record):
+    __slots__ = ('id', 'title', 'path', 'monitored', 'tvdbId')
+
+
+class EpisodeRecord(Record):
+    # eligible_at is filled in by getseriesepisodes()
+    __slots__ = ('id', 'seriesId', 'title', 'monitored', 'hasFile', 'airDateUtc',
+                 'seasonNumber', 'episodeNumber', 'eligible_at')
+
+
+class _Reader(object):
+    """Buffered JSON tokenizer over an iterable of byte chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.text = codecs.getincrementaldecoder('utf-8')()
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.done = False
+
+    def fill(self):
+        """Append the next chunk, dropping what was already parsed"""
+        if self.done:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.done = True
+            text = self.text.decode(b'', final=True)
+        else:
+            text = self.text.decode(chunk)
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                raise ValueError('Unexpected end of JSON response')
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError('Expected {!r} in JSON response at {!r}'.format(char, self.buf[self.pos:self.pos + 20]))
+        self.pos += 1
+
+    def value(self):
+        """Parse and consume one complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number cut off by the end of a chunk ("12" of "12.5")
+            # parses fine; only trust it once a delimiter follows
+            if (not isinstance(value, (dict, list, str))
+                    and (end == len(self.buf) or self.buf[end] not in ' \t\r\n,]}')
+                    and self.fill()):
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_array(chunks, key=None, meta=None):
+    """Yield the items of a JSON array one at a time.
+
+    Only one item (plus a chunk of input) is held in memory, so a large
+    Sonarr response never exists as one string or object graph.
+
+    - ``chunks``: iterable of bytes, e.g. ``response.iter_content()``
+    - ``key``: the array is this key of a top-level object (paged
+      responses such as wanted/missing keep it under ``records``); a
+      ValueError is raised if the object has no such key
+    - ``meta``: dict filled with the object's other top-level values; only
+      complete once the generator is exhausted
+    """
+    reader = _Reader(chunks)
+    if key is not None:
+        reader.expect('{')
+        while True:
+            if reader.peek() == '}':
+                raise ValueError('No {!r} array in JSON response'.format(key))
+            name = reader.value()
+            reader.expect(':')
+            if name == key:
+                break
+            value = reader.value()
+            if meta is not None:
+                meta[name] = value
+            if reader.peek() == ',':
+                reader.pos += 1
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+    else:
+        while True:
+            yield reader.value()
+            char = reader.peek()
+            reader.pos += 1
+            if char == ']':
+                break
+            if char != ',':
+                raise ValueError('Expected "," or "]" in JSON array, got {!r}'.format(char))
+    if key is not None:
+        while reader.peek() == ',':
+            reader.pos += 1
+            name = reader.value()
+            reader.expect(':')
+            value = reader.value()
+            if meta is not None:
+                meta[name] = value
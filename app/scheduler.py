@@ -0,0 +1,79 @@
+import logging
+
+
+# (episode age in seconds, seconds between searches). An aired episode
+# that hasn't been found is searched every 15 minutes for its first day,
+# every 2 hours for its first week and twice a day after that.
+DEFAULT_RETRY_CADENCE = [
+    (24 * 3600, 15 * 60),
+    (7 * 24 * 3600, 2 * 3600),
+    (None, 12 * 3600),
+]
+
+
+def parse_retry_cadence(cadence):
+    """Parse a ``retry_cadence`` config list
+    - ``cadence``: list of ``{age_hours, every_minutes}`` dicts from
+      config.yml; the entry without ``age_hours`` applies to anything older
+
+    returns:
+        ``list``: ``[(max_age_seconds or None, interval_seconds)]`` sorted by
+        age, always ending in an open-ended tier
+    """
+    logger = logging.getLogger('stream_harvestarr')
+    tiers = []
+    for tier in cadence:
+        interval = float(tier['every_minutes']) * 60
+        if 'age_hours' in tier:
+            tiers.append((float(tier['age_hours']) * 3600, interval))
+        else:
+            tiers.append((None, interval))
+    if not tiers:
+        raise ValueError('retry_cadence is empty')
+    tiers.sort(key=lambda tier: float('inf') if tier[0] is None else tier[0])
+    if tiers[-1][0] is not None:
+        # Past the last listed age, keep searching at the slowest rate
+        tiers.append((None, tiers[-1][1]))
+    logger.debug('Retry cadence: {}'.format(
+        ', '.join('{}m{}'.format(
+            int(interval // 60),
+            '' if age is None else ' until {}h'.format(int(age // 3600))
+        ) for age, interval in tiers)
+    ))
+    return tiers
+
+
+def retry_interval(cadence, age):
+    """Seconds to wait between searches for an episode ``age`` seconds old"""
+    for max_age, interval in cadence:
+        if max_age is None or age < max_age:
+            return interval
+    return cadence[-1][1]
+
+
+def miss_backoff(interval, misses, backoff):
+    """Stretch a retry interval after repeated misses
+    - ``interval``: seconds the cadence asks for
+    - ``misses``: consecutive searches that didn't find the episode
+    - ``backoff``: ``(after, multiplier, max_seconds)``, or None to disable.
+      The first ``after`` misses are free; each one past that multiplies
+      the interval, up to ``max_seconds``
+    """
+    if backoff is None:
+        return interval
+    after, multiplier, max_seconds = backoff
+    if misses <= after:
+        return interval
+    return max(interval, min(interval * multiplier ** (misses - after), max_seconds))
+
+
+def next_search(cadence, eligible_at, last_tried, misses=0, backoff=None):
+    """Epoch time an episode is next due to be searched for
+    - ``eligible_at``: when the episode aired (plus any series offset)
+    - ``last_tried``: when it was last searched for, or None if never
+    - ``misses``, ``backoff``: see miss_backoff()
+    """
+    if last_tried is None:
+        return eligible_at
+    interval = retry_interval(cadence, max(0, last_tried - eligible_at))
+    return last_tried + miss_backoff(interval, misses, backoff)
@@ -0,0 +1,239 @@
+import time
+import sqlite3
+import threading
+
+
+class HarvestStore(object):
+    """SQLite-backed state that has to survive between scans and restarts.
+
+    Lives next to config.yml so it sits on the persistent /config volume.
+    A single connection is shared behind a lock; every public method is a
+    short transaction, so callers never hold the database open across
+    network calls.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS playlist_entries (
+                    playlist TEXT NOT NULL,
+                    video_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    title TEXT NOT NULL,
+                    upload_date TEXT,
+                    webpage_url TEXT NOT NULL,
+                    ie_key TEXT,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL,
+                    PRIMARY KEY (playlist, video_id)
+                );
+                CREATE TABLE IF NOT EXISTS playlist_crawls (
+                    playlist TEXT PRIMARY KEY,
+                    last_crawl REAL NOT NULL,
+                    last_full_crawl REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS episode_attempts (
+                    episode_id INTEGER PRIMARY KEY,
+                    series_id INTEGER NOT NULL,
+                    last_tried REAL NOT NULL,
+                    misses INTEGER NOT NULL DEFAULT 0,
+                    last_result TEXT
+                );
+                CREATE TABLE IF NOT EXISTS pending_rescans (
+                    series_id INTEGER PRIMARY KEY,
+                    queued_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS domain_backoff (
+                    domain TEXT PRIMARY KEY,
+                    rate_limit_count INTEGER NOT NULL,
+                    current_backoff REAL NOT NULL,
+                    blocked_until REAL NOT NULL,
+                    extract_scale REAL NOT NULL,
+                    download_scale REAL NOT NULL
+                );
+            """)
+            # Databases created before the search history was kept
+            columns = {row['name'] for row in self.conn.execute('PRAGMA table_info(episode_attempts)')}
+            if 'misses' not in columns:
+                self.conn.execute('ALTER TABLE episode_attempts ADD COLUMN misses INTEGER NOT NULL DEFAULT 0')
+                self.conn.execute('ALTER TABLE episode_attempts ADD COLUMN last_result TEXT')
+
+    def playlist_entries(self, playlist):
+        """Return cached entries for ``playlist`` in site order"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT video_id, title, upload_date, webpage_url, ie_key '
+                'FROM playlist_entries WHERE playlist = ? ORDER BY position',
+                (playlist,)
+            ).fetchall()
+        return [{
+            'id': row['video_id'],
+            'title': row['title'],
+            'upload_date': row['upload_date'],
+            'webpage_url': row['webpage_url'],
+            'ie_key': row['ie_key'],
+        } for row in rows]
+
+    def playlist_last_full_crawl(self, playlist):
+        """Return the epoch time of the last full crawl, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT last_full_crawl FROM playlist_crawls WHERE playlist = ?',
+                (playlist,)
+            ).fetchone()
+        return row['last_full_crawl'] if row else None
+
+    def save_playlist(self, playlist, entries, full):
+        """Record a crawl of ``playlist``
+        - ``entries``: entries seen this crawl, in site order
+        - ``full``: True if the whole playlist was walked. The cached order
+          is rebuilt from scratch; otherwise unseen entries are placed ahead
+          of everything already cached (newest uploads sit at the top).
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            if full:
+                self.conn.execute('DELETE FROM playlist_entries WHERE playlist = ?', (playlist,))
+                start = 0
+            else:
+                row = self.conn.execute(
+                    'SELECT MIN(position) FROM playlist_entries WHERE playlist = ?',
+                    (playlist,)
+                ).fetchone()
+                start = (row[0] or 0) - len(entries)
+            for offset, entry in enumerate(entries):
+                if not entry['id'] or not entry['webpage_url']:
+                    continue
+                # Known entries keep their position and first_seen; only the
+                # metadata and last_seen are refreshed.
+                self.conn.execute(
+                    'INSERT INTO playlist_entries (playlist, video_id, position, title, '
+                    'upload_date, webpage_url, ie_key, first_seen, last_seen) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (playlist, video_id) DO UPDATE SET '
+                    'title = excluded.title, '
+                    'upload_date = COALESCE(excluded.upload_date, upload_date), '
+                    'webpage_url = excluded.webpage_url, '
+                    'ie_key = COALESCE(excluded.ie_key, ie_key), '
+                    'last_seen = excluded.last_seen',
+                    (playlist, entry['id'], start + offset, entry['title'], entry['upload_date'],
+                     entry['webpage_url'], entry['ie_key'], now, now)
+                )
+            self.conn.execute(
+                'INSERT INTO playlist_crawls (playlist, last_crawl, last_full_crawl) '
+                'VALUES (?, ?, ?) '
+                'ON CONFLICT (playlist) DO UPDATE SET '
+                'last_crawl = excluded.last_crawl, '
+                'last_full_crawl = CASE WHEN ? THEN excluded.last_full_crawl ELSE last_full_crawl END',
+                (playlist, now, now, full)
+            )
+
+    def episode_attempts(self, episode_ids):
+        """Return the search history of episodes searched before
+        returns:
+            ``dict``: {episode_id: {last_tried, misses, last_result}}
+        """
+        attempts = {}
+        ids = list(episode_ids)
+        with self.lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = self.conn.execute(
+                    'SELECT episode_id, last_tried, misses, last_result FROM episode_attempts '
+                    'WHERE episode_id IN ({})'.format(','.join('?' * len(chunk))),
+                    chunk
+                ).fetchall()
+                attempts.update((row['episode_id'], {
+                    'last_tried': row['last_tried'],
+                    'misses': row['misses'],
+                    'last_result': row['last_result'],
+                }) for row in rows)
+        return attempts
+
+    def record_attempt(self, episode_id, series_id, result):
+        """Record that ``episode_id`` was just searched for
+        - ``result``: ``missing`` adds to the run of consecutive misses;
+          anything else (``found``, ``failed``) ends it
+        """
+        misses = 1 if result == 'missing' else 0
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT INTO episode_attempts (episode_id, series_id, last_tried, misses, last_result) '
+                'VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (episode_id) DO UPDATE SET '
+                'last_tried = excluded.last_tried, '
+                'misses = CASE WHEN excluded.misses THEN misses + 1 ELSE 0 END, '
+                'last_result = excluded.last_result',
+                (episode_id, series_id, time.time(), misses, result)
+            )
+
+    def clear_attempt(self, episode_id):
+        """Forget the last search of ``episode_id`` so it is due again as
+        soon as it is eligible"""
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM episode_attempts WHERE episode_id = ?', (episode_id,))
+
+    def reset_search_history(self, series_id=None):
+        """Forget search history and backoff so episodes are searched again
+        - ``series_id``: only this series; None resets every episode
+        returns:
+            ``int``: number of episodes reset
+        """
+        with self.lock, self.conn:
+            if series_id is None:
+                cur = self.conn.execute('DELETE FROM episode_attempts')
+            else:
+                cur = self.conn.execute('DELETE FROM episode_attempts WHERE series_id = ?', (series_id,))
+        return cur.rowcount
+
+    def add_pending_rescan(self, series_id):
+        """Remember that ``series_id`` has new files Sonarr hasn't scanned"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR IGNORE INTO pending_rescans (series_id, queued_at) VALUES (?, ?)',
+                (series_id, time.time())
+            )
+
+    def pending_rescans(self):
+        """Return the series ids still waiting for a rescan"""
+        with self.lock:
+            rows = self.conn.execute('SELECT series_id FROM pending_rescans ORDER BY queued_at').fetchall()
+        return [row['series_id'] for row in rows]
+
+    def clear_pending_rescan(self, series_id):
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM pending_rescans WHERE series_id = ?', (series_id,))
+
+    def domain_backoff(self, domain):
+        """Return the saved rate limit backoff for ``domain``, or None
+        returns:
+            ``dict``: see DomainThrottle.backoff_state()
+        """
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT rate_limit_count, current_backoff, blocked_until, extract_scale, download_scale '
+                'FROM domain_backoff WHERE domain = ?',
+                (domain,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def save_domain_backoff(self, domain, state):
+        """Remember a site's rate limit backoff so a restart doesn't reset it"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT INTO domain_backoff (domain, rate_limit_count, current_backoff, blocked_until, '
+                'extract_scale, download_scale) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (domain) DO UPDATE SET '
+                'rate_limit_count = excluded.rate_limit_count, '
+                'current_backoff = excluded.current_backoff, '
+                'blocked_until = excluded.blocked_until, '
+                'extract_scale = excluded.extract_scale, '
+                'download_scale = excluded.download_scale',
+                (domain, state['rate_limit_count'], state['current_backoff'], state['blocked_until'],
+                 state['extract_scale'], state['download_scale'])
+            )
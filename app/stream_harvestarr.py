@@ -1,11 +1,31 @@
 import requests
+import requests.adapters
 import urllib.parse
-import yt_dlp
+import urllib3.util
 import os
 import sys
 import re
-from utils import upperescape, normalize_title, checkconfig, offsethandler, YoutubeDLLogger, ytdl_hooks, ytdl_hooks_debug, setup_logging  # NOQA
-from datetime import datetime
+import collections
+import concurrent.futures
+import threading
+import hashlib
+import contextlib
+import signal
+import select
+import json
+import hmac
+import base64
+from utils import LOG_DIR, normalize_title, checkconfig, offsethandler, move_into_library, prune_empty_dirs, YoutubeDLLogger, ytdl_hooks, ytdl_hooks_debug, setup_logging  # NOQA
+from playlist import PlaylistIndex, flatten_entries, follow_redirects, playlist_entry
+from store import HarvestStore
+from throttle import CoolingDown, DomainThrottle, RequestPacer, domain_of, is_rate_limited
+from records import CHUNK_SIZE, EpisodeRecord, SeriesRecord, iter_json_array
+from scheduler import DEFAULT_RETRY_CADENCE, parse_retry_cadence, next_search
+from ytdl import copy_info, youtubedl
+from metrics import metrics, sonarr_metrics_hook, ytdl_metrics_hook
+from httpd import serve
+from profiling import Cycle, CycleProfiler
+from datetime import datetime, timedelta, timezone
 import schedule
 import time
 import logging
@@ -14,17 +34,29 @@ import argparse
 # allow debug arg for verbose logging
 parser = argparse.ArgumentParser(description='Process some integers.')
 parser.add_argument('--debug', action='store_true', help='Enable debug logging')
+parser.add_argument('--reset-search-history', action='store_true',
+                    help='Forget past searches so every missing episode is searched on the next scan, then exit')
+parser.add_argument('--profile', action='store_true',
+                    help='Write a cProfile stats file and tracemalloc report for every scan to the log directory')
+parser.add_argument('--once', action='store_true',
+                    help='Run a single scan and exit: 0 on success, 1 if Sonarr was unreachable, 2 if any download failed')
+parser.add_argument('--plan', action='store_true',
+                    help='Print the episodes the next scan would download, with estimated sizes, as JSON and exit')
 args = parser.parse_args()
 
 # setup logger
 logger = setup_logging(True, True, args.debug)
 
 date_format = "%Y-%m-%dT%H:%M:%SZ"
-now = datetime.now()
 
 CONFIGFILE = os.environ['CONFIGPATH']
 CONFIGPATH = CONFIGFILE.replace('config.yml', '')
 SCANINTERVAL = 60
+# Epoch time the next episode becomes eligible or is due for a retry,
+# set after every scan so the loop can wake before the scan interval.
+NEXT_DUE = None
+# Per-scan profiling (--profile)
+PROFILER = CycleProfiler(LOG_DIR) if args.profile else None
 
 # yt-dlp needs a JavaScript runtime for YouTube extraction.  Prefer deno
 # (upstream default, installed on amd64/arm64 images) and fall back to
@@ -32,11 +64,121 @@ SCANINTERVAL = 60
 # packaged for Alpine).  See issue #96.
 JS_RUNTIMES = {'deno': {'path': None}, 'node': {'path': None}}
 
+# Seconds an extracted video info dict may be reused before the format
+# URLs in it are considered stale (YouTube signs them for a few hours).
+VIDEO_INFO_TTL = 1800
+
+# Records per page when walking Sonarr's wanted/missing list
+WANTED_PAGE_SIZE = 250
+
+# Above this many matched series, one full /series request is cheaper
+# than fetching each of them by id between full refreshes
+SERIES_BY_ID_MAX = 20
+
+# downloadepisode() result for a job handed back because its site
+# started cooling down from a rate limit after the job was dispatched
+DEFERRED = 'deferred'
+
+# Sonarr webhook events that queue a harvest of the event's series
+WEBHOOK_EVENTS = ('SeriesAdd', 'EpisodeFileDelete')
+# http_host values that listen on every interface; webhooks on those
+# need webhook_password
+ALL_INTERFACES = ('', '0.0.0.0', '::')
+
+
+class Wakeup(object):
+    """Cut the scan loop's sleep short, from another thread or on a signal.
+
+    A self-pipe: wake() writes a byte and wait() selects on the read end.
+    A signal handler must not take locks (a threading.Event deadlocks if
+    the signal lands while the main thread holds the Event's lock), so
+    signals reach the pipe through signal.set_wakeup_fd() and their
+    handlers only set a flag.
+    """
+
+    def __init__(self):
+        self.read_fd, self.write_fd = os.pipe()
+        os.set_blocking(self.read_fd, False)
+        os.set_blocking(self.write_fd, False)
+
+    def wake(self):
+        try:
+            os.write(self.write_fd, b'\0')
+        except BlockingIOError:
+            # The pipe is full, so a wake-up is already pending
+            pass
+
+    def wait(self, timeout):
+        """Sleep up to ``timeout`` seconds
+        returns:
+            ``bool``: True if woken early
+        """
+        ready, _, _ = select.select([self.read_fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.read_fd, 512):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+
+# Cuts the scan loop's sleep short on SIGHUP or a queued webhook harvest
+WAKEUP = Wakeup()
+
 
 class StreamHarvester(object):
 
     def __init__(self):
         """Set up app with config file settings"""
+        # Rate limit backoff, download spacing and concurrency per site
+        self.throttles = {}
+        self.throttles_lock = threading.Lock()
+        # Compiled series config, see indexseries()
+        self.series_index = {}
+        self.series_config = {}
+        # Index keys whose config changed on the last reload
+        self.changed_series = set()
+        self.config_mtime = None
+        self.config_hash = None
+        self.reload_requested = False
+        self.loadconfig()
+
+        # Persistent state (playlist cache) lives next to config.yml
+        try:
+            self.store = HarvestStore(os.path.join(CONFIGPATH, 'stream_harvestarr.db'))
+        except Exception as e:
+            sys.exit("Error opening state database: {}".format(e))
+
+        # Extracted video info, keyed by URL: {url: (extracted_at, info)}
+        self.video_info = {}
+        # Extractor that handled each playlist's last crawl: {url: ie_key}
+        self.playlist_ie = {}
+
+        # Earliest upcoming eligibility or retry seen this scan (epoch)
+        self.next_due = None
+
+        # Timing spans and counts of the current scan, see main()
+        self.cycle = Cycle()
+
+        # Process pool post-processing downloads while rundownloads() runs
+        self.postprocess_pool = None
+
+        # Series ids queued by Sonarr webhooks, see harvest()
+        self.harvest_requests = set()
+        self.harvest_lock = threading.Lock()
+
+        # Sonarr series matched last scan: {series_id: {title, path, monitored}}
+        self.series_catalogue = {}
+        # When they were last matched against the full /series list
+        self.series_catalogue_at = 0
+
+    def loadconfig(self):
+        """Read config.yml and (re)build everything derived from it"""
+        with open(CONFIGFILE, 'rb') as f:
+            self.config_hash = hashlib.sha256(f.read()).hexdigest()
+        self.config_mtime = os.stat(CONFIGFILE).st_mtime
         cfg = checkconfig()
         # Set config key for backwards compatibility in config.yml
         config_key = 'sonarrytdl' if 'sonarrytdl' in cfg else 'streamharvestarr'
@@ -47,16 +189,11 @@ class StreamHarvester(object):
             self.set_scan_interval(self.config_section['scan_interval'])
             try:
                 self.debug = self.config_section['debug'] in ['true', 'True']
-                if self.debug:
-                    logger.setLevel(logging.DEBUG)
-                    for logs in logger.handlers:
-                        if logs.name == 'FileHandler':
-                            logs.setLevel(logging.DEBUG)
-                        if logs.name == 'StreamHandler':
-                            logs.setLevel(logging.DEBUG)
-                    logger.debug('DEBUGGING ENABLED')
             except AttributeError:
                 self.debug = False
+            self.set_log_level()
+            if self.debug:
+                logger.debug('DEBUGGING ENABLED')
             # Rate limiting configuration
             try:
                 self.download_delay = int(self.config_section.get('download_delay', 0))
@@ -92,9 +229,121 @@ class StreamHarvester(object):
                 logger.debug('Max backoff set to {} seconds'.format(self.backoff_max))
             except (AttributeError, ValueError):
                 self.backoff_max = 3600
-            # Exponential backoff state tracking
-            self.rate_limit_count = 0
-            self.current_backoff = self.rate_limit_sleep
+            # Per-site token buckets, in requests per minute (0 = unlimited)
+            try:
+                self.extract_rate = float(self.config_section.get('extract_rate', 0))
+                self.extract_burst = int(self.config_section.get('extract_burst', 5))
+                if self.extract_rate > 0:
+                    logger.info('Extraction limited to {} requests per minute per site (burst {})'.format(
+                        self.extract_rate, self.extract_burst))
+            except (AttributeError, ValueError):
+                self.extract_rate = 0
+                self.extract_burst = 5
+            try:
+                self.download_rate = float(self.config_section.get('download_rate', 0))
+                self.download_burst = int(self.config_section.get('download_burst', 1))
+                if self.download_rate > 0:
+                    logger.info('Downloads limited to {} per minute per site (burst {})'.format(
+                        self.download_rate, self.download_burst))
+            except (AttributeError, ValueError):
+                self.download_rate = 0
+                self.download_burst = 1
+            # Download worker pool configuration
+            try:
+                self.download_workers = int(self.config_section.get('download_workers', 1))
+                if self.download_workers > 1:
+                    logger.info('Downloading with up to {} parallel workers'.format(self.download_workers))
+            except (AttributeError, ValueError):
+                self.download_workers = 1
+            try:
+                self.download_workers_per_domain = int(self.config_section.get('download_workers_per_domain', 1))
+                logger.debug('Parallel downloads per site set to {}'.format(self.download_workers_per_domain))
+            except (AttributeError, ValueError):
+                self.download_workers_per_domain = 1
+            try:
+                self.postprocess_workers = int(self.config_section.get('postprocess_workers', 0))
+                if self.postprocess_workers > 0:
+                    logger.info('Post-processing in up to {} background processes'.format(self.postprocess_workers))
+            except (AttributeError, ValueError):
+                self.postprocess_workers = 0
+            # Built-in HTTP listener (/metrics); only read at startup
+            try:
+                self.http_port = int(self.config_section.get('http_port', 0))
+                self.http_host = self.config_section.get('http_host', '0.0.0.0')
+            except (AttributeError, ValueError):
+                self.http_port = 0
+                self.http_host = '0.0.0.0'
+            # Sonarr webhooks on the HTTP listener (/webhook)
+            try:
+                self.webhook = self.config_section.get('webhook', False) in ['true', 'True', True]
+                # str(): an unquoted number in YAML isn't a string
+                self.webhook_password = self.config_section.get('webhook_password')
+                self.webhook_password = str(self.webhook_password) if self.webhook_password not in (None, '') else None
+            except AttributeError:
+                self.webhook = False
+                self.webhook_password = None
+            # Local scratch directory for resumable downloads
+            self.scratch_dir = self.config_section.get('scratch_dir') or None
+            if self.scratch_dir:
+                logger.info('Downloading into scratch directory {}'.format(self.scratch_dir))
+            # Persistent playlist cache configuration
+            try:
+                self.playlist_cache = self.config_section.get('playlist_cache', True) in ['true', 'True', True]
+                if self.playlist_cache:
+                    logger.debug('Playlist cache enabled')
+            except (AttributeError, ValueError):
+                self.playlist_cache = True
+            try:
+                self.playlist_full_refresh = float(self.config_section.get('playlist_full_refresh', 6))
+                logger.debug('Playlist full refresh set to every {} hours'.format(self.playlist_full_refresh))
+            except (AttributeError, ValueError):
+                self.playlist_full_refresh = 6
+            try:
+                self.playlist_cache_stop_after = int(self.config_section.get('playlist_cache_stop_after', 10))
+                logger.debug('Incremental crawl stops after {} cached entries'.format(self.playlist_cache_stop_after))
+            except (AttributeError, ValueError):
+                self.playlist_cache_stop_after = 10
+            # Episode search cadence
+            if 'retry_cadence' in self.config_section:
+                try:
+                    self.retry_cadence = parse_retry_cadence(self.config_section['retry_cadence'])
+                except (KeyError, TypeError, ValueError):
+                    logger.warning('Invalid retry_cadence in config.yml - using the default cadence')
+                    self.retry_cadence = DEFAULT_RETRY_CADENCE
+            else:
+                self.retry_cadence = DEFAULT_RETRY_CADENCE
+            # Backoff for episodes that keep coming up missing
+            try:
+                self.search_backoff = self.config_section.get('search_backoff', True) in ['true', 'True', True]
+            except (AttributeError, ValueError):
+                self.search_backoff = True
+            try:
+                self.search_backoff_after = int(self.config_section.get('search_backoff_after', 4))
+                logger.debug('Search backoff starts after {} misses'.format(self.search_backoff_after))
+            except (AttributeError, ValueError):
+                self.search_backoff_after = 4
+            try:
+                self.search_backoff_multiplier = float(self.config_section.get('search_backoff_multiplier', 2.0))
+                logger.debug('Search backoff multiplier set to {}'.format(self.search_backoff_multiplier))
+            except (AttributeError, ValueError):
+                self.search_backoff_multiplier = 2.0
+            try:
+                self.search_backoff_max = float(self.config_section.get('search_backoff_max', 168))
+                logger.debug('Max search backoff set to {} hours'.format(self.search_backoff_max))
+            except (AttributeError, ValueError):
+                self.search_backoff_max = 168
+            # Fuzzy title matching fallback
+            try:
+                self.fuzzy_match = self.config_section.get('fuzzy_match', False) in ['true', 'True', True]
+                if self.fuzzy_match:
+                    logger.info('Fuzzy title matching enabled')
+            except (AttributeError, ValueError):
+                self.fuzzy_match = False
+            try:
+                self.fuzzy_threshold = float(self.config_section.get('fuzzy_threshold', 90))
+                logger.debug('Fuzzy match threshold set to {}'.format(self.fuzzy_threshold))
+            except (AttributeError, ValueError):
+                self.fuzzy_threshold = 90
         except Exception:
             sys.exit("Error with streamharvestarr config.yml values.")
 
@@ -123,6 +372,47 @@ class StreamHarvester(object):
             sys.exit("Error with sonarr config.yml values.")
         except Exception as e:
             sys.exit("Error with sonarr config.yml values: {e}")
+        # Sonarr connection tuning
+        try:
+            self.sonarr_timeout = (
+                float(cfg['sonarr'].get('connect_timeout', 5)),
+                float(cfg['sonarr'].get('timeout', 30))
+            )
+            logger.debug('Sonarr timeouts set to {}s connect / {}s read'.format(*self.sonarr_timeout))
+        except (AttributeError, ValueError):
+            self.sonarr_timeout = (5.0, 30.0)
+        try:
+            self.sonarr_retries = int(cfg['sonarr'].get('retries', 3))
+            logger.debug('Sonarr retries set to {}'.format(self.sonarr_retries))
+        except (AttributeError, ValueError):
+            self.sonarr_retries = 3
+        try:
+            self.sonarr_workers = int(cfg['sonarr'].get('max_concurrent_requests', 4))
+            logger.debug('Sonarr concurrent requests set to {}'.format(self.sonarr_workers))
+        except (AttributeError, ValueError):
+            self.sonarr_workers = 4
+        try:
+            self.sonarr_request_delay = float(cfg['sonarr'].get('request_delay', 0))
+            if self.sonarr_request_delay > 0:
+                logger.debug('Per-series Sonarr requests spaced {}s apart'.format(self.sonarr_request_delay))
+        except (AttributeError, ValueError):
+            self.sonarr_request_delay = 0
+        try:
+            self.sonarr_wanted_missing = cfg['sonarr'].get('wanted_missing', 'true').lower() == 'true'
+        except AttributeError:
+            self.sonarr_wanted_missing = True
+        try:
+            self.stream_json = cfg['sonarr'].get('stream_json', 'false').lower() == 'true'
+            if self.stream_json:
+                logger.debug('Streaming Sonarr responses into compact records')
+        except AttributeError:
+            self.stream_json = False
+        try:
+            self.series_cache_ttl = float(cfg['sonarr'].get('series_cache_ttl', 360))
+            logger.debug('Sonarr series list refreshed every {} minutes'.format(self.series_cache_ttl))
+        except (AttributeError, ValueError):
+            self.series_cache_ttl = 360
+        self.session = self.sonarr_session()
 
         # Series Setup
         try:
@@ -153,23 +443,133 @@ class StreamHarvester(object):
             self.services = {}
             logger.warning('Error loading services config, continuing without services')
 
+        # Series config matched against Sonarr on every scan
+        self.indexseries()
+
+        # Per-site download concurrency and rate overrides, keyed by service domain
+        self.domain_concurrency = {}
+        self.domain_rates = {}
+        for svc in self.services.values():
+            if 'concurrency' in svc:
+                try:
+                    self.domain_concurrency[domain_of(svc.get('url', ''))] = int(svc['concurrency'])
+                except ValueError:
+                    logger.warning('Service "{}" has an invalid concurrency value - ignoring'.format(svc['title']))
+            for key in ('extract_rate', 'download_rate'):
+                if key in svc:
+                    try:
+                        self.domain_rates.setdefault(domain_of(svc.get('url', '')), {})[key] = float(svc[key])
+                    except ValueError:
+                        logger.warning('Service "{}" has an invalid {} value - ignoring'.format(svc['title'], key))
         # Merge output format
         try:
             self.ytdl_merge_output_format = cfg["ytdl"]["merge_output_format"]
         except Exception:
             sys.exit("Error with ytdl config.yml values.")
 
+    def reloadconfig(self):
+        """Reload config.yml if it changed on disk or SIGHUP asked for it
+
+        A config that fails to load is logged and the previous one kept.
+        Series whose entries changed are remembered in changed_series so
+        filterseries() can reset their search history.
+        returns:
+            ``bool``: True if a new config was loaded
+        """
+        global SCANINTERVAL
+        try:
+            mtime = os.stat(CONFIGFILE).st_mtime
+            if not self.reload_requested and mtime == self.config_mtime:
+                return False
+            with open(CONFIGFILE, 'rb') as f:
+                config_hash = hashlib.sha256(f.read()).hexdigest()
+        except OSError as e:
+            logger.error('Unable to read config.yml, keeping the current config: {}'.format(e))
+            return False
+        forced = self.reload_requested
+        self.reload_requested = False
+        if config_hash == self.config_hash and not forced:
+            self.config_mtime = mtime
+            return False
+        logger.info('config.yml changed - reloading')
+        previous = dict(self.__dict__)
+        scan_interval = SCANINTERVAL
+        throttle_settings = self.throttle_settings()
+        try:
+            self.loadconfig()
+        except (SystemExit, Exception) as e:
+            # loadconfig() exits on bad values; a running harvester keeps going
+            session = self.__dict__.get('session')
+            if session is not None and session is not previous['session']:
+                session.close()
+            self.__dict__.clear()
+            self.__dict__.update(previous)
+            SCANINTERVAL = scan_interval
+            self.set_log_level()
+            # Don't retry the same broken file every scan
+            self.config_mtime = mtime
+            self.config_hash = config_hash
+            logger.error('config.yml reload failed, keeping the previous config: {}'.format(e))
+            return False
+        previous['session'].close()
+        # New or edited entries may match series we never fetched
+        self.series_catalogue_at = 0
+        if self.throttle_settings() != throttle_settings:
+            with self.throttles_lock:
+                self.throttles = {}
+        for key in set(previous['series_config']) | set(self.series_config):
+            if previous['series_config'].get(key) != self.series_config.get(key):
+                self.changed_series.add(key)
+        if self.changed_series:
+            logger.info('{} series config entries changed'.format(len(self.changed_series)))
+        return True
+
+    def throttle_settings(self):
+        """Config values the per-site throttles are built from"""
+        return (self.download_delay, self.rate_limit_sleep, self.backoff_enabled, self.backoff_multiplier,
+                self.backoff_max, self.download_workers_per_domain, self.domain_concurrency,
+                self.extract_rate, self.extract_burst, self.download_rate, self.download_burst, self.domain_rates)
+
     def get_episodes_by_series_id(self, series_id):
         """Returns all episodes for the given series"""
         logger.debug('Begin call Sonarr for all episodes for series_id: {}'.format(series_id))
         args = {'seriesId': series_id}
-        res = self.request_get("{}/{}/episode".format(
-            self.base_url, 
-            self.sonarr_api_version
-            ), args
-        )
+        url = "{}/{}/episode".format(self.base_url, self.sonarr_api_version)
+        if self.stream_json:
+            return self.request_records(url, args, EpisodeRecord)
+        res = self.request_get(url, args)
         return res.json()
 
+    def get_episodes_by_series_ids(self, series_ids):
+        """Returns the episodes of several series, fetched concurrently
+        - ``series_ids``: Sonarr series ids
+        returns:
+            ``list``: one episode list per id, in the order given
+        """
+        return self.sonarr_map(self.get_episodes_by_series_id, series_ids)
+
+    def sonarr_map(self, call, series_ids):
+        """Run a per-series Sonarr call for several series concurrently
+
+        Not paced by sleep_requests, which is meant for the streaming
+        sites: max_concurrent_requests bounds the load on Sonarr, and the
+        opt-in sonarr request_delay spaces out the start of each call.
+        - ``call``: method taking one series id
+        - ``series_ids``: Sonarr series ids
+        returns:
+            ``list``: one result per id, in the order given
+        """
+        pacer = RequestPacer(self.sonarr_request_delay)
+
+        def fetch(series_id):
+            pacer.wait()
+            return call(series_id)
+
+        if self.sonarr_workers <= 1 or len(series_ids) <= 1:
+            return [fetch(series_id) for series_id in series_ids]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.sonarr_workers) as pool:
+            return list(pool.map(fetch, series_ids))
+
     def get_episode_files_by_series_id(self, series_id):
         """Returns all episode files for the given series"""
         res = self.request_get("{}/{}/episodefile?seriesId={}".format(
@@ -182,24 +582,212 @@ class StreamHarvester(object):
     def get_series(self):
         """Return all series in your collection"""
         logger.debug('Begin call Sonarr for all available series')
-        res = self.request_get("{}/{}/series".format(
-            self.base_url, 
-            self.sonarr_api_version
-        ))
+        url = "{}/{}/series".format(self.base_url, self.sonarr_api_version)
+        if self.stream_json:
+            return self.request_records(url, None, SeriesRecord)
+        res = self.request_get(url)
         return res.json()
 
     def get_series_by_series_id(self, series_id):
-        """Return the series with the matching ID or 404 if no matching series is found"""
+        """Return the series with the matching ID, or None if Sonarr has no such series
+        raises:
+            ``requests.HTTPError``: Sonarr answered with any other error
+        """
         logger.debug('Begin call Sonarr for specific series series_id: {}'.format(series_id))
-        res = self.request_get("{}/{}/series/{}".format(
-            self.base_url,
-            self.sonarr_api_version,
-            series_id
-        ))
+        try:
+            res = self.request_get("{}/{}/series/{}".format(
+                self.base_url,
+                self.sonarr_api_version,
+                series_id
+            ))
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return None
+            raise
+        if self.stream_json:
+            return SeriesRecord(res.json())
         return res.json()
 
-    def request_get(self, url, params=None):
-        """Wrapper on the requests.get"""
+    def sonarrseries(self):
+        """Return the Sonarr series to match against the config
+
+        The full /series list is only fetched every series_cache_ttl
+        minutes (and after a config reload). In between, only the series
+        matched last time are fetched, by id, unless there are more than
+        SERIES_BY_ID_MAX of them.
+        returns:
+            ``(series, full)``: list of Sonarr series, and whether it is
+            the full list
+        """
+        age = time.time() - self.series_catalogue_at
+        cached = 0 < len(self.series_catalogue) <= SERIES_BY_ID_MAX
+        if self.series_cache_ttl > 0 and cached and age < self.series_cache_ttl * 60:
+            series = [ser for ser in self.sonarr_map(self.get_series_by_series_id, list(self.series_catalogue)) if ser]
+            logger.debug('Fetched {} cached series by id'.format(len(series)))
+            return series, False
+        return self.get_series(), True
+
+    def updatecatalogue(self, matched, full):
+        """Remember the matched series and log what changed since last scan
+        - ``matched``: series returned by filterseries
+        - ``full``: True if they were matched against the full /series list
+        """
+        catalogue = {}
+        for ser in matched:
+            catalogue[ser['id']] = {'title': ser['title'], 'path': ser['path'], 'monitored': ser['monitored']}
+        if self.series_catalogue_at:
+            for series_id, summary in catalogue.items():
+                before = self.series_catalogue.get(series_id)
+                if before is None:
+                    logger.info('New series matched in Sonarr: {}'.format(summary['title']))
+                elif before != summary:
+                    logger.info('Series changed in Sonarr: {}'.format(summary['title']))
+            for series_id, summary in self.series_catalogue.items():
+                if series_id not in catalogue:
+                    logger.info('Series no longer matched in Sonarr: {}'.format(summary['title']))
+        if full:
+            self.series_catalogue_at = time.time()
+        elif set(catalogue) != set(self.series_catalogue):
+            # Deleted or renamed in Sonarr: rematch against the full list
+            self.series_catalogue_at = 0
+        self.series_catalogue = catalogue
+
+    def get_wanted_missing(self, series_ids):
+        """Return monitored, missing, aired episodes for the given series
+        - ``series_ids``: Sonarr ids of the series we harvest
+        returns:
+            ``dict``: {series_id: [episodes]}, or None if this Sonarr does
+            not provide the wanted/missing endpoint (HTTP 404 or a
+            response that isn't a page of records)
+        raises:
+            ``requests.RequestException``: the request failed some other
+            way, which may well succeed on the next scan
+        """
+        logger.debug('Begin call Sonarr for wanted/missing episodes')
+        url = "{}/{}/wanted/missing".format(self.base_url, self.sonarr_api_version)
+        wanted = {}
+        page = 1
+        while True:
+            params = {
+                'page': page,
+                'pageSize': WANTED_PAGE_SIZE,
+                'sortKey': 'airDateUtc',
+                'sortDirection': 'descending',
+                'monitored': 'true',
+                'includeSeries': 'false',
+            }
+            try:
+                res = self.request_get(url, params, stream=self.stream_json)
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code == 404:
+                    logger.debug('wanted/missing returned HTTP 404')
+                    return None
+                raise
+            with res:
+                try:
+                    if self.stream_json:
+                        data = {}
+                        data['records'] = [EpisodeRecord(item) for item in iter_json_array(
+                            res.iter_content(CHUNK_SIZE), 'records', data)]
+                    else:
+                        data = res.json()
+                except ValueError as e:
+                    logger.debug('wanted/missing returned an unexpected response: {}'.format(e))
+                    return None
+            if not isinstance(data, dict) or not isinstance(data.get('records'), list):
+                logger.debug('wanted/missing returned an unexpected response')
+                return None
+            for eps in data['records']:
+                if eps.get('seriesId') in series_ids:
+                    wanted.setdefault(eps['seriesId'], []).append(eps)
+            if not data['records'] or page * WANTED_PAGE_SIZE >= data.get('totalRecords', 0):
+                break
+            page += 1
+        # Match the per-series endpoint's episode order
+        for episodes in wanted.values():
+            episodes.sort(key=lambda eps: (eps.get('seasonNumber', 0), eps.get('episodeNumber', 0)))
+        logger.debug('wanted/missing: {} page(s), {} episode(s) for harvested series'.format(
+            page, sum(len(eps) for eps in wanted.values())
+        ))
+        return wanted
+
+    def get_calendar(self, series_ids, start, end):
+        """Return monitored episodes airing between ``start`` and ``end``
+        - ``series_ids``: Sonarr ids of the series we harvest
+        - ``start``, ``end``: naive UTC datetimes bounding the window
+        returns:
+            ``dict``: {series_id: [episodes]}
+        """
+        logger.debug('Begin call Sonarr for upcoming episodes')
+        url = "{}/{}/calendar".format(self.base_url, self.sonarr_api_version)
+        params = {
+            'start': start.strftime(date_format),
+            'end': end.strftime(date_format),
+            'unmonitored': 'false',
+        }
+        upcoming = {}
+        try:
+            if self.stream_json:
+                episodes = self.request_records(url, params, EpisodeRecord)
+            else:
+                episodes = self.request_get(url, params).json()
+        except (requests.RequestException, ValueError) as e:
+            logger.warning('Sonarr calendar request failed - no upcoming episodes this scan: {}'.format(e))
+            return upcoming
+        for eps in episodes:
+            if eps.get('seriesId') in series_ids:
+                upcoming.setdefault(eps['seriesId'], []).append(eps)
+        return upcoming
+
+    def sonarr_session(self):
+        """Build the pooled keep-alive session every Sonarr call goes through
+
+        Idempotent requests are retried on connection errors and 429/5xx
+        responses with jittered exponential backoff. Commands (POST) are
+        only retried when the connection itself failed, so a slow Sonarr
+        never ends up with the same command queued twice.
+        """
+        retry = urllib3.util.Retry(
+            total=self.sonarr_retries,
+            backoff_factor=0.5,
+            backoff_jitter=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'PUT', 'DELETE', 'HEAD', 'OPTIONS']),
+            raise_on_status=False,
+        )
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max(10, self.download_workers, self.sonarr_workers),
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+        session.hooks['response'].append(sonarr_metrics_hook)
+        return session
+
+    def request_records(self, url, params, record):
+        """GET a JSON array from Sonarr, parsed item by item into records
+        - ``record``: Record class to keep each item as
+        returns:
+            ``list`` of records
+        raises:
+            ``requests.exceptions.InvalidJSONError``: the body isn't the
+            expected JSON (truncated, or an HTML error page), so callers
+            handle it like any other failed request
+        """
+        with self.request_get(url, params, stream=True) as res:
+            try:
+                return [record(item) for item in iter_json_array(res.iter_content(CHUNK_SIZE))]
+            except ValueError as e:
+                raise requests.exceptions.InvalidJSONError(
+                    'Invalid JSON from {}: {}'.format(url, e), response=res
+                ) from e
+
+    def request_get(self, url, params=None, stream=False):
+        """Wrapper on the requests.get; raises requests.HTTPError for an
+        error response"""
         logger.debug('Begin GET request to Sonarr API')
         args = {
             "apikey": self.api_key
@@ -211,7 +799,8 @@ class StreamHarvester(object):
             url,
             urllib.parse.urlencode(args)
         )
-        res = requests.get(url)
+        res = self.session.get(url, timeout=self.sonarr_timeout, stream=stream)
+        self.checkresponse(res)
         return res
 
     def request_put(self, url, params=None, jsondata=None):
@@ -220,20 +809,38 @@ class StreamHarvester(object):
         headers = {
             'Content-Type': 'application/json',
         }
-        args = (
-            ('apikey', self.api_key),
-        )
+        args = {
+            'apikey': self.api_key,
+        }
         if params is not None:
             args.update(params)
             logger.debug('PUT request params keys: {}'.format(list(params.keys())))
-        res = requests.post(
+        res = self.session.post(
             url,
             headers=headers,
             params=args,
-            json=jsondata
+            json=jsondata,
+            timeout=self.sonarr_timeout
         )
+        self.checkresponse(res)
         return res
 
+    def checkresponse(self, res):
+        """Raise for a Sonarr error response
+
+        The session's retries hand back the last 429/5xx once they run
+        out rather than raising, so its error body would otherwise be
+        read as data.
+        raises:
+            ``requests.HTTPError``: with the response attached; the
+            message leaves out the query string, which holds the API key
+        """
+        if res.ok:
+            return
+        res.close()
+        raise requests.HTTPError('Sonarr answered HTTP {} for {}'.format(
+            res.status_code, urllib.parse.urlsplit(res.url).path), response=res)
+
     def rescanseries(self, series_id):
         """Refresh series information from trakt and rescan disk"""
         logger.debug('Begin call Sonarr to rescan for series_id: {}'.format(series_id))
@@ -275,7 +882,8 @@ class StreamHarvester(object):
 
         # Inheritable keys: series value wins if present, else fall back to service
         inheritable_keys = ('username', 'password', 'cookies_file', 'format',
-                            'playlistreverse', 'offset', 'subtitles', 'regex')
+                            'playlistreverse', 'offset', 'subtitles', 'regex', 'retry_cadence',
+                            'playlist_cache')
         for key in inheritable_keys:
             if key not in merged and key in svc:
                 merged[key] = svc[key]
@@ -321,77 +929,204 @@ class StreamHarvester(object):
 
         return merged
 
+    def seriesconfig(self, wnt):
+        """Resolve one series config entry into the keys filterseries adds
+        - ``wnt``: series entry from config.yml, services already merged
+        returns:
+            ``dict``: settings to overlay on the matching Sonarr series
+        """
+        # Set default values
+        settings = {
+            'subtitles': False,
+            'playlistreverse': True,
+            'subtitles_languages': ['en'],
+            'subtitles_autogenerated': False,
+            'retry_cadence': self.retry_cadence,
+        }
+        # Update values
+        if 'regex' in wnt:
+            regex = wnt['regex']
+            if 'sonarr' in regex:
+                settings['sonarr_regex'] = re.compile(regex['sonarr']['match'])
+                settings['sonarr_regex_match'] = regex['sonarr']['match']
+                settings['sonarr_regex_replace'] = regex['sonarr']['replace']
+            if 'site' in regex:
+                settings['site_regex_match'] = regex['site']['match']
+                settings['site_regex_replace'] = regex['site']['replace']
+        if 'offset' in wnt:
+            settings['offset'] = wnt['offset']
+        if 'retry_cadence' in wnt:
+            try:
+                settings['retry_cadence'] = parse_retry_cadence(wnt['retry_cadence'])
+            except (KeyError, TypeError, ValueError):
+                logger.warning('Invalid retry_cadence for {} - using the global cadence'.format(wnt['title']))
+        if 'cookies_file' in wnt:
+            settings['cookies_file'] = wnt['cookies_file']
+        if 'username' in wnt:
+            settings['username'] = wnt['username']
+        if 'password' in wnt:
+            settings['password'] = wnt['password']
+        if 'format' in wnt:
+            settings['format'] = wnt['format']
+        if 'playlistreverse' in wnt:
+            if wnt['playlistreverse'] == 'False':
+                settings['playlistreverse'] = False
+        if 'playlist_cache' in wnt:
+            # Oldest-first playlists add new videos at the bottom, past
+            # where an incremental crawl stops
+            settings['playlist_cache'] = wnt['playlist_cache'] in ['true', 'True', True]
+        if 'subtitles' in wnt:
+            settings['subtitles'] = True
+            if 'languages' in wnt['subtitles']:
+                settings['subtitles_languages'] = wnt['subtitles']['languages']
+            if 'autogenerated' in wnt['subtitles']:
+                settings['subtitles_autogenerated'] = wnt['subtitles']['autogenerated']
+        settings['url'] = wnt['url']
+        return settings
+
+    def indexseries(self):
+        """Compile the series config into a lookup table, once per load
+
+        Entries with a ``sonarr_id`` or ``tvdb_id`` are keyed on that id
+        only, the rest on their normalized title: ``('sonarr', id)``,
+        ``('tvdb', id)`` or ``('title', title)``. Each key maps to a list
+        so duplicate entries keep producing one match each.
+        series_config keeps the merged YAML entries for reload diffs.
+        """
+        self.series_index = {}
+        self.series_config = {}
+        for wnt in self.series:
+            # Merge service config before reading any keys (series overrides service)
+            wnt = self.merge_service_config(wnt)
+            if 'sonarr_id' in wnt:
+                key = ('sonarr', str(wnt['sonarr_id']))
+            elif 'tvdb_id' in wnt:
+                key = ('tvdb', str(wnt['tvdb_id']))
+            else:
+                key = ('title', normalize_title(wnt['title']))
+            self.series_config.setdefault(key, []).append(wnt)
+            try:
+                settings = self.seriesconfig(wnt)
+            except re.error as e:
+                logger.error('Series "{}" has an invalid sonarr regex - skipping: {}'.format(wnt.get('title', '?'), e))
+                continue
+            self.series_index.setdefault(key, []).append(settings)
+
+    def matchseries(self, ser):
+        """Return the config.yml matches of one Sonarr series, merged
+        with their settings; an empty list if it isn't harvested"""
+        matched = []
+        keys = [('sonarr', str(ser['id'])), ('tvdb', str(ser.get('tvdbId'))), ('title', normalize_title(ser['title']))]
+        for key in keys:
+            if key in self.changed_series:
+                # New or edited entry: search its episodes right away
+                self.changed_series.discard(key)
+                if key in self.series_index:
+                    self.store.reset_search_history(ser['id'])
+            for settings in self.series_index.get(key, []):
+                match = dict(ser)
+                match.update(settings)
+                matched.append(match)
+        return matched
+
     def filterseries(self):
         """Return all series in Sonarr that are to be downloaded by yt-dlp"""
-        series = self.get_series()
+        series, full = self.sonarrseries()
         matched = []
-        for ser in series[:]:
-            for wnt in self.series:
-                if normalize_title(wnt['title']) == normalize_title(ser['title']):
-                    # Merge service config before reading any keys (series overrides service)
-                    wnt = self.merge_service_config(wnt)
-                    # Set default values
-                    ser['subtitles'] = False
-                    ser['playlistreverse'] = True
-                    ser['subtitles_languages'] = ['en']
-                    ser['subtitles_autogenerated'] = False
-                    # Update values
-                    if 'regex' in wnt:
-                        regex = wnt['regex']
-                        if 'sonarr' in regex:
-                            ser['sonarr_regex_match'] = regex['sonarr']['match']
-                            ser['sonarr_regex_replace'] = regex['sonarr']['replace']
-                        if 'site' in regex:
-                            ser['site_regex_match'] = regex['site']['match']
-                            ser['site_regex_replace'] = regex['site']['replace']
-                    if 'offset' in wnt:
-                        ser['offset'] = wnt['offset']
-                    if 'cookies_file' in wnt:
-                        ser['cookies_file'] = wnt['cookies_file']
-                    if 'username' in wnt:
-                        ser['username'] = wnt['username']
-                    if 'password' in wnt:
-                        ser['password'] = wnt['password']
-                    if 'format' in wnt:
-                        ser['format'] = wnt['format']
-                    if 'playlistreverse' in wnt:
-                        if wnt['playlistreverse'] == 'False':
-                            ser['playlistreverse'] = False
-                    if 'subtitles' in wnt:
-                        ser['subtitles'] = True
-                        if 'languages' in wnt['subtitles']:
-                            ser['subtitles_languages'] = wnt['subtitles']['languages']
-                        if 'autogenerated' in wnt['subtitles']:
-                            ser['subtitles_autogenerated'] = wnt['subtitles']['autogenerated']
-                    ser['url'] = wnt['url']
-                    matched.append(ser)
+        for ser in series:
+            matched.extend(self.matchseries(ser))
         for check in matched:
             if not check['monitored']:
-                logger.warning('{0} is not currently monitored'.format(ser['title']))
+                logger.warning('{0} is not currently monitored'.format(check['title']))
         del series[:]
+        self.updatecatalogue(matched, full)
         return matched
 
-    def getseriesepisodes(self, series):
+    def findseries(self, series_id):
+        """Fetch and match a single Sonarr series (webhook harvests)
+        returns:
+            ``list``: its matches as from filterseries(); empty if Sonarr
+            doesn't have it or config.yml doesn't harvest it
+        """
+        ser = self.get_series_by_series_id(series_id)
+        if ser is None:
+            logger.warning('Series id {} not found in Sonarr'.format(series_id))
+            return []
+        matched = self.matchseries(ser)
+        if not matched:
+            logger.info('{} is not in config.yml - nothing to harvest'.format(ser['title']))
+            return []
+        if not ser['monitored']:
+            logger.warning('{0} is not currently monitored'.format(ser['title']))
+        # Fetched by id on the next scans even while the full series
+        # list is cached
+        self.series_catalogue[ser['id']] = {'title': ser['title'], 'path': ser['path'], 'monitored': ser['monitored']}
+        return matched
+
+    def getseriesepisodes(self, series, targeted=False):
+        """Return the wanted episodes of ``series``
+        - ``targeted``: fetch each series' episodes directly instead of
+          walking Sonarr's whole wanted/missing list; cheaper for a
+          harvest of one or two series
+        """
         needed = []
+        # Sonarr's airDateUtc is UTC; compare against UTC, fresh each scan
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        # Prefer Sonarr's server-side filtered wanted/missing list; fall
+        # back to fetching every episode of each series when unavailable.
+        wanted = None
+        if self.sonarr_wanted_missing and series and not targeted:
+            try:
+                wanted = self.get_wanted_missing({ser['id'] for ser in series})
+            except requests.RequestException as e:
+                # Most likely Sonarr being busy; try the endpoint again
+                # next scan
+                logger.warning('Sonarr wanted/missing request failed - fetching episodes per series this scan: {}'.format(e))
+            else:
+                if wanted is None:
+                    logger.info('Sonarr wanted/missing endpoint unavailable - fetching episodes per series')
+                    self.sonarr_wanted_missing = False
+                else:
+                    # wanted/missing only lists aired episodes; ask the
+                    # calendar for anything airing before the next scan so
+                    # we can wake up for it. A negative offset (early
+                    # access) makes episodes wanted before they air, so
+                    # look that much further ahead.
+                    lead = max([now - offsethandler(now, ser['offset']) for ser in series if 'offset' in ser]
+                               + [timedelta(0)])
+                    upcoming = self.get_calendar(
+                        {ser['id'] for ser in series},
+                        now,
+                        now + timedelta(minutes=int(SCANINTERVAL)) + lead
+                    )
+                    for series_id, episodes in upcoming.items():
+                        wanted.setdefault(series_id, []).extend(episodes)
+        if wanted is None:
+            fetched = self.get_episodes_by_series_ids([ser['id'] for ser in series])
+            wanted = {ser['id']: episodes for ser, episodes in zip(series, fetched)}
         for ser in series[:]:
-            episodes = self.get_episodes_by_series_id(ser['id'])
+            episodes = wanted.get(ser['id'], [])
             for eps in episodes[:]:
-                eps_date = now
+                if not eps['monitored']:
+                    episodes.remove(eps)
+                    continue
+                if eps['hasFile']:
+                    episodes.remove(eps)
+                    continue
+                # Episodes without an air date count as long aired so they
+                # fall into the slowest retry tier.
+                eps_date = datetime(1970, 1, 1)
                 if "airDateUtc" in eps:
                     eps_date = datetime.strptime(eps['airDateUtc'], date_format)
                     if 'offset' in ser:
                         eps_date = offsethandler(eps_date, ser['offset'])
-                if not eps['monitored']:
-                    episodes.remove(eps)
-                elif eps['hasFile']:
-                    episodes.remove(eps)
-                elif eps_date > now:
+                eps['eligible_at'] = eps_date.replace(tzinfo=timezone.utc).timestamp()
+                if eps_date > now:
+                    self.wake_at(eps['eligible_at'])
                     episodes.remove(eps)
                 else:
-                    if 'sonarr_regex_match' in ser:
-                        match = ser['sonarr_regex_match']
-                        replace = ser['sonarr_regex_replace']
-                        eps['title'] = re.sub(match, replace, eps['title'])
+                    if 'sonarr_regex' in ser:
+                        eps['title'] = ser['sonarr_regex'].sub(ser['sonarr_regex_replace'], eps['title'])
                     needed.append(eps)
                     continue
             if len(episodes) == 0:
@@ -410,6 +1145,49 @@ class StreamHarvester(object):
                     ))
         return needed
 
+    def wake_at(self, when):
+        """Ask the scan loop to run again no later than ``when`` (epoch)"""
+        if self.next_due is None or when < self.next_due:
+            self.next_due = when
+
+    def dueepisodes(self, series, episodes):
+        """Drop episodes searched too recently for their retry cadence
+        returns:
+            ``(series, episodes)``: series with something due and the due
+            episodes; the rest are scheduled with wake_at()
+        """
+        current = time.time()
+        attempts = self.store.episode_attempts(eps['id'] for eps in episodes)
+        cadences = {ser['id']: ser.get('retry_cadence', self.retry_cadence) for ser in series}
+        backoff = None
+        if self.search_backoff:
+            backoff = (self.search_backoff_after, self.search_backoff_multiplier, self.search_backoff_max * 3600)
+        due = []
+        for eps in episodes:
+            history = attempts.get(eps['id'], {'last_tried': None, 'misses': 0})
+            when = next_search(
+                cadences[eps['seriesId']],
+                eps['eligible_at'],
+                history['last_tried'],
+                history['misses'],
+                backoff
+            )
+            if when <= current:
+                due.append(eps)
+            else:
+                if history['misses'] > self.search_backoff_after:
+                    logger.debug('  {} missing {} times in a row - next search {}'.format(
+                        eps['title'],
+                        history['misses'],
+                        datetime.fromtimestamp(when).strftime('%Y-%m-%d %H:%M')
+                    ))
+                self.wake_at(when)
+        self.cycle.count('due', len(due))
+        if len(due) < len(episodes):
+            logger.info('{} of {} episodes due for a search'.format(len(due), len(episodes)))
+        due_series = {eps['seriesId'] for eps in due}
+        return [ser for ser in series if ser['id'] in due_series], due
+
     def appendcookie(self, ytdlopts, cookies=None):
         """Checks if specified cookie file exists in config
         - ``ytdlopts``: yt-dlp options to append cookie to
@@ -471,192 +1249,729 @@ class StreamHarvester(object):
         else:
             return ytdlopts
 
-    def ytdl_eps_search_opts(self, regextitle, playlistreverse, cookies=None, username=None, password=None):
+    def ytdl_eps_search_opts(self, cookies=None, username=None, password=None):
+        # No ignoreerrors: with process=False there are no per-entry
+        # errors to skip, and a failed crawl (e.g. a rate limit) has to
+        # raise so ytindex() can back the site off.
         ytdlopts = {
-            'ignoreerrors': True,
-            'playlistreverse': playlistreverse,
-            'matchtitle': regextitle,
             'quiet': True,
-            'match-filter': '!is_short & !url =~ /shorts/',  # Exclude YouTube Shorts
             'js_runtimes': JS_RUNTIMES,
         }
         if self.debug is True:
             ytdlopts.update({
                 'quiet': False,
                 'logger': YoutubeDLLogger(),
-                'progress_hooks': [ytdl_hooks],
             })
         ytdlopts = self.appendcookie(ytdlopts, cookies)
         ytdlopts = self.appendcredentials(ytdlopts, username, password)
         if self.debug is True:
-            logger.debug('yt-dlp opts configured for episode matching')
+            logger.debug('yt-dlp opts configured for playlist indexing')
         return ytdlopts
 
-    def ytsearch(self, ydl_opts, playlist):
+    def ytindex(self, ydl_opts, playlist, cache=None):
+        """Crawl a series/service URL and build its title index
+        - ``ydl_opts``: yt-dlp options from ytdl_eps_search_opts
+        - ``playlist``: channel, playlist or video URL to crawl
+        - ``cache``: the series' ``playlist_cache`` setting; None uses the
+          global one
+        returns:
+            ``PlaylistIndex`` of the playlist entries (``stale`` when they
+            come from the cache instead of a crawl), or None if the crawl
+            failed and nothing is cached
+        """
+        # With the playlist cache warm, only walk the newest part of the
+        # playlist: stop once a run of already-cached entries shows up. A
+        # periodic full crawl picks up anything appended further down
+        # (e.g. oldest-first season playlists) and drops removed videos.
+        if cache is None:
+            cache = self.playlist_cache
+        known = None
+        full = True
+        if cache:
+            last_full = self.store.playlist_last_full_crawl(playlist)
+            if last_full is not None and time.time() - last_full < self.playlist_full_refresh * 3600:
+                known = {entry['id'] for entry in self.store.playlist_entries(playlist)}
+                full = False
+        # process=False keeps entries flat (id, title, url) so the crawl
+        # costs one pass over the playlist pages instead of a full video
+        # extraction per entry.
+        result = None
+        entries = []
+        throttle = self.throttle_for(playlist)
+        # Crawls run on the scan thread; don't hold the scan up waiting out
+        # a site's rate limit cool-down
+        if not throttle.wait('extract'):
+            cached = self.store.playlist_entries(playlist) if cache else []
+            logger.warning('{} is cooling down from a rate limit for {:.0f} seconds - not crawling {} ({} cached entries)'.format(
+                throttle.domain, throttle.cooling_down(), playlist, len(cached)))
+            self.wake_at(throttle.blocked_until)
+            return PlaylistIndex(playlist, cached, stale=True) if cached else None
+        # Time the crawl itself, not the rate limit token wait
+        start = time.time()
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self.cycle.span('crawl/{}'.format(playlist)), youtubedl(ydl_opts, self.playlist_ie.get(playlist)) as ydl:
                 result = ydl.extract_info(
                     playlist,
-                    download=False
+                    download=False,
+                    process=False
                 )
+                # Restrict the next crawl to the extractor of the URL itself,
+                # not of wherever it redirects
+                extractor = result.get('extractor_key') if result else None
+                result = follow_redirects(ydl, result)
+                for entry in flatten_entries(result, known, self.playlist_cache_stop_after):
+                    entries.append(playlist_entry(entry))
+                entries = self.titleentries(ydl, throttle, playlist, entries)
         except Exception as e:
-            logger.error(e)
-        else:
-            video_url = None
-            # Prefer webpage_url over url: yt-dlp's YouTube extractor only sets
-            # url when format selection picks a single non-merge format. HLS
-            # videos (most modern YouTube uploads) trigger ffmpeg audio+video
-            # merge — the "merged format" dict (YoutubeDL._merge) has
-            # requested_formats but no top-level url, so info_dict.update gives
-            # us an entry with .get('url') == None even though extraction
-            # succeeded. webpage_url is always set by the YouTube extractor
-            # directly; the .get('url') fallback covers other extractors that
-            # only populate url. See issue #114.
-            if 'entries' in result and len(result['entries']) > 0:
-                for entry in result['entries']:
-                    if entry is None:
-                        continue
-                    video_url = entry.get('webpage_url') or entry.get('url')
-                    if video_url:
-                        break
+            if is_rate_limited(e):
+                self.ratelimited(throttle, playlist)
             else:
-                video_url = result.get('webpage_url') or result.get('url')
-            if playlist == video_url:
-                return False, ''
-            if video_url is None:
-                logger.error('No video_url')
-                return False, ''
-            else:
-                return True, video_url
+                logger.error(e)
+            # Possibly no longer the right extractor; probe every one next time
+            self.playlist_ie.pop(playlist, None)
+            result = None
+        if result is not None:
+            self.playlist_ie[playlist] = extractor
+            self.throttlesucceeded(throttle, 'extract')
+            metrics.set('stream_harvestarr_crawl_duration_seconds', time.time() - start, playlist=playlist)
+            metrics.set('stream_harvestarr_crawl_entries', len(entries), playlist=playlist)
+        if result is None:
+            # Also when a full refresh was due: stale entries beat none
+            cached = self.store.playlist_entries(playlist) if cache else []
+            if cached:
+                logger.warning('Crawl of {} failed - using {} cached entries'.format(playlist, len(cached)))
+                return PlaylistIndex(playlist, cached, stale=True)
+            logger.error('No playlist entries returned for {}'.format(playlist))
+            return None
+        if not cache:
+            logger.debug('Indexed {} entries from {}'.format(len(entries), playlist))
+            return PlaylistIndex(playlist, entries)
+        self.store.save_playlist(playlist, entries, full)
+        cached = self.store.playlist_entries(playlist)
+        logger.debug('{} crawl of {} read {} entries ({} cached)'.format(
+            'Full' if full else 'Incremental', playlist, len(entries), len(cached)
+        ))
+        return PlaylistIndex(playlist, cached)
 
-    def download(self, series, episodes):
-        if len(series) != 0:
-            logger.info("Processing Wanted Downloads")
-            for s, ser in enumerate(series):
-                logger.info("  {}:".format(ser['title']))
+    def titleentries(self, ydl, throttle, playlist, entries):
+        """Fill in the titles some sites leave out of flat playlist entries
+        - ``entries``: from playlist_entry()
+
+        A title already in the playlist cache is reused; otherwise the
+        entry is extracted on its own. Entries still without a title are
+        dropped, as nothing could ever match them.
+        returns:
+            ``entries`` that have a title
+        """
+        untitled = [entry for entry in entries if not entry['title']]
+        if not untitled:
+            return entries
+        cached = {}
+        if self.playlist_cache:
+            cached = {entry['id']: entry['title'] for entry in self.store.playlist_entries(playlist)}
+        resolved = 0
+        for entry in untitled:
+            entry['title'] = cached.get(entry['id']) or ''
+            if entry['title']:
+                continue
+            if not throttle.wait('extract'):
+                # Rate limited mid-crawl; the rest stay untitled this scan
+                break
+            try:
+                info = ydl.extract_info(entry['webpage_url'], ie_key=entry['ie_key'], download=False, process=False)
+            except Exception as e:
+                if is_rate_limited(e):
+                    raise
+                logger.debug('Could not read the title of {}: {}'.format(entry['webpage_url'], e))
+                continue
+            entry['title'] = (info or {}).get('title') or ''
+            resolved += 1
+        titled = [entry for entry in entries if entry['title']]
+        logger.debug('{} entries of {} had no title; extracted {}'.format(len(untitled), playlist, resolved))
+        if len(titled) < len(entries):
+            logger.warning('{} entries of {} have no title and cannot be matched'.format(
+                len(entries) - len(titled), playlist))
+        return titled
+
+    def extract_video(self, ydl, url, ie_key=None):
+        """Extract a single video at most once per VIDEO_INFO_TTL
+        - ``ydl``: YoutubeDL instance to extract with
+        - ``url``: video URL from the playlist index
+        - ``ie_key``: extractor recorded in the index, skips the URL probe
+        returns:
+            ``info``: unprocessed info dict (formats not yet selected), a
+            fresh copy so the caller may hand it to process_ie_result
+        raises:
+            ``CoolingDown``: the site is cooling down from a rate limit
+        """
+        cached = self.video_info.get(url)
+        if cached is not None and time.time() - cached[0] < VIDEO_INFO_TTL:
+            logger.debug('      Reusing extracted info for {}'.format(url))
+            return copy_info(cached[1])
+        throttle = self.throttle_for(url)
+        if not throttle.wait('extract'):
+            raise CoolingDown(throttle)
+        info = ydl.extract_info(url, download=False, ie_key=ie_key, process=False)
+        self.video_info[url] = (time.time(), info)
+        return copy_info(info)
+
+    def expirevideoinfo(self):
+        """Forget extracted video info older than VIDEO_INFO_TTL, including
+        that of downloads that failed"""
+        cutoff = time.time() - VIDEO_INFO_TTL
+        for url, (extracted_at, info) in list(self.video_info.items()):
+            if extracted_at < cutoff:
+                self.video_info.pop(url, None)
+
+    def ytdl_download_opts(self, ser, eps):
+        """Build the yt-dlp options used to download one episode"""
+        outtmpl = '/sonarr_root{0}/Season {1}/{2} - S{1}E{3} - {4} WEBDL.%(ext)s'.format(
+            ser['path'],
+            eps['seasonNumber'],
+            ser['title'],
+            eps['episodeNumber'],
+            eps['title']
+        )
+        if self.scratch_dir:
+            # Mirror the library layout under the scratch directory so
+            # librarypath() can map finished files back.
+            outtmpl = os.path.join(self.scratch_dir, outtmpl.lstrip('/'))
+        ytdl_format_options = {
+            'format': self.ytdl_format,
+            'quiet': True,
+            "merge_output_format": self.ytdl_merge_output_format,
+            'outtmpl': outtmpl,
+            'progress_hooks': [ytdl_hooks],
+            'noplaylist': True,
+            'forceipv4': True,
+            'sleep_interval': 5,
+            'max_sleep_interval': 30,
+            # Resume .part files and fragment state left by a crash or
+            # restart (in scratch_dir, when set)
+            'continuedl': True,
+            'nooverwrites': True,
+            'throttled_rate': '100K',
+            'concurrent_fragments': 5,
+            'js_runtimes': JS_RUNTIMES,
+        }
+
+        # Add sleep_interval_requests if configured
+        if self.sleep_requests > 0:
+            ytdl_format_options['sleep_interval_requests'] = self.sleep_requests
+
+        ytdl_format_options = self.appendcookie(ytdl_format_options, ser.get('cookies_file'))
+        ytdl_format_options = self.appendcredentials(ytdl_format_options, ser.get('username'), ser.get('password'))
+
+        if 'format' in ser:
+            ytdl_format_options = self.customformat(ytdl_format_options, ser['format'])
+        if 'subtitles' in ser:
+            if ser['subtitles']:
+                postprocessors = []
+                postprocessors.append({
+                    'key': 'FFmpegSubtitlesConvertor',
+                    'format': 'srt',
+                })
+                postprocessors.append({
+                    'key': 'FFmpegEmbedSubtitle',
+                })
+                # filterseries() seeds this to a Python bool (False)
+                # before optionally overriding with the user's YAML
+                # string, so handle both shapes.
+                autosubs_raw = ser['subtitles_autogenerated']
+                autosubs = autosubs_raw if isinstance(autosubs_raw, bool) else autosubs_raw.lower() in ['true', 't', 'y', 'yes']
+                ytdl_format_options.update({
+                    'writesubtitles': True,
+                    'writeautomaticsub': autosubs,
+                    'subtitleslangs': ser['subtitles_languages'],
+                    'postprocessors': postprocessors,
+                })
+
+        if self.debug is True:
+            ytdl_format_options.update({
+                'quiet': False,
+                'logger': YoutubeDLLogger(),
+                'progress_hooks': [ytdl_hooks_debug],
+            })
+            logger.debug('yt-dlp opts configured for downloading')
+        ytdl_format_options['progress_hooks'] = ytdl_format_options['progress_hooks'] + [ytdl_metrics_hook]
+        return ytdl_format_options
+
+    def librarypath(self, path):
+        """Map a finished file in the scratch directory to its library path"""
+        return os.path.join('/', os.path.relpath(path, self.scratch_dir))
+
+    def movetolibrary(self, files):
+        """Move finished, post-processed files from scratch into the library"""
+        for path in files:
+            dest = self.librarypath(path)
+            move_into_library(path, dest)
+            logger.debug('      Moved {} into the library'.format(os.path.basename(dest)))
+
+    def throttle_for(self, url):
+        """Return the DomainThrottle shared by every crawl and download from
+        url's site"""
+        domain = domain_of(url)
+        with self.throttles_lock:
+            if domain not in self.throttles:
+                rates = self.domain_rates.get(domain, {})
+                throttle = DomainThrottle(
+                    domain,
+                    concurrency=self.domain_concurrency.get(domain, self.download_workers_per_domain),
+                    download_delay=self.download_delay,
+                    rate_limit_sleep=self.rate_limit_sleep,
+                    backoff_enabled=self.backoff_enabled,
+                    backoff_multiplier=self.backoff_multiplier,
+                    backoff_max=self.backoff_max,
+                    extract_rate=rates.get('extract_rate', self.extract_rate),
+                    extract_burst=self.extract_burst,
+                    download_rate=rates.get('download_rate', self.download_rate),
+                    download_burst=self.download_burst,
+                )
+                # Backoff from before a restart or config reload
+                state = self.store.domain_backoff(domain)
+                if state is not None:
+                    throttle.restore_backoff(state)
+                    if throttle.rate_limit_count > 0:
+                        metrics.set('stream_harvestarr_rate_limit_backoff_seconds', throttle.current_backoff, domain=domain)
+                    if throttle.blocked_until > time.time():
+                        logger.info('{} is still cooling down from a rate limit for {:.0f} seconds'.format(
+                            domain, throttle.blocked_until - time.time()))
+                self.throttles[domain] = throttle
+            return self.throttles[domain]
+
+    def ratelimited(self, throttle, title):
+        """Back off a site after a rate limit and log it against ``title``"""
+        count, backoff = throttle.rate_limited()
+        self.store.save_domain_backoff(throttle.domain, throttle.backoff_state())
+        metrics.inc('stream_harvestarr_rate_limits_total', domain=throttle.domain)
+        metrics.set('stream_harvestarr_rate_limit_backoff_seconds', backoff, domain=throttle.domain)
+        if self.backoff_enabled and count > 1:
+            logger.error("      Failed - {} - RATE LIMITED (attempt {})".format(title, count))
+            logger.warning("      Exponential backoff: Pausing {} requests for {} seconds ({}m {}s)...".format(
+                throttle.domain,
+                backoff,
+                backoff // 60,
+                backoff % 60
+            ))
+        else:
+            logger.error("      Failed - {} - RATE LIMITED".format(title))
+            logger.warning("      Rate limit detected. Pausing {} requests for {} seconds...".format(throttle.domain, backoff))
+
+    def throttlesucceeded(self, throttle, kind='download'):
+        if throttle.succeeded(kind):
+            self.store.save_domain_backoff(throttle.domain, throttle.backoff_state())
+            metrics.set('stream_harvestarr_rate_limit_backoff_seconds', 0, domain=throttle.domain)
+
+    def findepisodes(self, series, episodes, record=True):
+        """Resolve wanted episodes against each series' playlist index
+        - ``record``: False leaves the search history untouched (--plan)
+        returns:
+            ``jobs``: list of dicts (series, episode, url, ie_key) to download
+        """
+        jobs = []
+        # One crawl per distinct playlist (and credential set) per cycle
+        indexes = {}
+        for s, ser in enumerate(series):
+            logger.info("  {}:".format(ser['title']))
+            with self.cycle.span('search/{}'.format(ser['title'])):
                 for e, eps in enumerate(episodes):
                     if ser['id'] == eps['seriesId']:
-                        cookies = None
-                        username = None
-                        password = None
+                        cookies = ser.get('cookies_file')
+                        username = ser.get('username')
+                        password = ser.get('password')
                         url = ser['url']
-                        if 'cookies_file' in ser:
-                            cookies = ser['cookies_file']
-                        if 'username' in ser:
-                            username = ser['username']
-                        if 'password' in ser:
-                            password = ser['password']
-                        ydleps = self.ytdl_eps_search_opts(upperescape(eps['title']), ser['playlistreverse'], cookies, username, password)
-                        found, dlurl = self.ytsearch(ydleps, url)
-                        if found:
+                        cache = ser.get('playlist_cache', self.playlist_cache)
+                        index_key = (url, cookies, username, cache)
+                        if index_key not in indexes:
+                            ydleps = self.ytdl_eps_search_opts(cookies, username, password)
+                            indexes[index_key] = self.ytindex(ydleps, url, cache)
+                        index = indexes[index_key]
+                        match = None
+                        if index is not None:
+                            match = index.search(eps['title'], ser['playlistreverse'])
+                            if match is None and self.fuzzy_match:
+                                scored = index.fuzzy_search(eps['title'], eps.get('airDateUtc'), self.fuzzy_threshold)
+                                if scored is not None:
+                                    match, score = scored
+                                    logger.info("    {}: Fuzzy match ({:.0f}%) - {}".format(e + 1, score, match['title']))
+                            # Missing from a failed or skipped crawl's
+                            # cached entries doesn't count as a search
+                            if record and (match or not index.stale):
+                                self.store.record_attempt(eps['id'], ser['id'], 'found' if match else 'missing')
+                        if match:
+                            self.countepisode('found')
                             logger.info("    {}: Found - {}:".format(e + 1, eps['title']))
-                            ytdl_format_options = {
-                                'format': self.ytdl_format,
-                                'quiet': True,
-                                "merge_output_format": self.ytdl_merge_output_format,
-                                'outtmpl': '/sonarr_root{0}/Season {1}/{2} - S{1}E{3} - {4} WEBDL.%(ext)s'.format(
-                                    ser['path'],
-                                    eps['seasonNumber'],
-                                    ser['title'],
-                                    eps['episodeNumber'],
-                                    eps['title']
-                                ),
-                                'progress_hooks': [ytdl_hooks],
-                                'noplaylist': True,
-                                'forceipv4': True,
-                                'sleep_interval': 5,
-                                'max_sleep_interval': 30,
-                                'nocontinue': True,
-                                'nooverwrites': True,
-                                'throttled_rate': '100K',
-                                'concurrent_fragments': 5,
-                                'js_runtimes': JS_RUNTIMES,
-                            }
-
-                            # Add sleep_interval_requests if configured
-                            if self.sleep_requests > 0:
-                                ytdl_format_options['sleep_interval_requests'] = self.sleep_requests
-
-                            ytdl_format_options = self.appendcookie(ytdl_format_options, cookies)
-                            ytdl_format_options = self.appendcredentials(ytdl_format_options, username, password)
-
-                            if 'format' in ser:
-                                ytdl_format_options = self.customformat(ytdl_format_options, ser['format'])
-                            if 'subtitles' in ser:
-                                if ser['subtitles']:
-                                    postprocessors = []
-                                    postprocessors.append({
-                                        'key': 'FFmpegSubtitlesConvertor',
-                                        'format': 'srt',
-                                    })
-                                    postprocessors.append({
-                                        'key': 'FFmpegEmbedSubtitle',
-                                    })
-                                    # filterseries() seeds this to a Python bool (False)
-                                    # before optionally overriding with the user's YAML
-                                    # string, so handle both shapes.
-                                    autosubs_raw = ser['subtitles_autogenerated']
-                                    autosubs = autosubs_raw if isinstance(autosubs_raw, bool) else autosubs_raw.lower() in ['true', 't', 'y', 'yes']
-                                    ytdl_format_options.update({
-                                        'writesubtitles': True,
-                                        'writeautomaticsub': autosubs,
-                                        'subtitleslangs': ser['subtitles_languages'],
-                                        'postprocessors': postprocessors,
-                                    })
-
-                            if self.debug is True:
-                                ytdl_format_options.update({
-                                    'quiet': False,
-                                    'logger': YoutubeDLLogger(),
-                                    'progress_hooks': [ytdl_hooks_debug],
-                                })
-                                logger.debug('yt-dlp opts configured for downloading')
-                            try:
-                                with yt_dlp.YoutubeDL(ytdl_format_options) as ydl:
-                                     ydl.download([dlurl])
-                                self.rescanseries(ser['id'])
-                                logger.info("      Downloaded - {}".format(eps['title']))
-                                # Reset backoff on successful download
-                                if self.rate_limit_count > 0:
-                                    logger.info("      Rate limit recovered - resetting backoff counter")
-                                    self.rate_limit_count = 0
-                                    self.current_backoff = self.rate_limit_sleep
-                                # Add delay between downloads if configured
-                                if self.download_delay > 0:
-                                    logger.debug("      Waiting {} seconds before next download".format(self.download_delay))
-                                    time.sleep(self.download_delay)
-                            except Exception as e:
-                                error_msg = str(e)
-                                # Check if this is a rate limit error
-                                if 'rate-limited' in error_msg.lower() or 'rate limit' in error_msg.lower() or 'try again later' in error_msg.lower():
-                                    self.rate_limit_count += 1
-
-                                    # Calculate backoff with exponential increase if enabled
-                                    if self.backoff_enabled and self.rate_limit_count > 1:
-                                        self.current_backoff = min(
-                                            int(self.rate_limit_sleep * (self.backoff_multiplier ** (self.rate_limit_count - 1))),
-                                            self.backoff_max
-                                        )
-                                        logger.error("      Failed - entry %d - RATE LIMITED (attempt %d)", e + 1, self.rate_limit_count)
-                                        logger.warning("      Exponential backoff: Sleeping for {} seconds ({}m {}s)...".format(
-                                            self.current_backoff,
-                                            self.current_backoff // 60,
-                                            self.current_backoff % 60
-                                        ))
-                                    else:
-                                        self.current_backoff = self.rate_limit_sleep
-                                        logger.error("      Failed - entry %d - RATE LIMITED", e + 1)
-                                        logger.warning("      YouTube rate limit detected. Sleeping for {} seconds...".format(self.current_backoff))
-
-                                    time.sleep(self.current_backoff)
-                                    logger.info("      Resuming downloads after rate limit cooldown")
-                                else:
-                                    logger.error("      Failed - entry %d - download error", e + 1)
+                            jobs.append({
+                                'series': ser,
+                                'episode': eps,
+                                'url': match['webpage_url'],
+                                'ie_key': match['ie_key'],
+                            })
                         else:
+                            self.countepisode('missing')
                             logger.info("    {}: Missing - {}:".format(e + 1, eps['title']))
+        return jobs
+
+    def estimatesize(self, job):
+        """Select the format a download of ``job`` would get, without downloading
+        returns:
+            ``dict``: ``format`` id and ``size`` in bytes (None when the site
+            doesn't report one); ``approximate`` when any part of it is only
+            the site's estimate
+        """
+        ytdl_opts = self.ytdl_download_opts(job['series'], job['episode'])
+        with youtubedl(ytdl_opts, job['ie_key']) as ydl:
+            info = self.extract_video(ydl, job['url'], job['ie_key'])
+            info = ydl.process_ie_result(info, download=False)
+        size = 0
+        approximate = False
+        for fmt in info.get('requested_formats') or [info]:
+            if fmt.get('filesize'):
+                size += fmt['filesize']
+            elif fmt.get('filesize_approx'):
+                size += fmt['filesize_approx']
+                approximate = True
+            else:
+                size = None
+                break
+        return {'format': info.get('format_id'), 'size': size, 'approximate': approximate}
+
+    def plan(self, series, episodes):
+        """What a scan would download, with estimated sizes (--plan)
+
+        Searches like download(), but every wanted episode rather than
+        just the due ones (``due`` marks those the next scan searches),
+        leaves the search history alone and downloads nothing. Sizes on a
+        site cooling down from a rate limit are left unknown.
+        returns:
+            ``dict``: the planned ``downloads`` and their ``total_bytes``
+        """
+        due = {eps['id'] for eps in self.dueepisodes(series, episodes)[1]}
+        jobs = self.findepisodes(series, episodes, record=False)
+        downloads = []
+        for job in jobs:
+            ser = job['series']
+            eps = job['episode']
+            planned = {
+                'series': ser['title'],
+                'series_id': ser['id'],
+                'episode_id': eps['id'],
+                'season': eps['seasonNumber'],
+                'episode': eps['episodeNumber'],
+                'title': eps['title'],
+                'url': job['url'],
+                'due': eps['id'] in due,
+            }
+            throttle = self.throttle_for(job['url'])
+            if throttle.cooling_down() > 0:
+                logger.warning('    Not estimating the size of {}: {} is cooling down from a rate limit'.format(
+                    eps['title'], throttle.domain))
+                planned.update({'format': None, 'size': None, 'approximate': False, 'error': 'cooling down'})
+                downloads.append(planned)
+                continue
+            try:
+                planned.update(self.estimatesize(job))
+                self.throttlesucceeded(throttle, 'extract')
+            except Exception as e:
+                if is_rate_limited(e):
+                    self.ratelimited(throttle, eps['title'])
+                logger.warning('    Could not estimate the size of {}: {}'.format(eps['title'], e))
+                planned.update({'format': None, 'size': None, 'approximate': False, 'error': str(e)})
+            downloads.append(planned)
+        return {
+            'wanted': len(episodes),
+            'downloads': downloads,
+            'total_bytes': sum(planned['size'] or 0 for planned in downloads),
+            'unknown_sizes': sum(1 for planned in downloads if planned['size'] is None),
+        }
+
+    def countepisode(self, result):
+        """Count a wanted episode's search or download ``result``"""
+        self.cycle.count(result)
+        metrics.inc('stream_harvestarr_episodes_total', result=result)
+
+    def downloadepisode(self, job):
+        """Download one resolved episode, honouring its site's throttle
+        returns:
+            ``bool``: True if the episode was downloaded, a ``Future`` of
+            run_postprocessors() when post-processing was handed to the
+            process pool (pass it to postprocessed() once done), or
+            DEFERRED if the site is cooling down from a rate limit
+        """
+        ser = job['series']
+        eps = job['episode']
+        dlurl = job['url']
+        throttle = self.throttle_for(dlurl)
+        try:
+            # Imports yt-dlp; not needed until something downloads
+            from postprocess import DeferredPostProcessor, postprocess_opts, run_postprocessors
+            # A sibling job on this site may have been rate limited since
+            # this one was dispatched; hand it back instead of sleeping
+            if not throttle.wait():
+                return DEFERRED
+            # Extract once (page fetch, JS challenge, format list) and
+            # download from that same info dict.
+            ytdl_opts = self.ytdl_download_opts(ser, eps)
+            # Final path of each file once merging and subtitle embedding
+            # are done
+            files = []
+            ytdl_opts['post_hooks'] = [files.append]
+            ydl_class = None if self.postprocess_pool is None else DeferredPostProcessor
+            with self.cycle.span('download/{}'.format(ser['title'])), youtubedl(ytdl_opts, job['ie_key'], ydl_class) as ydl:
+                info = self.extract_video(ydl, dlurl, job['ie_key'])
+                ydl.process_ie_result(info, download=True)
+            self.video_info.pop(dlurl, None)
+            self.throttlesucceeded(throttle)
+            if self.postprocess_pool is not None and ydl.deferred:
+                logger.debug("      Download finished, post-processing queued - {}".format(eps['title']))
+                return self.postprocess_pool.submit(run_postprocessors, postprocess_opts(ytdl_opts), ydl.deferred)
+            self.episodedone(job, files)
+            return True
+        except CoolingDown:
+            return DEFERRED
+        except Exception as e:
+            if is_rate_limited(e):
+                self.ratelimited(throttle, eps['title'])
+            else:
+                logger.error("      Failed - {} - download error: {}".format(eps['title'], e))
+            self.store.record_attempt(eps['id'], ser['id'], 'failed')
+            self.countepisode('failed')
+            return False
+        finally:
+            throttle.release()
+
+    def episodedone(self, job, files):
+        """Finish a downloaded episode whose files are fully post-processed
+        - ``files``: final path of each downloaded file
+        """
+        if self.scratch_dir:
+            self.movetolibrary(files)
+        # Rescanned once the series' batch is done; persisted so a
+        # crash before then doesn't lose it.
+        self.store.add_pending_rescan(job['series']['id'])
+        self.countepisode('downloaded')
+        logger.info("      Downloaded - {}".format(job['episode']['title']))
+
+    def postprocessed(self, job, future):
+        """Finish an episode once its background post-processing is done
+        - ``future``: returned by downloadepisode()
+        returns:
+            ``bool``: True if the episode was post-processed and is in place
+        """
+        ser = job['series']
+        eps = job['episode']
+        try:
+            files = future.result()
+            self.episodedone(job, files)
+            return True
+        except Exception as e:
+            logger.error("      Failed - {} - post-processing error: {}".format(eps['title'], e))
+            self.store.record_attempt(eps['id'], ser['id'], 'failed')
+            self.countepisode('failed')
+            return False
+
+    def flushrescans(self, series_ids=None):
+        """Send one RescanSeries per series with new downloads
+        - ``series_ids``: limit to these series; None flushes everything
+          pending, including rescans left over from an interrupted run
+        """
+        for series_id in self.store.pending_rescans():
+            if series_ids is not None and series_id not in series_ids:
+                continue
+            try:
+                self.rescanseries(series_id)
+            except (requests.RequestException, ValueError) as e:
+                logger.warning('Rescan of series_id {} failed, will retry next scan: {}'.format(series_id, e))
+                continue
+            self.store.clear_pending_rescan(series_id)
+            logger.debug('Rescan queued in Sonarr for series_id: {}'.format(series_id))
+
+    def rundownloads(self, jobs):
+        """Run download jobs, in parallel when download_workers > 1
+
+        Jobs are queued per site and only dispatched while that site is
+        below its concurrency cap, so a saturated site never ties up
+        workers that could be downloading from another. Jobs for a site
+        cooling down from a rate limit are left for a scan after the
+        cool-down ends.
+        With postprocess_workers set, finished downloads are merged and
+        have subtitles embedded in a process pool while the next download
+        runs; at most twice that many wait there before downloads pause.
+        Each series is rescanned once, after its last job finishes.
+        """
+        remaining = collections.Counter(job['series']['id'] for job in jobs)
+
+        def finished(job):
+            series_id = job['series']['id']
+            remaining[series_id] -= 1
+            if remaining[series_id] == 0:
+                self.flushrescans({series_id})
+
+        def defer(job, throttle):
+            # Waiting out the cool-down here would hold up the scan thread
+            # (and with it webhooks, SIGHUP and Sonarr) for up to backoff_max
+            logger.info('    {} is cooling down from a rate limit - {} deferred until {}'.format(
+                throttle.domain,
+                job['episode']['title'],
+                datetime.fromtimestamp(throttle.blocked_until).strftime('%H:%M:%S')
+            ))
+            self.countepisode('deferred')
+            # Found but never tried, so due again once the site is
+            self.store.clear_attempt(job['episode']['id'])
+            self.wake_at(throttle.blocked_until)
+            finished(job)
+
+        # Downloads waiting on the process pool: {future: job}
+        postprocessing = {}
+        postprocess_limit = 2 * self.postprocess_workers
+
+        def downloaded(job, result):
+            if result == DEFERRED:
+                defer(job, self.throttle_for(job['url']))
+            elif isinstance(result, concurrent.futures.Future):
+                postprocessing[result] = job
+            else:
+                finished(job)
+
+        def reap(futures):
+            for future in futures:
+                job = postprocessing.pop(future)
+                self.postprocessed(job, future)
+                finished(job)
+
+        def wait(limit):
+            # Block until fewer than limit downloads are post-processing
+            while len(postprocessing) >= max(1, limit):
+                done, _ = concurrent.futures.wait(postprocessing, return_when=concurrent.futures.FIRST_COMPLETED)
+                reap(done)
+
+        if self.postprocess_workers > 0:
+            # Imports yt-dlp
+            from postprocess import process_pool
+            self.postprocess_pool = process_pool(self.postprocess_workers)
+        try:
+            if self.download_workers <= 1:
+                for job in jobs:
+                    wait(postprocess_limit)
+                    reap([future for future in list(postprocessing) if future.done()])
+                    throttle = self.throttle_for(job['url'])
+                    if throttle.cooling_down() > 0:
+                        defer(job, throttle)
+                        continue
+                    throttle.reserve()
+                    downloaded(job, self.downloadepisode(job))
+                wait(1)
+                return
+            queues = {}
+            for job in jobs:
+                queues.setdefault(domain_of(job['url']), collections.deque()).append(job)
+            logger.info("  Downloading with {} workers across {} site(s)".format(self.download_workers, len(queues)))
+            running = {}
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.download_workers) as pool:
+                while queues or running or postprocessing:
+                    for domain in list(queues):
+                        throttle = self.throttle_for(queues[domain][0]['url'])
+                        if throttle.cooling_down() > 0:
+                            # Rate limited since the scan started: leave
+                            # the rest for after the cool-down rather than
+                            # park workers in wait()
+                            for job in queues.pop(domain):
+                                defer(job, throttle)
+                            continue
+                        while len(running) < self.download_workers and queues[domain]:
+                            if self.postprocess_pool is not None and len(running) + len(postprocessing) >= postprocess_limit + self.download_workers:
+                                break
+                            if not throttle.reserve():
+                                break
+                            job = queues[domain].popleft()
+                            running[pool.submit(self.downloadepisode, job)] = job
+                        if not queues[domain]:
+                            del queues[domain]
+                    if running or postprocessing:
+                        done, _ = concurrent.futures.wait(
+                            list(running) + list(postprocessing),
+                            return_when=concurrent.futures.FIRST_COMPLETED
+                        )
+                        for future in done:
+                            if future in running:
+                                job = running.pop(future)
+                                downloaded(job, future.result())
+                        reap([future for future in done if future in postprocessing])
+        finally:
+            if self.postprocess_pool is not None:
+                self.postprocess_pool.shutdown()
+                self.postprocess_pool = None
+            if self.scratch_dir:
+                # Left until nothing is downloading, so a directory isn't
+                # removed just as another download of the season starts.
+                for dirpath, _, _ in os.walk(self.scratch_dir, topdown=False):
+                    prune_empty_dirs(dirpath, self.scratch_dir)
+
+    def download(self, series, episodes, force=False):
+        """Search for and download wanted ``episodes``
+        - ``force``: search every episode now, ignoring its retry cadence
+          (webhook harvests)
+        """
+        if not force:
+            series, episodes = self.dueepisodes(series, episodes)
+        if len(series) != 0:
+            logger.info("Processing Wanted Downloads")
+            with self.cycle.phase('search'):
+                jobs = self.findepisodes(series, episodes)
+            with self.cycle.phase('download'):
+                self.rundownloads(jobs)
         else:
             logger.info("Nothing to process")
 
+    def webhookevent(self, headers, body):
+        """Handle a Sonarr Connect webhook: queue a harvest of the event's
+        series and wake the scan loop
+        returns:
+            ``(status, content_type, body)`` for serve()
+        """
+        if self.webhook_password:
+            scheme, _, credentials = headers.get('Authorization', '').partition(' ')
+            try:
+                password = base64.b64decode(credentials).decode('utf-8').partition(':')[2]
+            except (ValueError, UnicodeDecodeError):
+                password = ''
+            # Compared as bytes: compare_digest() rejects non-ASCII str
+            if scheme.lower() != 'basic' or not hmac.compare_digest(
+                    password.encode('utf-8'), self.webhook_password.encode('utf-8')):
+                logger.warning('Rejected a webhook with a missing or wrong password')
+                return 401, 'text/plain', 'Unauthorized\n'
+        try:
+            event = json.loads(body)
+        except ValueError:
+            event = None
+        if not isinstance(event, dict):
+            return 400, 'text/plain', 'Invalid JSON\n'
+        event_type = event.get('eventType')
+        ser = event.get('series') or {}
+        if event_type not in WEBHOOK_EVENTS or not ser.get('id'):
+            logger.debug('Ignoring Sonarr {} webhook'.format(event_type))
+            return 200, 'text/plain', 'Ignored\n'
+        with self.harvest_lock:
+            self.harvest_requests.add(ser['id'])
+        logger.info('Sonarr {} for {} - harvest queued'.format(event_type, ser.get('title', ser['id'])))
+        WAKEUP.wake()
+        return 202, 'text/plain', 'Queued\n'
+
+    def queuedharvests(self):
+        """Take the series ids queued by webhooks since the last call"""
+        with self.harvest_lock:
+            series_ids, self.harvest_requests = self.harvest_requests, set()
+        return series_ids
+
+    def set_log_level(self):
+        """Log at DEBUG with ``debug`` in config.yml or --debug, else INFO;
+        also lowers the level again when a reload turns ``debug`` off"""
+        level = logging.DEBUG if self.debug or args.debug else logging.INFO
+        logger.setLevel(level)
+        for logs in logger.handlers:
+            if logs.name in ('FileHandler', 'StreamHandler'):
+                logs.setLevel(level)
+
     def set_scan_interval(self, interval):
         global SCANINTERVAL
         if interval != SCANINTERVAL:
@@ -667,18 +1982,176 @@ class StreamHarvester(object):
         return
 
 
-def main():
-    client = StreamHarvester()
-    series = client.filterseries()
-    episodes = client.getseriesepisodes(series)
-    client.download(series, episodes)
-    logger.info('Waiting...')
+def main(client):
+    """Run one harvest cycle
+    returns:
+        ``bool``: False if Sonarr could not be reached and the scan was
+        skipped
+    """
+    global NEXT_DUE
+    ok = True
+    client.reloadconfig()
+    client.next_due = None
+    client.cycle = Cycle()
+    client.expirevideoinfo()
+    with PROFILER.cycle() if PROFILER else contextlib.nullcontext():
+        # Rescans a previous run queued but never sent; most scans have
+        # nothing to download, so don't leave this to rundownloads()
+        client.flushrescans()
+        try:
+            with client.cycle.phase('series'):
+                series = client.filterseries()
+            client.cycle.count('series', len(series))
+            with client.cycle.phase('episodes'):
+                episodes = client.getseriesepisodes(series)
+            client.cycle.count('wanted', len(episodes))
+            client.download(series, episodes)
+        except requests.RequestException as e:
+            # Keep the scheduler alive; the next scan retries from scratch.
+            logger.error('Sonarr request failed, skipping this scan: {}'.format(e))
+            ok = False
+        duration = time.time() - client.cycle.start
+        logger.info('Scan summary: {}'.format(client.cycle.summary()))
+    metrics.inc('stream_harvestarr_cycles_total')
+    metrics.observe('stream_harvestarr_cycle_duration_seconds', duration)
+    metrics.set('stream_harvestarr_last_cycle_duration_seconds', duration)
+    NEXT_DUE = client.next_due
+    if NEXT_DUE is not None and NEXT_DUE - time.time() < int(SCANINTERVAL) * 60:
+        logger.info('Waiting... next episode due at {}'.format(
+            datetime.fromtimestamp(NEXT_DUE).strftime('%Y-%m-%d %H:%M:%S')
+        ))
+    else:
+        logger.info('Waiting...')
+    return ok
+
+
+def harvest(client, series_ids):
+    """Search and download just ``series_ids``, right away (webhooks)
+
+    Unlike main(), every wanted episode of these series is searched,
+    however recently it was tried.
+    """
+    global NEXT_DUE
+    client.reloadconfig()
+    client.next_due = NEXT_DUE
+    client.cycle = Cycle()
+    try:
+        with client.cycle.phase('series'):
+            series = [match for series_id in sorted(series_ids) for match in client.findseries(series_id)]
+        client.cycle.count('series', len(series))
+        if series:
+            with client.cycle.phase('episodes'):
+                episodes = client.getseriesepisodes(series, targeted=True)
+            client.cycle.count('wanted', len(episodes))
+            client.download(series, episodes, force=True)
+    except requests.RequestException as e:
+        logger.error('Sonarr request failed, skipping this harvest: {}'.format(e))
+    logger.info('Harvest summary: {}'.format(client.cycle.summary()))
+    NEXT_DUE = client.next_due
+
+
+def plan(client):
+    """Print what the next scan would download as JSON (--plan)
+    returns:
+        ``bool``: False if Sonarr could not be reached
+    """
+    try:
+        series = client.filterseries()
+        episodes = client.getseriesepisodes(series)
+        planned = client.plan(series, episodes)
+    except requests.RequestException as e:
+        logger.error('Sonarr request failed, no plan made: {}'.format(e))
+        return False
+    logger.info('Plan: {} of {} wanted episodes found, {:.1f} GiB{}'.format(
+        len(planned['downloads']),
+        planned['wanted'],
+        planned['total_bytes'] / 2**30,
+        ' plus {} of unknown size'.format(planned['unknown_sizes']) if planned['unknown_sizes'] else ''
+    ))
+    print(json.dumps(planned, indent=2))
+    return True
+
+
+def httproutes(client):
+    """Routes served by the built-in HTTP listener
+
+    Webhooks are refused on all interfaces without ``webhook_password``:
+    anyone who can reach the port could otherwise queue harvests.
+    returns:
+        ``dict``: {(method, path): handler} for serve()
+    """
+    routes = {
+        ('GET', '/metrics'): lambda headers, body: (200, 'text/plain; version=0.0.4', metrics.render()),
+        ('GET', '/healthz'): lambda headers, body: (200, 'text/plain', 'OK\n'),
+    }
+    if client.webhook and not client.webhook_password and client.http_host in ALL_INTERFACES:
+        logger.error('webhook_password is required to accept webhooks on all interfaces '
+                     '(http_host {!r}) - not accepting webhooks'.format(client.http_host))
+    elif client.webhook:
+        routes[('POST', '/webhook')] = client.webhookevent
+    return routes
 
 
 if __name__ == "__main__":
+    if args.reset_search_history:
+        reset = HarvestStore(os.path.join(CONFIGPATH, 'stream_harvestarr.db')).reset_search_history()
+        logger.info('Search history reset for {} episodes'.format(reset))
+        sys.exit(0)
+    # One harvester for the life of the process so connections and caches
+    # stay warm; config.yml is reloaded when it changes.
+    client = StreamHarvester()
+
+    if args.plan:
+        sys.exit(0 if plan(client) else 1)
+    if args.once:
+        # 0: scan done, 1: Sonarr unreachable, 2: some downloads failed
+        if not main(client):
+            sys.exit(1)
+        sys.exit(2 if client.cycle.counts['failed'] else 0)
+
+    def reload_on_sighup(signum, frame):
+        # Only a flag: the wakeup fd has already woken the scan loop
+        client.reload_requested = True
+    signal.set_wakeup_fd(WAKEUP.write_fd)
+    signal.signal(signal.SIGHUP, reload_on_sighup)
+
+    if client.http_port:
+        routes = httproutes(client)
+        serve(client.http_host, client.http_port, routes)
+        logger.info('Serving metrics on {}:{}/metrics'.format(client.http_host, client.http_port))
+        if ('POST', '/webhook') in routes:
+            logger.info('Accepting Sonarr webhooks on {}:{}/webhook'.format(client.http_host, client.http_port))
+    elif client.webhook:
+        logger.warning('webhook is enabled but http_port is not set - not accepting webhooks')
+
     logger.info('Initial run')
-    main()
-    schedule.every(int(SCANINTERVAL)).minutes.do(main)
+    main(client)
+    interval = int(SCANINTERVAL)
+    schedule.every(interval).minutes.do(main, client)
     while True:
-        schedule.run_pending()
-        time.sleep(1)
+        # Sleep until the next scheduled scan, or earlier when an episode
+        # becomes eligible or is due for a retry, on SIGHUP, or when a
+        # webhook queues a harvest.
+        wait = schedule.idle_seconds()
+        if NEXT_DUE is not None:
+            wait = min(wait, NEXT_DUE - time.time())
+        WAKEUP.wait(max(0, wait))
+        if client.reload_requested:
+            logger.info('SIGHUP received - reloading config.yml')
+        if client.reload_requested or (NEXT_DUE is not None and NEXT_DUE <= time.time()):
+            # run_all() also pushes the regular scan back a full interval
+            schedule.run_all()
+        else:
+            schedule.run_pending()
+        # Polling stays the safety net; webhooks only add targeted harvests
+        series_ids = client.queuedharvests()
+        if series_ids:
+            try:
+                harvest(client, series_ids)
+            except Exception as e:
+                # A webhook harvest must never take the scan loop down
+                logger.error('Harvest of series_id(s) {} failed: {}'.format(sorted(series_ids), e))
+        if int(SCANINTERVAL) != interval:
+            interval = int(SCANINTERVAL)
+            schedule.clear()
+            schedule.every(interval).minutes.do(main, client)
@@ -0,0 +1,242 @@
+import time
+import threading
+import logging
+import urllib.parse
+
+
+def domain_of(url):
+    """Return the site a URL belongs to, for per-domain throttling.
+
+    Lowercased netloc with a leading ``www.`` dropped, so
+    ``https://www.youtube.com/...`` and ``https://youtube.com/...`` share
+    one throttle.
+    """
+    domain = urllib.parse.urlparse(url).netloc.lower()
+    if domain.startswith('www.'):
+        domain = domain[4:]
+    return domain
+
+
+class RequestPacer(object):
+    """Space out the start of calls made from several threads.
+
+    Each wait() returns no sooner than ``interval`` seconds after the
+    previous one, so a thread pool still honours a fixed per-request delay.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_start = 0
+
+    def wait(self):
+        if self.interval <= 0:
+            return
+        with self.lock:
+            start = max(self.next_start, time.time())
+            self.next_start = start + self.interval
+        delay = start - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def is_rate_limited(error):
+    """True if a yt-dlp error message says the site is rate limiting us"""
+    error_msg = str(error).lower()
+    return any(phrase in error_msg for phrase in (
+        'rate-limited', 'rate limit', 'try again later', 'http error 429', 'too many requests'
+    ))
+
+
+class CoolingDown(Exception):
+    """A request was given up because its site is cooling down from a rate
+    limit; ``throttle`` is the site's DomainThrottle"""
+
+    def __init__(self, throttle):
+        super().__init__('{} is cooling down from a rate limit'.format(throttle.domain))
+        self.throttle = throttle
+
+
+class TokenBucket(object):
+    """Limit how often requests of one kind start against one site.
+
+    Holds up to ``burst`` tokens, refilled at ``rate`` per minute times
+    ``scale``; every request takes one. Tokens are handed out in order even
+    when the bucket is empty, so each waiter knows its delay up front and
+    sleeps without holding the lock. A rate of 0 disables the bucket.
+    """
+
+    def __init__(self, rate=0, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        # Lowered after a rate limit, see DomainThrottle.rate_limited()
+        self.scale = 1.0
+        self.lock = threading.Lock()
+        self.tokens = self.burst
+        self.updated = time.time()
+
+    def take(self):
+        """Take a token
+        returns:
+            ``float``: seconds to wait before starting the request
+        """
+        if self.rate <= 0:
+            return 0
+        with self.lock:
+            now = time.time()
+            per_second = self.rate * self.scale / 60
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * per_second)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / per_second
+
+
+class DomainThrottle(object):
+    """Concurrency cap, download spacing and rate-limit backoff for one site.
+
+    The dispatcher reserves a slot before handing a job to a worker; the
+    worker then waits here, not in a process-wide sleep, while the domain
+    is spacing downloads, so other sites keep running. A domain cooling
+    down is never waited out: wait() returns False and the caller gives
+    the request up until the cool-down ends.
+    Extraction (playlist crawls, video pages) and downloads each draw from
+    their own token bucket. Every rate limit halves both refill rates, down
+    to MIN_RATE_SCALE; each success afterwards wins back RATE_RECOVERY.
+    """
+
+    MIN_RATE_SCALE = 0.125
+    RATE_RECOVERY = 0.1
+
+    def __init__(self, domain, concurrency=1, download_delay=0, rate_limit_sleep=900,
+                 backoff_enabled=True, backoff_multiplier=2.0, backoff_max=3600,
+                 extract_rate=0, extract_burst=1, download_rate=0, download_burst=1):
+        self.domain = domain
+        self.concurrency = max(1, concurrency)
+        self.download_delay = download_delay
+        self.rate_limit_sleep = rate_limit_sleep
+        self.backoff_enabled = backoff_enabled
+        self.backoff_multiplier = backoff_multiplier
+        self.backoff_max = backoff_max
+        self.logger = logging.getLogger('stream_harvestarr')
+        self.lock = threading.Lock()
+        self.active = 0
+        # Earliest time the next download may start (download_delay)
+        self.next_start = 0
+        # Rate limit cool-down
+        self.blocked_until = 0
+        self.rate_limit_count = 0
+        self.current_backoff = rate_limit_sleep
+        self.buckets = {
+            'extract': TokenBucket(extract_rate, extract_burst),
+            'download': TokenBucket(download_rate, download_burst),
+        }
+
+    def reserve(self):
+        """Take a download slot if the domain is below its concurrency cap
+        returns:
+            ``bool``: True if a slot was taken; pair with release()
+        """
+        with self.lock:
+            if self.active >= self.concurrency:
+                return False
+            self.active += 1
+            return True
+
+    def wait(self, kind='download'):
+        """Block the calling worker until the domain may start a request
+        - ``kind``: ``download``, or ``extract`` for a crawl or video page
+        returns:
+            ``bool``: True once the request may start; False, without
+            waiting, while the domain is cooling down from a rate limit
+        """
+        while True:
+            with self.lock:
+                if self.blocked_until > time.time():
+                    return False
+                if kind != 'download':
+                    break
+                wait = self.next_start - time.time()
+                if wait <= 0:
+                    # Reserve the spacing slot before releasing the lock so
+                    # concurrent workers on this domain don't start together.
+                    self.next_start = time.time() + self.download_delay
+                    break
+            self.logger.debug("      Waiting {:.0f} seconds before next {} download".format(wait, self.domain))
+            time.sleep(wait)
+        wait = self.buckets[kind].take()
+        if wait > 0:
+            self.logger.debug("      Waiting {:.1f} seconds for the {} {} rate limit".format(wait, self.domain, kind))
+            time.sleep(wait)
+        return True
+
+    def cooling_down(self):
+        """Seconds left before the domain's rate limit cool-down ends"""
+        with self.lock:
+            return max(0, self.blocked_until - time.time())
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+
+    def succeeded(self, kind='download'):
+        """Reset backoff, and start the download delay after a download
+        returns:
+            ``bool``: True if the backoff state changed and should be saved
+        """
+        with self.lock:
+            if kind == 'download':
+                self.next_start = max(self.next_start, time.time() + self.download_delay)
+            changed = False
+            if self.rate_limit_count > 0:
+                self.logger.info("      Rate limit recovered for {} - resetting backoff counter".format(self.domain))
+                self.rate_limit_count = 0
+                self.current_backoff = self.rate_limit_sleep
+                changed = True
+            for bucket in self.buckets.values():
+                if bucket.scale < 1:
+                    bucket.scale = min(1.0, bucket.scale + self.RATE_RECOVERY)
+                    changed = True
+            return changed
+
+    def rate_limited(self):
+        """Record a rate limit, block the domain for the backoff period and
+        slow its request rates
+        returns:
+            ``(count, backoff)``: consecutive rate limits and seconds blocked
+        """
+        with self.lock:
+            self.rate_limit_count += 1
+            # Calculate backoff with exponential increase if enabled
+            if self.backoff_enabled and self.rate_limit_count > 1:
+                self.current_backoff = min(
+                    int(self.rate_limit_sleep * (self.backoff_multiplier ** (self.rate_limit_count - 1))),
+                    self.backoff_max
+                )
+            else:
+                self.current_backoff = self.rate_limit_sleep
+            self.blocked_until = time.time() + self.current_backoff
+            for bucket in self.buckets.values():
+                bucket.scale = max(self.MIN_RATE_SCALE, bucket.scale / 2)
+            return self.rate_limit_count, self.current_backoff
+
+    def backoff_state(self):
+        """Return the adaptive state worth keeping across restarts"""
+        with self.lock:
+            return {
+                'rate_limit_count': self.rate_limit_count,
+                'current_backoff': self.current_backoff,
+                'blocked_until': self.blocked_until,
+                'extract_scale': self.buckets['extract'].scale,
+                'download_scale': self.buckets['download'].scale,
+            }
+
+    def restore_backoff(self, state):
+        """Pick up where backoff_state() left off"""
+        with self.lock:
+            self.rate_limit_count = state['rate_limit_count']
+            self.current_backoff = state['current_backoff']
+            self.blocked_until = state['blocked_until']
+            self.buckets['extract'].scale = state['extract_scale']
+            self.buckets['download'].scale = state['download_scale']
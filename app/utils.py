@@ -1,7 +1,9 @@
 import re
 import os
 import sys
+import shutil
 import datetime
+import functools
 import yaml
 import logging
 from logging.handlers import RotatingFileHandler
@@ -10,6 +12,9 @@ from logging.handlers import RotatingFileHandler
 CONFIGFILE = os.environ['CONFIGPATH']
 # CONFIGPATH = CONFIGFILE.replace('config.yml', '')
 
+# /logs in the container; log files and --profile output go here
+LOG_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'logs'))
+
 
 # Substrings (case-insensitive) that mark a dict key as holding a secret.
 # Note on username: not a secret on its own, but it pairs with password in
@@ -27,6 +32,10 @@ SENSITIVE_KEY_SUBSTRINGS = (
 _APIKEY_QUERY_RE = re.compile(r'(apikey=)[^&\s]+', re.IGNORECASE)
 _APIKEY_JSON_RE = re.compile(r'(api[_-]?key["\']?\s*:\s*["\']?)[^&\s,}"\']+', re.IGNORECASE)
 
+# Compiled title patterns kept between scans. Sized for a library of
+# ~20k wanted episodes; an entry is a few hundred bytes.
+TITLE_PATTERN_CACHE_SIZE = 32768
+
 
 def redact_sensitive(data):
     """Recursively redact secrets from data so it is safe to log.
@@ -92,24 +101,76 @@ def upperescape(string):
     string = re.sub(" +", " ", string)
     # Escape the characters
     string = re.escape(string)
+    # Make it look for and as whole or ampersands (before the spaces below
+    # are rewritten, or there is no escaped space left to find)
+    string = string.replace('\\ AND\\ ','\\ (AND|&)\\ ')
     # Handle none to multiple spaces
     string = string.replace("\\ ", "[\\ ]*")
     # Make parenthesis optional
     string = string.replace("\\(", "([\\(]?")
     string = string.replace("\\)", "[\\)]?)?")
-    # Make it look for and as whole or ampersands
-    string = string.replace('\\ AND\\ ','\\ (AND|&)\\ ')
     # Make punctuation optional for human error
-    string = string.replace("'","([']?)") # optional apostrophe
+    string = string.replace("'","(['‘’]?)") # optional apostrophe, straight or curly in the video title
     string = string.replace(",","([,]?)") # optional comma
     string = string.replace("!","([!]?)") # optional question mark
     string = string.replace("\\.","([\\.]?)") # optional period
     string = string.replace("\\?","([\\?]?)") # optional question mark
     string = string.replace(":","([:]?)") # optional colon
-    string = re.sub("S\\\\", "([']?)"+"S\\\\", string) # optional belonging apostrophe (has to be last due to question mark)
+    # optional belonging apostrophe before a word-final S (has to be last
+    # due to question mark; the tokens inserted above contain no letters)
+    string = re.sub(r"S(?!\w)", "(['‘’]?)S", string)
     return string
 
 
+@functools.lru_cache(maxsize=TITLE_PATTERN_CACHE_SIZE)
+def title_pattern(title):
+    """Compiled, case-insensitive upperescape() pattern for a title.
+
+    Memoized: a wanted episode is matched every scan until it downloads,
+    so the title is escaped and compiled once per process instead of
+    once per scan. Pass the title after any sonarr regex substitution.
+    """
+    return re.compile(upperescape(title), re.IGNORECASE)
+
+
+def move_into_library(src, dest):
+    """Move a finished download into the library without exposing a partial file
+    - ``src``: file in the scratch directory
+    - ``dest``: final path in the Sonarr library
+
+    A rename when both are on the same filesystem. Otherwise the file is
+    copied next to ``dest`` under a ``.partial`` name (not a video
+    extension, so Sonarr ignores it) and renamed into place once complete.
+    """
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    try:
+        os.replace(src, dest)
+        return
+    except OSError:
+        pass
+    partial = dest + '.partial'
+    try:
+        shutil.copyfile(src, partial)
+        os.replace(partial, dest)
+    except OSError:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    os.remove(src)
+
+
+def prune_empty_dirs(path, root):
+    """Remove ``path`` and its parents while they are empty, stopping at ``root``"""
+    root = os.path.abspath(root)
+    path = os.path.abspath(path)
+    while path != root and path.startswith(root + os.sep):
+        try:
+            os.rmdir(path)
+        except OSError:
+            return
+        path = os.path.dirname(path)
+
+
 def checkconfig():
     """Checks if config files exist in config path
     If no config available, will copy template to config folder and exit script
@@ -216,8 +277,7 @@ def setup_logging(lf_enabled=True, lc_enabled=True, debugging=False):
 
     if lf_enabled:
         # setup logfile
-        log_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'logs'))
-        log_file = os.path.abspath(log_file + '/stream_harvestarr.log')
+        log_file = os.path.join(LOG_DIR, 'stream_harvestarr.log')
         loggerfile = RotatingFileHandler(
             log_file,
             maxBytes=5000000,
@@ -0,0 +1,74 @@
+import re
+import functools
+
+# Extractors that need every other extractor set up: the generic
+# extractor finds embedded videos by asking each one
+UNRESTRICTED_EXTRACTORS = ('Generic',)
+
+
+def copy_info(info):
+    """Copy an unprocessed info dict for process_ie_result()
+
+    process_ie_result() adds keys to the info dict and to each format
+    and thumbnail, so those are copied; everything else is shared.
+    copy.deepcopy() won't do: formats may hold generator-backed
+    ``LazyList`` fragments, which can't be copied.
+    """
+    info = dict(info)
+    for key in ('formats', 'thumbnails'):
+        if info.get(key) is not None:
+            info[key] = [dict(item) for item in info[key]]
+    return info
+
+
+@functools.lru_cache(maxsize=None)
+def allowed_extractors(ie_key):
+    """yt-dlp ``allowed_extractors`` option selecting just ``ie_key``
+
+    returns:
+        ``list``: one exact-name pattern, or None if yt-dlp has no
+        extractor by that key
+    """
+    from yt_dlp.extractor import get_info_extractor
+    try:
+        return [re.escape(get_info_extractor(ie_key).IE_NAME)]
+    except KeyError:
+        return None
+
+
+class _OnDemandExtractors(object):
+    """Set up an extractor the first time a result hands off to it by key"""
+
+    def extract_info(self, url, *args, **kwargs):
+        ie_key = kwargs.get('ie_key')
+        if ie_key and ie_key not in self._ies:
+            self.get_info_extractor(ie_key)
+        return super().extract_info(url, *args, **kwargs)
+
+
+@functools.lru_cache(maxsize=None)
+def _restricted_class(ydl_class):
+    return type(ydl_class.__name__, (_OnDemandExtractors, ydl_class), {})
+
+
+def youtubedl(params, ie_key=None, ydl_class=None):
+    """Create a YoutubeDL, importing yt-dlp on first use
+    - ``params``: yt-dlp options
+    - ``ie_key``: extractor the URL is known to need (recorded by a
+      previous crawl); only that one is set up, instead of the ~1,800
+      extractors every YoutubeDL otherwise registers
+    - ``ydl_class``: YoutubeDL subclass to create instead
+
+    Results handing off to another extractor by key still work. Pass no
+    ``ie_key`` when the URL's extractor isn't known.
+    returns:
+        ``YoutubeDL``
+    """
+    import yt_dlp
+    ydl_class = ydl_class or yt_dlp.YoutubeDL
+    allowed = None
+    if ie_key and ie_key not in UNRESTRICTED_EXTRACTORS:
+        allowed = allowed_extractors(ie_key)
+    if allowed is None:
+        return ydl_class(params)
+    return _restricted_class(ydl_class)(dict(params, allowed_extractors=allowed))
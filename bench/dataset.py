@@ -0,0 +1,147 @@
+"""Synthetic library shared by the stub Sonarr and the yt-dlp fixtures.
+
+Everything is derived from the series and episode numbers, so the stub
+Sonarr process and the harvester under test agree on titles, files and
+playlist contents without sharing any state, and nothing is held in
+memory that the harvester would not hold itself.
+"""
+
+PLAYLIST_URL = 'https://bench.invalid/playlist/{}'
+VIDEO_URL = 'https://bench.invalid/watch/{}/{}'
+# Size reported for every fixture download, in bytes
+VIDEO_SIZE = 250 * 2**20
+
+
+class Dataset(object):
+    """``series`` series of ``episodes`` episodes each
+    - ``missing``: percent of episodes without a file in Sonarr
+    - ``found``: percent of episodes present in their series' playlist
+    - ``extra``: unrelated videos in every playlist
+    """
+
+    def __init__(self, series=50, episodes=20, missing=20, found=50, extra=30):
+        self.series = series
+        self.episodes = episodes
+        self.missing = missing
+        self.found = found
+        self.extra = extra
+
+    def args(self):
+        """Command line that rebuilds this dataset in another process"""
+        return [
+            '--series', str(self.series),
+            '--episodes', str(self.episodes),
+            '--missing', str(self.missing),
+            '--found', str(self.found),
+            '--extra', str(self.extra),
+        ]
+
+    def has_file(self, series_id, number):
+        return (series_id * 31 + number * 17) % 100 >= self.missing
+
+    def in_playlist(self, series_id, number):
+        return (series_id * 13 + number * 7) % 100 < self.found
+
+    def series_title(self, series_id):
+        return 'Series {}'.format(series_id)
+
+    def episode_title(self, series_id, number):
+        return 'Episode {} of Series {}'.format(number, series_id)
+
+    def air_date(self, number):
+        return '2020-{:02d}-{:02d}'.format(number // 28 % 12 + 1, number % 28 + 1)
+
+    def series_record(self, series_id):
+        return {
+            'id': series_id,
+            'title': self.series_title(series_id),
+            'tvdbId': 100000 + series_id,
+            'monitored': True,
+            'path': '/tv/{}'.format(self.series_title(series_id)),
+            'seasonCount': 1,
+        }
+
+    def episode_record(self, series_id, number):
+        return {
+            'id': series_id * 100000 + number,
+            'seriesId': series_id,
+            'title': self.episode_title(series_id, number),
+            'seasonNumber': 1,
+            'episodeNumber': number,
+            'airDate': self.air_date(number),
+            'airDateUtc': '{}T00:00:00Z'.format(self.air_date(number)),
+            'monitored': True,
+            'hasFile': self.has_file(series_id, number),
+        }
+
+    def all_series(self):
+        return [self.series_record(series_id) for series_id in range(1, self.series + 1)]
+
+    def series_episodes(self, series_id):
+        return [self.episode_record(series_id, number) for number in range(1, self.episodes + 1)]
+
+    def missing_episodes(self):
+        """Generator of every monitored episode without a file"""
+        for series_id in range(1, self.series + 1):
+            for number in range(1, self.episodes + 1):
+                if not self.has_file(series_id, number):
+                    yield self.episode_record(series_id, number)
+
+    def missing_count(self):
+        return sum(
+            1 for series_id in range(1, self.series + 1)
+            for number in range(1, self.episodes + 1)
+            if not self.has_file(series_id, number)
+        )
+
+    def playlist_entries(self, series_id):
+        """Generator of flat playlist entries, newest first, the way
+        extract_info(process=False) returns a channel"""
+        for number in range(self.episodes, 0, -1):
+            if self.in_playlist(series_id, number):
+                yield {
+                    '_type': 'url',
+                    'id': 'bench-{}-{}'.format(series_id, number),
+                    'title': '{} | Bench Channel {}'.format(self.episode_title(series_id, number), series_id),
+                    'url': VIDEO_URL.format(series_id, number),
+                    'ie_key': 'Generic',
+                    'upload_date': self.air_date(number).replace('-', ''),
+                }
+        for clip in range(self.extra):
+            yield {
+                '_type': 'url',
+                'id': 'bench-{}-clip-{}'.format(series_id, clip),
+                'title': 'Behind the scenes clip {} from Bench Channel {}'.format(clip, series_id),
+                'url': VIDEO_URL.format(series_id, 'clip-{}'.format(clip)),
+                'ie_key': 'Generic',
+            }
+
+    def video_info(self, series_id, number):
+        """Unprocessed info dict for one video"""
+        return {
+            'id': 'bench-{}-{}'.format(series_id, number),
+            'title': self.episode_title(series_id, number),
+            'webpage_url': VIDEO_URL.format(series_id, number),
+            'extractor': 'generic',
+            'extractor_key': 'Generic',
+            'ext': 'mp4',
+            'formats': [{
+                'format_id': 'bench',
+                'url': VIDEO_URL.format(series_id, number) + '.mp4',
+                'ext': 'mp4',
+                'filesize': VIDEO_SIZE,
+            }],
+        }
+
+
+def add_arguments(parser):
+    """Add the Dataset options to an argparse parser"""
+    parser.add_argument('--series', type=int, default=50, help='Series in the library (default 50)')
+    parser.add_argument('--episodes', type=int, default=20, help='Episodes per series (default 20)')
+    parser.add_argument('--missing', type=int, default=20, help='Percent of episodes without a file (default 20)')
+    parser.add_argument('--found', type=int, default=50, help='Percent of episodes in the playlist (default 50)')
+    parser.add_argument('--extra', type=int, default=30, help='Unrelated videos per playlist (default 30)')
+
+
+def from_args(args):
+    return Dataset(args.series, args.episodes, args.missing, args.found, args.extra)
@@ -0,0 +1,151 @@
+"""yt-dlp stand-in that replays playlists and videos without the network.
+
+FakeYoutubeDL answers extract_info() from a recorded fixture file when the
+URL is in it, and from the synthetic Dataset otherwise. Downloads write
+nothing: process_ie_result() only runs the progress and post hooks the
+harvester registered. When the harvester asks for a DeferredPostProcessor
+(``postprocess_workers``), post-processing is recorded in ``deferred``
+instead and run_postprocessors() hands the file names back from the
+process pool. Every call is counted in ``CALLS``.
+
+Record a fixture from real sites (needs network and yt-dlp):
+
+    python bench/fixtures.py record fixtures.json URL [URL ...]
+"""
+import re
+import sys
+import copy
+import json
+import argparse
+import threading
+import collections
+
+# 'crawl': playlist extractions, 'video': single video extractions,
+# 'download': process_ie_result(download=True) calls, 'postprocess':
+# downloads whose post-processing was deferred to the process pool
+CALLS = collections.Counter()
+_lock = threading.Lock()
+
+
+def count(kind):
+    with _lock:
+        CALLS[kind] += 1
+
+
+class FakeYoutubeDL(object):
+    """The slice of yt_dlp.YoutubeDL the harvester uses"""
+
+    # Set by install()
+    data = None
+    recorded = {}
+
+    def __init__(self, params=None, auto_init=True, defer=False):
+        self.params = params or {}
+        self.defer = defer
+        self.deferred = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def extract_info(self, url, download=False, ie_key=None, process=True):
+        if url in self.recorded:
+            info = copy.deepcopy(self.recorded[url])
+            count('crawl' if 'entries' in info else 'video')
+            if 'entries' in info:
+                info['entries'] = iter(info['entries'])
+            return info
+        match = re.match(r'^https://bench\.invalid/playlist/(\d+)$', url)
+        if match:
+            count('crawl')
+            return {
+                '_type': 'playlist',
+                'id': 'bench-{}'.format(match.group(1)),
+                'title': 'Bench Channel {}'.format(match.group(1)),
+                'entries': self.data.playlist_entries(int(match.group(1))),
+            }
+        match = re.match(r'^https://bench\.invalid/watch/(\d+)/(\d+)$', url)
+        if match:
+            count('video')
+            return self.data.video_info(int(match.group(1)), int(match.group(2)))
+        raise ValueError('No fixture for {}'.format(url))
+
+    def process_ie_result(self, info, download=True):
+        if info.get('formats'):
+            # Format selection: the last format is the best
+            info.update(info['formats'][-1])
+        if not download:
+            return info
+        count('download')
+        filename = self.params.get('outtmpl', '%(title)s.%(ext)s').replace('%(ext)s', info.get('ext', 'mp4'))
+        size = sum(f.get('filesize') or 0 for f in info.get('formats', []))
+        for hook in self.params.get('progress_hooks', []):
+            hook({
+                'status': 'finished',
+                'filename': filename,
+                'total_bytes': size,
+                'elapsed': 1.0,
+                'info_dict': info,
+            })
+        if self.defer:
+            count('postprocess')
+            self.deferred.append((filename, {'id': info.get('id')}, {}, []))
+        else:
+            for hook in self.params.get('post_hooks', []):
+                hook(filename)
+        info['filepath'] = filename
+        return info
+
+
+def run_postprocessors(ydl_opts, deferred):
+    """Stands in for postprocess.run_postprocessors in the process pool"""
+    return [filename for filename, info, files_to_move, pp_keys in deferred]
+
+
+def install(module, data, fixture=None, postprocess_pool=False):
+    """Make ``module.youtubedl`` create FakeYoutubeDL instances
+    - ``module``: the imported stream_harvestarr module
+    - ``data``: Dataset for URLs not in the fixture
+    - ``fixture``: optional JSON file of recorded {url: info}
+    - ``postprocess_pool``: the harvester post-processes in a process
+      pool; replace run_postprocessors() too (imports yt-dlp)
+    """
+    recorded = {}
+    if fixture:
+        with open(fixture) as f:
+            recorded = json.load(f)
+    fake = type('FakeYoutubeDL', (FakeYoutubeDL,), {'data': data, 'recorded': recorded})
+    module.youtubedl = lambda params, ie_key=None, ydl_class=None: fake(params, defer=ydl_class is not None)
+    if postprocess_pool:
+        import postprocess
+        postprocess.run_postprocessors = run_postprocessors
+    CALLS.clear()
+    return fake
+
+
+def record(path, urls):
+    """Extract ``urls`` with the real yt-dlp, the way the harvester does,
+    and save the info dicts to ``path``"""
+    import yt_dlp
+    recorded = {}
+    with yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': True}) as ydl:
+        for url in urls:
+            info = ydl.extract_info(url, download=False, process=False)
+            if info.get('entries') is not None:
+                info['entries'] = list(info['entries'])
+            recorded[url] = ydl.sanitize_info(info)
+            print('Recorded {}'.format(url), file=sys.stderr)
+    with open(path, 'w') as f:
+        json.dump(recorded, f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record yt-dlp extractions for bench/run.py --fixture')
+    sub = parser.add_subparsers(dest='command', required=True)
+    rec = sub.add_parser('record')
+    rec.add_argument('path')
+    rec.add_argument('urls', nargs='+')
+    args = parser.parse_args()
+    record(args.path, args.urls)
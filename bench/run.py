@@ -0,0 +1,201 @@
+"""Offline benchmark of full harvest cycles.
+
+Starts the stub Sonarr (bench/stub_sonarr.py) in its own process, points a
+throwaway config.yml at it, swaps yt-dlp for the replaying FakeYoutubeDL
+(bench/fixtures.py) and runs stream_harvestarr.main() for a few cycles.
+Each cycle reports its wall time, the Sonarr requests it made, the yt-dlp
+extractions per found episode and the process' peak RSS.
+
+    python bench/run.py --scale medium
+    python bench/run.py --series 200 --cycles 3 --option download_workers=4
+
+The first cycle is cold (empty database and caches); later cycles show
+the steady state, where recently searched episodes are not searched again.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import socket
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+import dataset
+import fixtures
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, '..', 'app')
+SCALES = {'small': 50, 'medium': 500, 'large': 5000}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def write_config(path, data, port, options, fixture_playlists):
+    """config.yml for the benchmark; ``options`` are extra
+    ``streamharvestarr`` settings as ``key=value``"""
+    lines = [
+        'streamharvestarr:',
+        '    scan_interval: 1',
+        '    debug: False',
+    ]
+    lines.extend('    {}: {}'.format(*option.split('=', 1)) for option in options)
+    lines.extend([
+        'sonarr:',
+        '    host: 127.0.0.1',
+        '    port: {}'.format(port),
+        '    apikey: bench',
+        '    ssl: false',
+        '    version: v4',
+        'ytdl:',
+        '    default_format: best',
+        '    merge_output_format: mkv',
+        'series:',
+    ])
+    for series_id in range(1, data.series + 1):
+        if fixture_playlists:
+            url = fixture_playlists[(series_id - 1) % len(fixture_playlists)]
+        else:
+            url = dataset.PLAYLIST_URL.format(series_id)
+        lines.append('  - title: "{}"'.format(data.series_title(series_id)))
+        lines.append('    url: "{}"'.format(url))
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def start_stub(data, port):
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'stub_sonarr.py'), '--port', str(port)] + data.args(),
+        stdout=subprocess.PIPE,
+    )
+    # Wait for the listening line so the first cycle doesn't race it
+    stub.stdout.readline()
+    return stub
+
+
+def stub_call(port, method, path):
+    import requests
+    res = requests.request(method, 'http://127.0.0.1:{}{}'.format(port, path), timeout=10)
+    res.raise_for_status()
+    return res.json()
+
+
+def peak_rss_mib():
+    # ru_maxrss is in KiB on Linux (bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (2**20 if sys.platform == 'darwin' else 2**10)
+
+
+def run(args):
+    data = dataset.from_args(args)
+    fixture_playlists = []
+    if args.fixture:
+        with open(args.fixture) as f:
+            fixture_playlists = [url for url, info in json.load(f).items() if 'entries' in info]
+    workdir = tempfile.mkdtemp(prefix='stream-harvestarr-bench-')
+    port = free_port()
+    stub = start_stub(data, port)
+    try:
+        config = os.path.join(workdir, 'config.yml')
+        write_config(config, data, port, args.option, fixture_playlists)
+        os.environ['CONFIGPATH'] = config
+        # The harvester parses sys.argv and logs to the repository's logs/
+        sys.argv = [sys.argv[0]] + (['--debug'] if args.debug else [])
+        sys.path.insert(0, os.path.abspath(APP_DIR))
+        os.makedirs(os.path.join(APP_DIR, '..', 'logs'), exist_ok=True)
+        # Startup: module import (logging, argument parsing) plus loading
+        # config.yml and the database, i.e. everything before the first
+        # scan; yt-dlp should not be imported yet
+        start = time.time()
+        import stream_harvestarr as harvester
+        if not args.verbose and not args.debug:
+            # A filter, not a level: loading config.yml resets handler levels
+            for handler in harvester.logger.handlers:
+                if handler.name == 'StreamHandler':
+                    handler.addFilter(lambda record: record.levelno >= logging.WARNING)
+        client = harvester.StreamHarvester()
+        startup = time.time() - start
+        yt_dlp_at_startup = 'yt_dlp' in sys.modules
+        fixtures.install(harvester, data, args.fixture, client.postprocess_workers > 0)
+
+        results = []
+        for cycle in range(1, args.cycles + 1):
+            stub_call(port, 'POST', '/bench/reset')
+            fixtures.CALLS.clear()
+            start = time.time()
+            harvester.main(client)
+            wall = time.time() - start
+            requests_made = stub_call(port, 'GET', '/bench/requests')
+            found = client.cycle.counts['found']
+            extractions = fixtures.CALLS['crawl'] + fixtures.CALLS['video']
+            results.append({
+                'cycle': cycle,
+                'wall_seconds': round(wall, 3),
+                'sonarr_requests': sum(requests_made.values()),
+                'sonarr_requests_by_path': requests_made,
+                'wanted': client.cycle.counts['wanted'],
+                'found': found,
+                'downloaded': client.cycle.counts['downloaded'],
+                'crawls': fixtures.CALLS['crawl'],
+                'video_extractions': fixtures.CALLS['video'],
+                'extractions_per_found': round(extractions / found, 2) if found else None,
+                'peak_rss_mib': round(peak_rss_mib(), 1),
+            })
+        return {
+            'series': data.series,
+            'episodes': data.series * data.episodes,
+            'missing': data.missing_count(),
+            'startup_seconds': round(startup, 3),
+            'yt_dlp_imported_at_startup': yt_dlp_at_startup,
+            'cycles': results,
+        }
+    finally:
+        stub.terminate()
+        stub.wait()
+        if args.keep:
+            print('Benchmark config and database kept in {}'.format(workdir), file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def report(result):
+    print('{} series, {} episodes, {} missing; startup {:.2f}s{}'.format(
+        result['series'], result['episodes'], result['missing'], result['startup_seconds'],
+        ' (yt-dlp imported at startup)' if result['yt_dlp_imported_at_startup'] else ''))
+    columns = ['cycle', 'wall_seconds', 'sonarr_requests', 'wanted', 'found', 'downloaded',
+               'crawls', 'video_extractions', 'extractions_per_found', 'peak_rss_mib']
+    print('  '.join(columns))
+    for cycle in result['cycles']:
+        print('  '.join(str(cycle[column]).rjust(len(column)) for column in columns))
+    for cycle in result['cycles']:
+        print('cycle {} Sonarr requests: {}'.format(cycle['cycle'], ', '.join(
+            '{}={}'.format(path, n) for path, n in sorted(cycle['sonarr_requests_by_path'].items()))))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline benchmark of harvest cycles against a stub Sonarr')
+    dataset.add_arguments(parser)
+    parser.add_argument('--scale', choices=sorted(SCALES),
+                        help='Preset series count: small=50, medium=500, large=5000 (overrides --series)')
+    parser.add_argument('--cycles', type=int, default=2, help='Harvest cycles to run (default 2)')
+    parser.add_argument('--option', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra streamharvestarr setting for config.yml; repeatable')
+    parser.add_argument('--fixture', help='Recorded extractions from bench/fixtures.py record to replay')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary config and database')
+    parser.add_argument('--verbose', action='store_true', help='Show the harvester INFO log')
+    parser.add_argument('--debug', action='store_true', help='Run the harvester with --debug')
+    args = parser.parse_args()
+    if args.scale:
+        args.series = SCALES[args.scale]
+    result = run(args)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        report(result)
@@ -0,0 +1,131 @@
+"""Stub Sonarr API serving a synthetic library for the benchmark.
+
+Answers the calls the harvester makes (series, episode, wanted/missing,
+calendar, command) under both ``/api`` and ``/api/v3``, and counts every
+request. ``GET /bench/requests`` returns the counts by method and path;
+``POST /bench/reset`` zeroes them.
+
+    python bench/stub_sonarr.py --port 8990 --series 500
+"""
+import re
+import sys
+import json
+import argparse
+import threading
+import collections
+import http.server
+import urllib.parse
+import dataset
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Set by serve()
+    data = None
+    requests = collections.Counter()
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, obj):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def route(self, method):
+        url = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        path = re.sub(r'^/api(/v3)?/', '/', url.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if path.startswith('/bench/'):
+            return self.bench(method, path)
+        with self.lock:
+            # /series/12 -> /series/{id}
+            self.requests['{} {}'.format(method, re.sub(r'/\d+$', '/{id}', path))] += 1
+        if method == 'POST' and path == '/command':
+            return self.send(201, {'id': 1, 'name': 'RescanSeries', 'status': 'queued'})
+        if method != 'GET':
+            return self.send(405, {'message': 'Method not allowed'})
+        if path == '/series':
+            return self.send(200, self.data.all_series())
+        match = re.match(r'^/series/(\d+)$', path)
+        if match:
+            series_id = int(match.group(1))
+            if not 1 <= series_id <= self.data.series:
+                return self.send(404, {'message': 'NotFound'})
+            return self.send(200, self.data.series_record(series_id))
+        if path == '/episode':
+            series_id = int(query.get('seriesId', 0))
+            if not 1 <= series_id <= self.data.series:
+                return self.send(200, [])
+            return self.send(200, self.data.series_episodes(series_id))
+        if path == '/wanted/missing':
+            return self.wanted(query)
+        if path == '/calendar':
+            return self.send(200, [])
+        return self.send(404, {'message': 'NotFound'})
+
+    def wanted(self, query):
+        page = int(query.get('page', 1))
+        size = int(query.get('pageSize', 10))
+        records = []
+        for i, record in enumerate(self.data.missing_episodes()):
+            if i >= page * size:
+                break
+            if i >= (page - 1) * size:
+                if query.get('includeSeries') in ('true', 'True'):
+                    record['series'] = self.data.series_record(record['seriesId'])
+                records.append(record)
+        return self.send(200, {
+            'page': page,
+            'pageSize': size,
+            'totalRecords': self.data.missing_count(),
+            'records': records,
+        })
+
+    def bench(self, method, path):
+        with self.lock:
+            if method == 'GET' and path == '/bench/requests':
+                return self.send(200, dict(self.requests))
+            if method == 'POST' and path == '/bench/reset':
+                self.requests.clear()
+                return self.send(200, {})
+        return self.send(404, {'message': 'NotFound'})
+
+    def do_GET(self):
+        self.route('GET')
+
+    def do_POST(self):
+        self.route('POST')
+
+    def do_PUT(self):
+        self.route('PUT')
+
+
+def serve(data, port, host='127.0.0.1'):
+    handler = type('Handler', (Handler,), {
+        'data': data,
+        'requests': collections.Counter(),
+        'lock': threading.Lock(),
+    })
+    return http.server.ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stub Sonarr API serving a synthetic library')
+    parser.add_argument('--port', type=int, default=8990)
+    parser.add_argument('--host', default='127.0.0.1')
+    dataset.add_arguments(parser)
+    args = parser.parse_args()
+    server = serve(dataset.from_args(args), args.port, args.host)
+    print('Stub Sonarr listening on {}:{}'.format(args.host, server.server_address[1]), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,132 @@
+import os
+import json
+import sys
+import tempfile
+import pytest
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+sys.path.insert(0, APP_DIR)
+
+# utils reads CONFIGPATH at import time and stream_harvestarr parses
+# sys.argv and logs to <repo>/logs, so set all of that up before any test
+# module imports them.
+CONFIG_DIR = tempfile.mkdtemp(prefix='stream-harvestarr-tests-')
+os.environ['CONFIGPATH'] = os.path.join(CONFIG_DIR, 'config.yml')
+with open(os.environ['CONFIGPATH'], 'w') as f:
+    f.write(
+        'streamharvestarr:\n'
+        '    scan_interval: 60\n'
+        '    debug: False\n'
+        'sonarr:\n'
+        '    host: 127.0.0.1\n'
+        '    port: 1\n'
+        '    apikey: test\n'
+        '    ssl: false\n'
+        'ytdl:\n'
+        '    default_format: best\n'
+        '    merge_output_format: mkv\n'
+        'series:\n'
+        '  - title: Test Show\n'
+        '    url: https://example.com/playlist\n'
+    )
+os.makedirs(os.path.join(APP_DIR, '..', 'logs'), exist_ok=True)
+
+
+@pytest.fixture(scope='session')
+def harvester():
+    """The stream_harvestarr module, imported with the test config"""
+    argv = sys.argv
+    sys.argv = ['stream_harvestarr.py']
+    try:
+        import stream_harvestarr
+    finally:
+        sys.argv = argv
+    return stream_harvestarr
+
+
+@pytest.fixture
+def client(harvester, tmp_path, monkeypatch):
+    """A StreamHarvester with its own empty database"""
+    monkeypatch.setattr(harvester, 'CONFIGPATH', str(tmp_path))
+    return harvester.StreamHarvester()
+
+
+class FakeResponse(object):
+    """Just enough of requests.Response for the Sonarr calls"""
+
+    def __init__(self, url, status_code, body):
+        self.url = url
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.body = body.encode('utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def close(self):
+        pass
+
+    def json(self):
+        return json.loads(self.body)
+
+    def iter_content(self, size):
+        # Small chunks so streamed parsing crosses chunk boundaries
+        for start in range(0, len(self.body), 7):
+            yield self.body[start:start + 7]
+
+
+class FakeSession(object):
+    """Stands in for the Sonarr session
+    - ``routes``: {path suffix: (status, body) or an exception to raise};
+      any other GET answers 200 with an empty list
+    """
+
+    def __init__(self, routes=None):
+        self.routes = routes or {}
+        self.paths = []
+
+    def answer(self, url):
+        path = url.split('?')[0]
+        self.paths.append(path)
+        for suffix, answer in self.routes.items():
+            if path.endswith(suffix):
+                if isinstance(answer, Exception):
+                    raise answer
+                return FakeResponse(url, *answer)
+        return FakeResponse(url, 200, '[]')
+
+    def get(self, url, timeout=None, stream=False):
+        return self.answer(url)
+
+    def post(self, url, headers=None, params=None, json=None, timeout=None):
+        return self.answer(url)
+
+
+class FakeYoutubeDL(object):
+    """Answers extract_info() without touching the network
+    - ``results``: {url: info dict, or an exception to raise}
+    - ``default``: the answer for any other URL
+    ``calls`` records each ``(url, ie_key)`` asked for.
+    """
+
+    def __init__(self, results=None, default=None, params=None):
+        self.results = results or {}
+        self.default = default
+        self.params = params
+        self.calls = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def extract_info(self, url, download=False, ie_key=None, process=False):
+        self.calls.append((url, ie_key))
+        answer = self.results.get(url, self.default)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
@@ -0,0 +1,21 @@
+import os
+import sys
+import json
+import subprocess
+
+RUN = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bench', 'run.py'))
+
+
+def bench(*args):
+    return subprocess.run(
+        [sys.executable, RUN, '--series', '3', '--cycles', '1', '--json'] + list(args),
+        capture_output=True, text=True, timeout=120, check=True,
+    )
+
+
+def test_bench_is_quiet_unless_verbose():
+    quiet = bench()
+    assert ' - INFO - ' not in quiet.stdout + quiet.stderr
+    assert json.loads(quiet.stdout)['cycles'][0]['found'] > 0
+    verbose = bench('--verbose')
+    assert ' - INFO - ' in verbose.stderr
@@ -0,0 +1,38 @@
+import time
+from yt_dlp.utils import LazyList
+from conftest import FakeYoutubeDL
+
+
+def video():
+    return {
+        'id': 'v',
+        'title': 'Episode 1',
+        'formats': [{
+            'format_id': 'dash',
+            'url': 'https://example.com/v.mpd',
+            'fragments': LazyList({'path': 'seg-{}'.format(i)} for i in range(3)),
+        }],
+        'thumbnails': [{'url': 'https://example.com/v.jpg'}],
+    }
+
+
+def test_extract_video_copes_with_lazy_fragments(client):
+    ydl = FakeYoutubeDL(default=video())
+    first = client.extract_video(ydl, 'https://example.com/v', 'Generic')
+    # process_ie_result() adds fields to the info dict and its formats
+    first['formats'][0]['format'] = 'dash - 1080p'
+    first['thumbnails'][0]['id'] = '0'
+    first['requested_formats'] = first['formats']
+    second = client.extract_video(ydl, 'https://example.com/v', 'Generic')
+    assert len(ydl.calls) == 1
+    assert 'format' not in second['formats'][0]
+    assert 'id' not in second['thumbnails'][0]
+    assert 'requested_formats' not in second
+    assert [fragment['path'] for fragment in second['formats'][0]['fragments']] == ['seg-0', 'seg-1', 'seg-2']
+
+
+def test_expirevideoinfo_drops_stale_entries(harvester, client):
+    client.video_info['https://example.com/old'] = (time.time() - harvester.VIDEO_INFO_TTL - 1, video())
+    client.video_info['https://example.com/new'] = (time.time(), video())
+    client.expirevideoinfo()
+    assert list(client.video_info) == ['https://example.com/new']
@@ -0,0 +1,100 @@
+import json
+import socket
+import urllib.error
+import urllib.request
+import pytest
+from httpd import MAX_BODY, serve
+
+
+@pytest.fixture
+def listener(harvester, client):
+    """The app's routes served on a free local port, webhooks on"""
+    client.webhook = True
+    client.webhook_password = None
+    client.http_host = '127.0.0.1'
+    server = serve('127.0.0.1', 0, harvester.httproutes(client))
+    yield client, 'http://127.0.0.1:{}'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(url, data=None):
+    """Return (status, content type, body) without raising on errors"""
+    try:
+        with urllib.request.urlopen(url, data, timeout=10) as res:
+            return res.status, res.headers['Content-Type'], res.read().decode('utf-8')
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers['Content-Type'], e.read().decode('utf-8')
+
+
+def test_metrics(harvester, listener):
+    client, base = listener
+    harvester.metrics.inc('stream_harvestarr_cycles_total')
+    status, content_type, body = fetch(base + '/metrics')
+    assert status == 200
+    assert content_type == 'text/plain; version=0.0.4'
+    assert '# TYPE stream_harvestarr_cycles_total counter' in body
+
+
+def test_healthz(listener):
+    client, base = listener
+    assert fetch(base + '/healthz') == (200, 'text/plain', 'OK\n')
+    assert fetch(base + '/healthz?probe=1')[0] == 200
+
+
+def test_webhook_post_queues_a_harvest(listener):
+    client, base = listener
+    event = {'eventType': 'SeriesAdd', 'series': {'id': 3, 'title': 'Test Show'}}
+    assert fetch(base + '/webhook', json.dumps(event).encode('utf-8')) == (202, 'text/plain', 'Queued\n')
+    assert client.queuedharvests() == {3}
+
+
+@pytest.mark.parametrize('path, data', [
+    ('/nothing', None),
+    ('/webhook', None),
+    ('/metrics', b'{}'),
+], ids=['unknown_path', 'webhook_get', 'metrics_post'])
+def test_unknown_routes_are_404(listener, path, data):
+    client, base = listener
+    assert fetch(base + path, data)[0] == 404
+    assert client.queuedharvests() == set()
+
+
+def test_no_webhook_route_unless_enabled(harvester, client):
+    client.webhook = False
+    assert set(harvester.httproutes(client)) == {('GET', '/metrics'), ('GET', '/healthz')}
+
+
+@pytest.mark.parametrize('host, password, accepted', [
+    ('0.0.0.0', None, False),
+    ('::', None, False),
+    ('0.0.0.0', '1234', True),
+    ('127.0.0.1', None, True),
+])
+def test_webhooks_on_all_interfaces_need_a_password(harvester, client, host, password, accepted):
+    client.webhook = True
+    client.webhook_password = password
+    client.http_host = host
+    assert (('POST', '/webhook') in harvester.httproutes(client)) is accepted
+
+
+def status_line(base, content_length):
+    """Send just the headers of a webhook POST and return the status line"""
+    host, port = base.rsplit('/', 1)[1].split(':')
+    with socket.create_connection((host, int(port)), timeout=10) as conn:
+        conn.sendall('POST /webhook HTTP/1.1\r\nHost: x\r\nContent-Length: {}\r\n\r\n'.format(
+            content_length).encode('ascii'))
+        return conn.makefile('rb').readline().decode('ascii').strip()
+
+
+def test_oversized_body_is_413_without_reading_it(listener):
+    client, base = listener
+    # No body is sent: the server must answer from the headers alone
+    assert status_line(base, MAX_BODY + 1).split(' ', 1)[1] == '413 Request Entity Too Large'
+    assert client.queuedharvests() == set()
+
+
+@pytest.mark.parametrize('content_length', ['lots', '-1'])
+def test_invalid_content_length_is_400(listener, content_length):
+    client, base = listener
+    assert status_line(base, content_length).split(' ', 1)[1] == '400 Bad Request'
@@ -0,0 +1,49 @@
+def sonarr_series(series_id, title, tvdb_id):
+    return {'id': series_id, 'title': title, 'tvdbId': tvdb_id, 'path': '/tv/{}'.format(title), 'monitored': True}
+
+
+def configure(client, *entries):
+    client.series = list(entries)
+    client.changed_series = set()
+    client.indexseries()
+
+
+def urls(matches):
+    return [match['url'] for match in matches]
+
+
+def test_ids_pick_the_right_series_among_duplicate_titles(client):
+    configure(
+        client,
+        {'title': 'The Office', 'tvdb_id': 73244, 'url': 'https://example.com/us'},
+        {'title': 'The Office', 'sonarr_id': 2, 'url': 'https://example.com/uk'},
+    )
+    assert urls(client.matchseries(sonarr_series(1, 'The Office', 73244))) == ['https://example.com/us']
+    assert urls(client.matchseries(sonarr_series(2, 'The Office', 78107))) == ['https://example.com/uk']
+    assert client.matchseries(sonarr_series(3, 'The Office', 1)) == []
+
+
+def test_id_entries_ignore_renames_in_sonarr(client):
+    configure(client, {'title': 'Old Name', 'tvdb_id': 100, 'url': 'https://example.com/a'})
+    assert urls(client.matchseries(sonarr_series(1, 'New Name', 100))) == ['https://example.com/a']
+    assert client.matchseries(sonarr_series(2, 'Old Name', 200)) == []
+
+
+def test_entries_without_an_id_match_on_the_normalized_title(client):
+    configure(client, {'title': ' Bob\u2019s Show ', 'url': 'https://example.com/a'})
+    assert client.matchseries(sonarr_series(2, "Bob's Show 2", 100)) == []
+    matched = client.matchseries(sonarr_series(1, "Bob's Show", 100))
+    assert urls(matched) == ['https://example.com/a']
+    # Sonarr's fields are kept, config settings are overlaid
+    assert matched[0]['id'] == 1
+    assert matched[0]['playlistreverse'] is True
+
+
+def test_duplicate_title_entries_each_produce_a_match(client):
+    configure(
+        client,
+        {'title': 'Test Show', 'url': 'https://example.com/main'},
+        {'title': 'Test Show', 'url': 'https://example.com/extras'},
+    )
+    assert urls(client.matchseries(sonarr_series(1, 'Test Show', 100))) == [
+        'https://example.com/main', 'https://example.com/extras']
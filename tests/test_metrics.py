@@ -0,0 +1,32 @@
+from metrics import Metrics, format_labels
+
+
+def test_histogram_buckets_sum_and_count():
+    m = Metrics()
+    for seconds in (0.02, 0.3, 45):
+        m.observe('stream_harvestarr_sonarr_request_duration_seconds', seconds, method='GET')
+    lines = m.render().splitlines()
+    name = 'stream_harvestarr_sonarr_request_duration_seconds'
+    assert '# TYPE {} histogram'.format(name) in lines
+    # Buckets are cumulative: each counts every observation up to its bound
+    assert '{}_bucket{{method="GET",le="0.01"}} 0'.format(name) in lines
+    assert '{}_bucket{{method="GET",le="0.025"}} 1'.format(name) in lines
+    assert '{}_bucket{{method="GET",le="0.5"}} 2'.format(name) in lines
+    assert '{}_bucket{{method="GET",le="30"}} 2'.format(name) in lines
+    assert '{}_bucket{{method="GET",le="+Inf"}} 3'.format(name) in lines
+    assert '{}_sum{{method="GET"}} 45.32'.format(name) in lines
+    assert '{}_count{{method="GET"}} 3'.format(name) in lines
+
+
+def test_unlabelled_counter():
+    m = Metrics()
+    m.inc('stream_harvestarr_cycles_total')
+    m.inc('stream_harvestarr_cycles_total')
+    assert 'stream_harvestarr_cycles_total 2' in m.render().splitlines()
+
+
+def test_label_values_are_escaped():
+    assert format_labels((('playlist', 'a"b\\c\nd'),)) == '{playlist="a\\"b\\\\c\\nd"}'
+    m = Metrics()
+    m.set('stream_harvestarr_crawl_entries', 5, playlist='Say "hi"\\\n')
+    assert 'stream_harvestarr_crawl_entries{playlist="Say \\"hi\\"\\\\\\n"} 5' in m.render().splitlines()
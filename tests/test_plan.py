@@ -0,0 +1,29 @@
+import time
+from playlist import PlaylistIndex, playlist_entry
+
+SERIES = {'id': 1, 'title': 'Test Show', 'url': 'https://cooling.example/playlist', 'playlistreverse': True}
+
+
+def episode(episode_id, title):
+    return {'id': episode_id, 'seriesId': 1, 'seasonNumber': 1, 'episodeNumber': episode_id, 'title': title,
+            'eligible_at': 0}
+
+
+def test_plan_lists_every_wanted_episode_without_waiting_out_a_cool_down(client, monkeypatch):
+    index = PlaylistIndex(SERIES['url'], [playlist_entry({
+        'id': title, 'title': title, 'url': 'https://cooling.example/{}'.format(title),
+    }) for title in ('Pilot', 'Second')])
+    monkeypatch.setattr(client, 'ytindex', lambda ydl_opts, url, cache=None: index)
+    # Searched a moment ago, so not due for the next scan
+    client.store.record_attempt(2, 1, 'missing')
+    throttle = client.throttle_for(SERIES['url'])
+    throttle.blocked_until = time.time() + 3600
+
+    start = time.time()
+    planned = client.plan([SERIES], [episode(1, 'Pilot'), episode(2, 'Second')])
+
+    assert time.time() - start < 5
+    assert planned['wanted'] == 2
+    assert [(p['episode_id'], p['due'], p['size']) for p in planned['downloads']] == [(1, True, None), (2, False, None)]
+    assert planned['unknown_sizes'] == 2
+    assert client.store.episode_attempts([1]) == {}
@@ -0,0 +1,155 @@
+import pytest
+from conftest import FakeYoutubeDL
+from playlist import PlaylistIndex, flatten_entries, follow_redirects, playlist_entry
+
+
+PLAYLIST = {
+    '_type': 'playlist',
+    'extractor_key': 'YoutubeTab',
+    'entries': [
+        {'_type': 'url', 'id': 'a', 'title': 'Episode 2', 'url': 'https://example.com/a', 'ie_key': 'Youtube'},
+        {'_type': 'url', 'id': 'b', 'title': 'Episode 1', 'url': 'https://example.com/b', 'ie_key': 'Youtube'},
+    ],
+}
+
+
+def test_follow_redirects_resolves_url_results():
+    ydl = FakeYoutubeDL({
+        'https://example.com/list': {'_type': 'url_transparent', 'url': 'https://example.com/playlist', 'ie_key': 'YoutubeTab'},
+        'https://example.com/playlist': PLAYLIST,
+    })
+    result = follow_redirects(ydl, {'_type': 'url', 'url': 'https://example.com/list', 'ie_key': 'Youtube'})
+    assert result is PLAYLIST
+    assert ydl.calls == [('https://example.com/list', 'Youtube'), ('https://example.com/playlist', 'YoutubeTab')]
+    assert [entry['id'] for entry in flatten_entries(result)] == ['a', 'b']
+
+
+def test_follow_redirects_leaves_playlists_and_videos_alone():
+    ydl = FakeYoutubeDL({})
+    assert follow_redirects(ydl, PLAYLIST) is PLAYLIST
+    video = {'id': 'v', 'title': 'A video'}
+    assert follow_redirects(ydl, video) is video
+    assert follow_redirects(ydl, None) is None
+    assert ydl.calls == []
+
+
+def test_titleentries_extracts_missing_titles(client):
+    ydl = FakeYoutubeDL({
+        'https://example.com/c': {'id': 'c', 'title': 'Episode 3'},
+        'https://example.com/d': {'id': 'd'},
+    })
+    entries = [playlist_entry(entry) for entry in [
+        {'id': 'c', 'url': 'https://example.com/c', 'ie_key': 'Generic'},
+        {'id': 'd', 'url': 'https://example.com/d', 'ie_key': 'Generic'},
+        {'id': 'e', 'title': 'Episode 5', 'url': 'https://example.com/e', 'ie_key': 'Generic'},
+    ]]
+    throttle = client.throttle_for('https://example.com/playlist')
+    titled = client.titleentries(ydl, throttle, 'https://example.com/playlist', entries)
+    assert [(entry['id'], entry['title']) for entry in titled] == [('c', 'Episode 3'), ('e', 'Episode 5')]
+
+
+def test_titleentries_reuses_cached_titles(client):
+    playlist = 'https://example.com/playlist'
+    client.store.save_playlist(playlist, [playlist_entry(
+        {'id': 'c', 'title': 'Episode 3', 'url': 'https://example.com/c', 'ie_key': 'Generic'}
+    )], True)
+    ydl = FakeYoutubeDL({})
+    entries = [playlist_entry({'id': 'c', 'url': 'https://example.com/c', 'ie_key': 'Generic'})]
+    titled = client.titleentries(ydl, client.throttle_for(playlist), playlist, entries)
+    assert [entry['title'] for entry in titled] == ['Episode 3']
+    assert ydl.calls == []
+
+
+def index_of(*videos):
+    """PlaylistIndex over ``(title, upload_date)`` pairs, ids v0, v1, ..."""
+    return PlaylistIndex('https://example.com/playlist', [playlist_entry({
+        'id': 'v{}'.format(i),
+        'title': title,
+        'upload_date': upload_date,
+        'url': 'https://example.com/v{}'.format(i),
+    }) for i, (title, upload_date) in enumerate(videos)])
+
+
+def test_search_matches_titles_case_insensitively():
+    index = index_of(('Show Name - The Pilot (1080p)', None), ('Show Name - Second', None))
+    assert index.search('the pilot')['id'] == 'v0'
+    assert index.search('Third') is None
+
+
+def test_search_walks_reversed_playlists_from_the_end():
+    # Oldest first with playlistreverse, as yt-dlp's matchtitle did
+    index = index_of(('Pilot (original)', None), ('Pilot (re-upload)', None))
+    assert index.search('Pilot')['id'] == 'v1'
+    assert index.search('Pilot', playlistreverse=False)['id'] == 'v0'
+
+
+def test_search_ignores_a_video_that_is_its_own_playlist():
+    index = PlaylistIndex('https://example.com/v0', [playlist_entry(
+        {'id': 'v0', 'title': 'Pilot', 'url': 'https://example.com/v0'}
+    )])
+    assert index.search('Pilot') is None
+
+
+def test_flatten_entries_skips_shorts():
+    channel = {'entries': [
+        {'webpage_url': 'https://example.com/@show/videos', 'entries': [
+            {'id': 'a', 'url': 'https://example.com/watch?v=a'},
+            {'id': 's', 'url': 'https://example.com/shorts/s'},
+        ]},
+        {'webpage_url': 'https://example.com/@show/shorts', 'entries': [
+            {'id': 't', 'url': 'https://example.com/shorts/t'},
+        ]},
+        None,
+        {'id': 'b', 'url': 'https://example.com/watch?v=b'},
+    ]}
+    assert [entry['id'] for entry in flatten_entries(channel)] == ['a', 'b']
+
+
+def test_flatten_entries_stops_after_a_run_of_known_entries():
+    consumed = []
+
+    def entries():
+        for video_id in 'nxabcd':
+            consumed.append(video_id)
+            yield {'id': video_id, 'url': 'https://example.com/' + video_id}
+    playlist = {'entries': entries()}
+    # 'x' is known but the run is broken by 'a'; 'b' and 'c' end it
+    ids = [entry['id'] for entry in flatten_entries(playlist, known={'x', 'b', 'c', 'd'}, stop_after=2)]
+    assert ids == ['n', 'x', 'a', 'b', 'c']
+    # Later playlist pages are never requested
+    assert consumed == list('nxabc')
+    assert [entry['id'] for entry in flatten_entries({'entries': entries()}, known={'b', 'c'})] == list('nxabcd')
+
+
+@pytest.mark.parametrize('wanted, video', [
+    ('Episode 10', 'Episode 1'),
+    ('My Show - Part 2', 'My Show - Part 1'),
+    ('Daily Show 2024-01-06', 'Daily Show 2024-01-05'),
+])
+def test_fuzzy_search_rejects_sibling_titles(wanted, video):
+    assert index_of((video, None)).fuzzy_search(wanted) is None
+
+
+def test_fuzzy_search_accepts_small_wording_changes():
+    index = index_of(('The Great Bake Off: Bread Week!', '20240105'), ('Cake Week', '20240112'))
+    entry, score = index.fuzzy_search('The Great Bake-Off - Bread Week', '2024-01-05T20:00:00Z')
+    assert entry['id'] == 'v0'
+    assert score >= 90
+
+
+def test_fuzzy_search_rejects_uploads_far_from_the_air_date():
+    index = index_of(('Bread Week!', '20240301'))
+    assert index.fuzzy_search('Bread Week', '2024-01-05T20:00:00Z') is None
+    assert index.fuzzy_search('Bread Week', '2024-03-02T20:00:00Z')[0]['id'] == 'v0'
+
+
+def test_fuzzy_search_needs_a_margin_over_the_runner_up():
+    index = index_of(('Cake and Bread Weeks', None), ('Cake n Bread Week', None))
+    assert index.fuzzy_search('Cake and Bread Week') is None
+    assert index_of(('Cake and Bread Weeks', None)).fuzzy_search('Cake and Bread Week')[0]['id'] == 'v0'
+
+
+def test_fuzzy_search_prefers_the_reupload_closest_to_the_air_date():
+    index = index_of(('Bread Week!', '20240101'), ('Bread Week!', '20240106'))
+    entry, _ = index.fuzzy_search('Bread Week', '2024-01-05T20:00:00Z')
+    assert entry['id'] == 'v1'
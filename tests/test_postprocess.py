@@ -0,0 +1,62 @@
+import os
+import sys
+import types
+import pickle
+import yt_dlp.postprocessor
+from yt_dlp.postprocessor.common import PostProcessor
+from postprocess import DeferredPostProcessor, postprocess_opts, process_pool, run_postprocessors
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+
+
+class RenamePP(PostProcessor):
+    """Stands in for a merger: replaces the downloaded file with a new one"""
+
+    def run(self, info):
+        final = info['filepath'].replace('.part.', '.')
+        os.rename(info['filepath'], final)
+        info['filepath'] = final
+        return [], info
+
+
+def run_in_worker(ydl_opts, deferred):
+    """Register RenamePP in the worker, then run the real entry point"""
+    yt_dlp.postprocessor.postprocessors.value['RenamePP'] = RenamePP
+    main = sys.modules.get('__mp_main__')
+    return run_postprocessors(ydl_opts, deferred), getattr(main, '__file__', None), sorted(sys.modules)
+
+
+def test_deferred_download_is_post_processed_in_the_pool(tmp_path, monkeypatch):
+    monkeypatch.setitem(yt_dlp.postprocessor.postprocessors.value, 'RenamePP', RenamePP)
+    downloaded = tmp_path / 'Episode 1.part.mkv'
+    downloaded.write_bytes(b'video')
+    opts = {'quiet': True, 'outtmpl': str(tmp_path / '%(title)s.%(ext)s'), 'post_hooks': [print]}
+    with DeferredPostProcessor(opts) as ydl:
+        info = {'id': 'v', 'title': 'Episode 1', 'ext': 'mkv', '__postprocessors': [RenamePP(ydl)]}
+        info = ydl.post_process(str(downloaded), info, {})
+    assert info['filepath'] == str(downloaded)
+    assert downloaded.exists()
+
+    deferred = pickle.loads(pickle.dumps(ydl.deferred))
+    assert len(deferred) == 1
+    filename, job, files_to_move, pp_keys = deferred[0]
+    assert filename == str(downloaded)
+    assert job['title'] == 'Episode 1'
+    assert '__postprocessors' not in job
+    assert files_to_move == {}
+    assert pp_keys == ['Rename']
+
+    # The app runs as a script in the container: no __spec__ on __main__
+    main = types.ModuleType('__main__')
+    main.__file__ = os.path.join(APP, 'stream_harvestarr.py')
+    main.__spec__ = None
+    monkeypatch.setitem(sys.modules, '__main__', main)
+    with process_pool(1) as pool:
+        assert pool._mp_context.get_start_method() == 'forkserver'
+        files, main_file, modules = pool.submit(run_in_worker, postprocess_opts(opts), ydl.deferred).result()
+    # The worker's __main__ is postprocess.py, not a second copy of the script
+    assert os.path.basename(main_file) == 'postprocess.py'
+    assert 'stream_harvestarr' not in modules
+    assert files == [str(tmp_path / 'Episode 1.mkv')]
+    assert not downloaded.exists()
+    assert (tmp_path / 'Episode 1.mkv').read_bytes() == b'video'
@@ -0,0 +1,106 @@
+import os
+import pstats
+import tracemalloc
+import pytest
+import profiling
+from profiling import Cycle, CycleProfiler
+
+
+class FakeClock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(profiling, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    was_tracing = tracemalloc.is_tracing()
+    yield CycleProfiler(str(tmp_path))
+    if not was_tracing:
+        tracemalloc.stop()
+
+
+def test_summary_adds_up_spans_of_the_same_name(clock):
+    cycle = Cycle()
+    for name, seconds in [('search', 3), ('download/Show A', 5), ('download/Show B', 1),
+                          ('download/Show A', 2), ('download/Show C', 4), ('download/Show D', 0.5),
+                          ('download', 12.5)]:
+        with cycle.span(name):
+            clock.now += seconds
+    cycle.count('found', 3)
+    cycle.count('found')
+    cycle.count('downloaded', 2)
+    assert cycle.summary() == (
+        'duration=28.00s downloaded=2 found=4 phase.search=3.00s phase.download=12.50s '
+        'slowest="download/Show A=7.00s,download/Show C=4.00s,download/Show B=1.00s"'
+    )
+
+
+def test_summary_without_series_spans(clock):
+    cycle = Cycle()
+    with cycle.phase('series'):
+        clock.now += 0.25
+    assert cycle.summary() == 'duration=0.25s phase.series=0.25s'
+
+
+def test_span_is_recorded_when_the_block_raises(clock):
+    cycle = Cycle()
+    with pytest.raises(ValueError):
+        with cycle.span('episodes'):
+            clock.now += 1
+            raise ValueError('Sonarr')
+    assert cycle.spans == {'episodes': 1}
+
+
+def test_profile_and_memory_report_per_cycle(profiler, tmp_path):
+    for _ in range(2):
+        with profiler.cycle():
+            sum(range(1000))
+    profiles = sorted(tmp_path.glob('cycle-*.prof'))
+    assert len(profiles) == 2
+    assert pstats.Stats(str(profiles[-1])).total_calls > 0
+    first, second = (str(path)[:-len('.prof')] + '-memory.txt' for path in profiles)
+    with open(first) as f:
+        report = f.read()
+    assert report.startswith('Traced memory: ')
+    assert 'since the previous cycle' not in report
+    with open(second) as f:
+        assert 'Top {} changes since the previous cycle:'.format(profiling.TRACEMALLOC_TOP) in f.read()
+
+
+def test_only_the_latest_cycles_are_kept(profiler, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_KEEP', 2)
+    # Left by earlier runs; names sort by time
+    for stamp in ('20240101-000000-000000', '20240102-000000-000000'):
+        (tmp_path / 'cycle-{}.prof'.format(stamp)).write_bytes(b'')
+        (tmp_path / 'cycle-{}-memory.txt'.format(stamp)).write_text('')
+    (tmp_path / 'stream_harvestarr.log').write_text('')
+    with profiler.cycle():
+        pass
+    assert sorted(os.listdir(str(tmp_path)))[:2] == [
+        'cycle-20240102-000000-000000-memory.txt', 'cycle-20240102-000000-000000.prof'
+    ]
+    with profiler.cycle():
+        pass
+    names = sorted(os.listdir(str(tmp_path)))
+    assert len(names) == 5
+    assert not any(name.startswith('cycle-2024') for name in names)
+    assert 'stream_harvestarr.log' in names
+    assert len([name for name in names if name.endswith('-memory.txt')]) == 2
+
+
+def test_unwritable_directory_skips_the_profile(profiler, tmp_path, caplog):
+    profiler.directory = str(tmp_path / 'missing')
+    with profiler.cycle():
+        pass
+    assert 'Could not write profile' in caplog.text
+    assert profiler.previous is None
@@ -0,0 +1,57 @@
+import json
+import pytest
+from records import EpisodeRecord, iter_json_array
+
+ITEMS = [
+    {'id': 1, 'title': 'He said \\"hi\\" \\\\ "quoted" ]}', 'tags': [[1, 2], [], [[3]]]},
+    {'id': 2, 'title': 'Café – \U0001f4fa', 'runtime': 12.5, 'ratings': {'votes': [10, 20]}},
+    [['nested', ['arrays']], {'a': []}],
+    'a "string" item',
+    -1234567,
+    None,
+]
+PAGE = {'page': 1, 'note': 'records: [1, 2]', 'records': ITEMS, 'totalRecords': 6}
+
+
+def chunked(text, size):
+    data = text.encode('utf-8')
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 7, 64])
+def test_items_survive_any_chunk_boundary(size):
+    text = json.dumps(ITEMS, ensure_ascii=False, indent=1)
+    assert list(iter_json_array(chunked(text, size))) == ITEMS
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 7, 64])
+def test_keyed_array_and_meta_survive_any_chunk_boundary(size):
+    meta = {}
+    text = json.dumps(PAGE, ensure_ascii=False)
+    assert list(iter_json_array(chunked(text, size), 'records', meta)) == ITEMS
+    assert meta == {'page': 1, 'note': 'records: [1, 2]', 'totalRecords': 6}
+
+
+def test_number_split_across_chunks():
+    assert list(iter_json_array([b'[12', b'.5, 3', b'4]'])) == [12.5, 34]
+
+
+def test_empty_array():
+    assert list(iter_json_array([b' [ ', b'] '])) == []
+
+
+@pytest.mark.parametrize('text', ['[1, 2', '[1 2]', '{"page": 1}'])
+def test_malformed_responses_raise(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunked(text, 2), 'records' if text.startswith('{') else None))
+
+
+def test_record_keeps_only_its_fields():
+    eps = EpisodeRecord({'id': 11, 'title': 'Pilot', 'overview': 'Long text', 'hasFile': False})
+    assert dict(eps) == {'id': 11, 'title': 'Pilot', 'hasFile': False}
+    assert 'overview' not in eps
+    assert 'airDateUtc' not in eps
+    with pytest.raises(KeyError):
+        eps['airDateUtc']
+    eps['eligible_at'] = 0
+    assert eps['eligible_at'] == 0
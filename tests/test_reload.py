@@ -0,0 +1,84 @@
+import logging
+import pytest
+import utils
+
+SETTINGS = (
+    'streamharvestarr:\n'
+    '    scan_interval: 60\n'
+    '    debug: {debug}\n'
+    'sonarr:\n'
+    '    host: 127.0.0.1\n'
+    '    port: 1\n'
+    '    apikey: test\n'
+    '    ssl: false\n'
+    'ytdl:\n'
+    '    default_format: best\n'
+    '    merge_output_format: mkv\n'
+)
+SERIES = (
+    'series:\n'
+    '  - title: {title}\n'
+    '    url: https://example.com/playlist\n'
+)
+
+
+class Session(object):
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def config(harvester, client, tmp_path, monkeypatch):
+    """Write config.yml for the client to reload; the client starts from
+    the test config, with its own session"""
+    path = tmp_path / 'config.yml'
+    monkeypatch.setattr(harvester, 'CONFIGFILE', str(path))
+    monkeypatch.setattr(utils, 'CONFIGFILE', str(path))
+    client.session = Session()
+    yield lambda text: path.write_text(text)
+    client.debug = False
+    client.set_log_level()
+
+
+def test_reload_applies_the_new_config(client, config):
+    old_session = client.session
+    config(SETTINGS.format(debug="'True'") + SERIES.format(title='Other Show'))
+    assert client.reloadconfig() is True
+    assert old_session.closed
+    assert client.session is not old_session
+    assert list(client.series_index) == [('title', 'Other Show')]
+    assert client.changed_series == {('title', 'Test Show'), ('title', 'Other Show')}
+    assert logging.getLogger('stream_harvestarr').level == logging.DEBUG
+    # Unchanged file: nothing to do
+    assert client.reloadconfig() is False
+
+    config(SETTINGS.format(debug='False') + SERIES.format(title='Other Show'))
+    assert client.reloadconfig() is True
+    logger = logging.getLogger('stream_harvestarr')
+    assert logger.level == logging.INFO
+    assert all(handler.level == logging.INFO for handler in logger.handlers)
+
+
+def test_failed_reload_keeps_the_previous_config(client, config, monkeypatch):
+    old_session = client.session
+    built = []
+
+    def new_session():
+        built.append(Session())
+        return built[-1]
+    monkeypatch.setattr(client, 'sonarr_session', new_session)
+    # debug on, then an error once the new session is built: no series
+    config(SETTINGS.format(debug="'True'"))
+    assert client.reloadconfig() is False
+    assert client.session is old_session
+    assert not old_session.closed
+    assert len(built) == 1
+    assert built[0].closed
+    assert list(client.series_index) == [('title', 'Test Show')]
+    assert logging.getLogger('stream_harvestarr').level == logging.INFO
+    # The broken file isn't retried every scan
+    assert client.reloadconfig() is False
+    assert len(built) == 1
@@ -0,0 +1,16 @@
+from conftest import FakeSession
+
+
+def test_scan_with_nothing_due_flushes_leftover_rescans(harvester, client):
+    client.store.add_pending_rescan(5)
+    client.session = FakeSession({'/command': (201, '{"name": "RescanSeries"}')})
+    assert harvester.main(client) is True
+    assert client.store.pending_rescans() == []
+    assert sum(path.endswith('/command') for path in client.session.paths) == 1
+
+
+def test_failed_rescan_stays_pending(harvester, client):
+    client.store.add_pending_rescan(5)
+    client.session = FakeSession({'/command': (503, '{"message": "Service Unavailable"}')})
+    harvester.main(client)
+    assert client.store.pending_rescans() == [5]
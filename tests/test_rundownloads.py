@@ -0,0 +1,78 @@
+import time
+import threading
+import pytest
+
+
+def job(series_id, url):
+    return {'series': {'id': series_id, 'title': 'Test Show'}, 'episode': {'id': series_id, 'title': 'Episode {}'.format(series_id)}, 'url': url}
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_cooling_down_site_is_left_for_a_later_scan(client, monkeypatch, workers):
+    client.download_workers = workers
+    client.postprocess_workers = 0
+    started = []
+    lock = threading.Lock()
+
+    def downloadepisode(job):
+        throttle = client.throttle_for(job['url'])
+        try:
+            with lock:
+                started.append(job['url'])
+            return True
+        finally:
+            throttle.release()
+    monkeypatch.setattr(client, 'downloadepisode', downloadepisode)
+
+    cooling = client.throttle_for('https://cooling.example/a')
+    cooling.blocked_until = time.time() + 3600
+    client.store.record_attempt(1, 1, 'found')
+    start = time.time()
+    client.rundownloads([job(1, 'https://cooling.example/a'), job(2, 'https://other.example/b')])
+
+    assert time.time() - start < 5
+    assert started == ['https://other.example/b']
+    assert client.cycle.counts['deferred'] == 1
+    # Searched again by the scan that runs when the cool-down ends
+    assert client.next_due == cooling.blocked_until
+    assert 1 not in client.store.episode_attempts([1])
+    assert cooling.active == 0
+
+
+def test_download_releases_slot_when_wait_fails(client, monkeypatch):
+    url = 'https://other.example/b'
+    throttle = client.throttle_for(url)
+
+    def wait(kind='download'):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(throttle, 'wait', wait)
+    assert throttle.reserve()
+    try:
+        client.downloadepisode(job(1, url))
+    except KeyboardInterrupt:
+        pass
+    assert throttle.active == 0
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_job_is_handed_back_when_its_site_starts_cooling_down(harvester, client, monkeypatch, workers):
+    client.download_workers = workers
+    client.postprocess_workers = 0
+    url = 'https://cooling.example/a'
+    throttle = client.throttle_for(url)
+    downloadepisode = client.downloadepisode
+
+    def rate_limited_meanwhile(job):
+        # A sibling job on the same site was rate limited after dispatch
+        throttle.blocked_until = time.time() + 3600
+        return downloadepisode(job)
+    monkeypatch.setattr(client, 'downloadepisode', rate_limited_meanwhile)
+
+    start = time.time()
+    client.rundownloads([job(1, url)])
+
+    assert time.time() - start < 5
+    assert client.cycle.counts['deferred'] == 1
+    assert 'failed' not in client.cycle.counts
+    assert client.next_due == throttle.blocked_until
+    assert throttle.active == 0
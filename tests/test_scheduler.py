@@ -0,0 +1,102 @@
+import pytest
+from scheduler import DEFAULT_RETRY_CADENCE, miss_backoff, next_search, parse_retry_cadence, retry_interval
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+@pytest.mark.parametrize('config, tiers', [
+    # Sorted by age, open-ended tier last
+    ([{'every_minutes': '720'}, {'age_hours': '24', 'every_minutes': '15'}, {'age_hours': '168', 'every_minutes': '120'}],
+     [(DAY, 900), (7 * DAY, 7200), (None, 43200)]),
+    # No open-ended tier: the slowest listed rate carries on past the last age
+    ([{'age_hours': '2', 'every_minutes': '5'}, {'age_hours': '48', 'every_minutes': '60'}],
+     [(2 * HOUR, 300), (2 * DAY, 3600), (None, 3600)]),
+    # Only an open-ended tier
+    ([{'every_minutes': '0'}], [(None, 0)]),
+    # Fractions
+    ([{'age_hours': '0.5', 'every_minutes': '1.5'}, {'every_minutes': '30'}], [(1800, 90), (None, 1800)]),
+])
+def test_parse_retry_cadence(config, tiers):
+    assert parse_retry_cadence(config) == tiers
+
+
+@pytest.mark.parametrize('config', [
+    [],
+    [{'age_hours': '24'}],
+    [{'every_minutes': 'often'}],
+])
+def test_parse_retry_cadence_rejects(config):
+    with pytest.raises((KeyError, ValueError)):
+        parse_retry_cadence(config)
+
+
+@pytest.mark.parametrize('age, interval', [
+    (0, 15 * 60),
+    (DAY - 1, 15 * 60),
+    # A tier's age is exclusive
+    (DAY, 2 * HOUR),
+    (7 * DAY - 1, 2 * HOUR),
+    (7 * DAY, 12 * HOUR),
+    # Open-ended last tier
+    (365 * DAY, 12 * HOUR),
+])
+def test_retry_interval_tiers(age, interval):
+    assert retry_interval(DEFAULT_RETRY_CADENCE, age) == interval
+
+
+def test_retry_interval_without_open_ended_tier():
+    assert retry_interval([(HOUR, 60), (DAY, 600)], 2 * DAY) == 600
+
+
+@pytest.mark.parametrize('eligible_at, last_tried, due', [
+    # Never searched: due as soon as it is eligible, even in the future
+    (1000, None, 1000),
+    (10 * DAY, None, 10 * DAY),
+    # Tried an hour after airing: first-day tier
+    (0, HOUR, HOUR + 15 * 60),
+    # Tried three days after airing: first-week tier
+    (0, 3 * DAY, 3 * DAY + 2 * HOUR),
+    # Tried a month after airing: open-ended tier
+    (0, 30 * DAY, 30 * DAY + 12 * HOUR),
+    # Tried before it was eligible (negative age) counts as age 0
+    (DAY, DAY - HOUR, DAY - HOUR + 15 * 60),
+])
+def test_next_search(eligible_at, last_tried, due):
+    assert next_search(DEFAULT_RETRY_CADENCE, eligible_at, last_tried) == due
+
+
+# After 3 free misses, doubling, capped at a day
+BACKOFF = (3, 2, DAY)
+
+
+@pytest.mark.parametrize('interval, misses, backoff, stretched', [
+    # Disabled
+    (900, 50, None, 900),
+    # The first ``after`` misses are free
+    (900, 0, BACKOFF, 900),
+    (900, 3, BACKOFF, 900),
+    # Each miss past that multiplies the interval
+    (900, 4, BACKOFF, 1800),
+    (900, 5, BACKOFF, 3600),
+    (900, 8, BACKOFF, 900 * 2 ** 5),
+    # ...up to max_seconds
+    (900, 12, BACKOFF, DAY),
+    (900, 1000, BACKOFF, DAY),
+    # The cap never shortens what the cadence asks for
+    (2 * DAY, 10, BACKOFF, 2 * DAY),
+    # A 0 interval (search every scan) stays 0
+    (0, 10, BACKOFF, 0),
+    (900, 4, (3, 1.5, DAY), 1350),
+])
+def test_miss_backoff(interval, misses, backoff, stretched):
+    assert miss_backoff(interval, misses, backoff) == stretched
+
+
+def test_next_search_backs_off_after_misses():
+    # First-day tier (15 minutes), five misses: 15m * 2**2
+    assert next_search(DEFAULT_RETRY_CADENCE, 0, HOUR, 5, BACKOFF) == HOUR + 3600
+    # Open-ended tier (12 hours) capped at a day
+    assert next_search(DEFAULT_RETRY_CADENCE, 0, 30 * DAY, 10, BACKOFF) == 31 * DAY
+    # Misses don't delay an episode that was never searched
+    assert next_search(DEFAULT_RETRY_CADENCE, 1000, None, 10, BACKOFF) == 1000
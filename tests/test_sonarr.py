@@ -0,0 +1,94 @@
+import pytest
+import requests
+from conftest import FakeSession
+
+
+@pytest.fixture(params=[False, True], ids=['json', 'stream_json'])
+def sonarr(request, client):
+    client.stream_json = request.param
+    return client
+
+
+def test_error_response_raises_without_the_api_key(sonarr):
+    sonarr.session = FakeSession({'/series': (503, '{"message": "Service Unavailable"}')})
+    with pytest.raises(requests.HTTPError) as e:
+        sonarr.get_series()
+    assert e.value.response.status_code == 503
+    assert '503' in str(e.value)
+    assert sonarr.api_key not in str(e.value)
+
+
+def test_scan_is_skipped_when_sonarr_keeps_failing(harvester, sonarr):
+    sonarr.session = FakeSession({'/series': (503, '{"message": "Service Unavailable"}')})
+    assert harvester.main(sonarr) is False
+
+
+def test_cached_series_lookup_fails_the_scan_not_the_process(harvester, sonarr):
+    # Between full refreshes the matched series are fetched one by one
+    sonarr.series_catalogue = {1: {'title': 'Test Show', 'path': '/tv/Test Show', 'monitored': True}}
+    sonarr.series_catalogue_at = harvester.time.time()
+    sonarr.session = FakeSession({'/series/1': (503, '{"message": "Service Unavailable"}')})
+    with pytest.raises(requests.HTTPError):
+        sonarr.get_series_by_series_id(1)
+    assert harvester.main(sonarr) is False
+    assert any(path.endswith('/series/1') for path in sonarr.session.paths)
+
+
+def test_series_lookup_404_is_none(sonarr):
+    sonarr.session = FakeSession({'/series/1': (404, '{"message": "NotFound"}')})
+    assert sonarr.get_series_by_series_id(1) is None
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_sonarr_calls_are_not_paced_by_sleep_requests(harvester, client, monkeypatch, workers):
+    client.sleep_requests = 3
+    client.sonarr_workers = workers
+    monkeypatch.setattr(harvester.time, 'sleep', lambda seconds: pytest.fail('slept {}s'.format(seconds)))
+    assert client.sonarr_map(lambda series_id: series_id * 2, [1, 2, 3]) == [2, 4, 6]
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_request_delay_spaces_out_per_series_calls(client, monkeypatch, workers):
+    import throttle
+    slept = []
+    # A frozen clock: each call waits for its slot, 2s after the previous one
+    monkeypatch.setattr(throttle.time, 'time', lambda: 1000.0)
+    monkeypatch.setattr(throttle.time, 'sleep', slept.append)
+    client.sonarr_request_delay = 2
+    client.sonarr_workers = workers
+    assert client.sonarr_map(lambda series_id: series_id * 2, [1, 2, 3]) == [2, 4, 6]
+    assert sorted(slept) == [2.0, 4.0]
+
+
+@pytest.mark.parametrize('matched, by_id', [(2, True), (21, False)])
+def test_many_cached_series_fall_back_to_the_full_list(harvester, client, matched, by_id):
+    client.series_catalogue = {
+        i: {'title': 'Show {}'.format(i), 'path': '/tv/{}'.format(i), 'monitored': True} for i in range(1, matched + 1)
+    }
+    client.series_catalogue_at = harvester.time.time()
+    client.session = FakeSession({'/series/1': (200, '{"id": 1}'), '/series/2': (200, '{"id": 2}')})
+    series, full = client.sonarrseries()
+    assert full is not by_id
+    assert any(path.endswith('/series/1') for path in client.session.paths) is by_id
+
+
+@pytest.mark.parametrize('body', ['<html><body>Bad Gateway</body></html>', '[{"id": 1, "title": "Tes'])
+def test_non_json_body_fails_the_scan_not_the_process(harvester, client, body):
+    client.stream_json = True
+    client.session = FakeSession({'/series': (200, body)})
+    with pytest.raises(requests.exceptions.InvalidJSONError) as e:
+        client.get_series()
+    assert client.api_key not in str(e.value)
+    assert harvester.main(client) is False
+
+
+@pytest.mark.parametrize('answer', [
+    (503, '{"message": "Service Unavailable"}'),
+    (200, '<html><body>Bad Gateway</body></html>'),
+    requests.ConnectionError('Connection refused'),
+], ids=['http_error', 'not_json', 'connection_error'])
+def test_failed_calendar_request_has_no_upcoming_episodes(harvester, sonarr, caplog, answer):
+    sonarr.session = FakeSession({'/calendar': answer})
+    start = harvester.datetime(2024, 1, 1)
+    assert sonarr.get_calendar({1}, start, start + harvester.timedelta(days=1)) == {}
+    assert 'calendar request failed' in caplog.text
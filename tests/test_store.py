@@ -0,0 +1,43 @@
+from playlist import playlist_entry
+from store import HarvestStore
+
+PLAYLIST = 'https://example.com/playlist'
+
+
+def entries(*ids):
+    return [playlist_entry({'id': video_id, 'title': 'Episode {}'.format(video_id),
+                            'url': 'https://example.com/{}'.format(video_id)}) for video_id in ids]
+
+
+def cached_ids(store):
+    return [entry['id'] for entry in store.playlist_entries(PLAYLIST)]
+
+
+def test_incremental_crawls_place_new_entries_first(tmp_path):
+    store = HarvestStore(str(tmp_path / 'harvest.db'))
+    store.save_playlist(PLAYLIST, entries('c', 'b', 'a'), True)
+    full_crawl = store.playlist_last_full_crawl(PLAYLIST)
+    # An incremental crawl stops at the first known entry
+    store.save_playlist(PLAYLIST, entries('e', 'd', 'c'), False)
+    assert cached_ids(store) == ['e', 'd', 'c', 'b', 'a']
+    store.save_playlist(PLAYLIST, entries('f'), False)
+    assert cached_ids(store) == ['f', 'e', 'd', 'c', 'b', 'a']
+    assert store.playlist_last_full_crawl(PLAYLIST) == full_crawl
+
+
+def test_known_entries_keep_position_and_refresh_metadata(tmp_path):
+    store = HarvestStore(str(tmp_path / 'harvest.db'))
+    store.save_playlist(PLAYLIST, entries('b', 'a'), True)
+    renamed = playlist_entry({'id': 'a', 'title': 'Episode A', 'url': 'https://example.com/a'})
+    store.save_playlist(PLAYLIST, entries('c') + [renamed], False)
+    assert [(entry['id'], entry['title']) for entry in store.playlist_entries(PLAYLIST)] == [
+        ('c', 'Episode c'), ('b', 'Episode b'), ('a', 'Episode A')]
+
+
+def test_full_crawl_rebuilds_order(tmp_path):
+    store = HarvestStore(str(tmp_path / 'harvest.db'))
+    store.save_playlist(PLAYLIST, entries('c', 'b', 'a'), True)
+    store.save_playlist(PLAYLIST, entries('d', 'c'), False)
+    # Removed from the site and reordered
+    store.save_playlist(PLAYLIST, entries('a', 'd'), True)
+    assert cached_ids(store) == ['a', 'd']
@@ -0,0 +1,127 @@
+import pytest
+import throttle
+from throttle import DomainThrottle, TokenBucket
+
+
+class FakeClock(object):
+    """Stands in for the time module: sleep() just moves time forward"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(throttle, 'time', clock)
+    return clock
+
+
+def test_bucket_allows_a_burst_then_waits_for_refill(clock):
+    # 30 a minute: one token every 2 seconds
+    bucket = TokenBucket(rate=30, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    # Empty: each further waiter queues behind the one before
+    assert bucket.take() == pytest.approx(2)
+    assert bucket.take() == pytest.approx(4)
+
+
+def test_bucket_refills_up_to_burst(clock):
+    bucket = TokenBucket(rate=30, burst=2)
+    bucket.take()
+    bucket.take()
+    clock.now += 2
+    assert bucket.take() == 0
+    assert bucket.take() == pytest.approx(2)
+    # Idle for long: only ``burst`` tokens are saved up
+    clock.now += 3600
+    assert [bucket.take() for _ in range(3)] == [0, 0, pytest.approx(2)]
+
+
+def test_bucket_refills_slower_when_scaled_down(clock):
+    bucket = TokenBucket(rate=30, burst=1)
+    bucket.scale = 0.5
+    bucket.take()
+    assert bucket.take() == pytest.approx(4)
+
+
+def test_zero_rate_never_waits(clock):
+    bucket = TokenBucket(rate=0)
+    assert [bucket.take() for _ in range(100)] == [0] * 100
+
+
+def test_wait_sleeps_on_the_fake_clock(clock):
+    domain = DomainThrottle('example.com', extract_rate=60, extract_burst=1)
+    assert domain.wait('extract')
+    assert domain.wait('extract')
+    assert clock.slept == [pytest.approx(1)]
+
+
+def test_backoff_doubles_up_to_the_cap(clock):
+    domain = DomainThrottle('example.com', rate_limit_sleep=100, backoff_multiplier=2.0, backoff_max=500)
+    assert [domain.rate_limited()[1] for _ in range(5)] == [100, 200, 400, 500, 500]
+    assert domain.rate_limit_count == 5
+    assert domain.cooling_down() == 500
+
+
+def test_backoff_disabled_keeps_the_base_sleep(clock):
+    domain = DomainThrottle('example.com', rate_limit_sleep=100, backoff_enabled=False)
+    assert [domain.rate_limited()[1] for _ in range(3)] == [100, 100, 100]
+
+
+def test_cooling_down_domain_is_not_waited_out(clock):
+    domain = DomainThrottle('example.com', rate_limit_sleep=100)
+    domain.rate_limited()
+    assert domain.wait() is False
+    assert clock.slept == []
+    clock.now += 99
+    assert domain.wait('extract') is False
+    clock.now += 1
+    assert domain.cooling_down() == 0
+    assert domain.wait('extract') is True
+
+
+def test_rate_limits_halve_the_rates_down_to_the_floor(clock):
+    domain = DomainThrottle('example.com', extract_rate=60, download_rate=6)
+    for _ in range(5):
+        domain.rate_limited()
+    assert domain.buckets['extract'].scale == DomainThrottle.MIN_RATE_SCALE
+    assert domain.buckets['download'].scale == DomainThrottle.MIN_RATE_SCALE
+
+
+def test_success_resets_backoff_and_recovers_rates_gradually(clock):
+    domain = DomainThrottle('example.com', rate_limit_sleep=100, backoff_max=3600)
+    domain.rate_limited()
+    domain.rate_limited()
+    assert domain.buckets['extract'].scale == 0.25
+    clock.now += 200
+
+    assert domain.succeeded('extract') is True
+    assert domain.rate_limit_count == 0
+    assert domain.current_backoff == 100
+    assert domain.buckets['extract'].scale == pytest.approx(0.35)
+    # The next rate limit starts over at the base sleep
+    assert domain.rate_limited() == (1, 100)
+    clock.now += 100
+
+    for _ in range(20):
+        domain.succeeded('extract')
+    assert domain.buckets['extract'].scale == 1.0
+    assert domain.buckets['download'].scale == 1.0
+    assert domain.succeeded('extract') is False
+
+
+def test_download_delay_spaces_downloads(clock):
+    domain = DomainThrottle('example.com', download_delay=30)
+    assert domain.wait()
+    domain.succeeded()
+    assert domain.wait()
+    assert clock.slept == [30]
@@ -0,0 +1,129 @@
+import os
+import errno
+import pytest
+import utils
+from utils import move_into_library, prune_empty_dirs, title_pattern
+
+
+@pytest.fixture
+def cross_device(monkeypatch):
+    """os.replace() that fails like a rename across filesystems unless
+    it is renaming a ``.partial`` file; records every rename"""
+    replace = os.replace
+    renames = []
+
+    def fake_replace(src, dest):
+        renames.append((str(src), str(dest)))
+        if not str(src).endswith('.partial'):
+            raise OSError(errno.EXDEV, 'Invalid cross-device link')
+        replace(src, dest)
+    monkeypatch.setattr(utils.os, 'replace', fake_replace)
+    return renames
+
+
+def test_move_renames_on_the_same_filesystem(tmp_path):
+    src = tmp_path / 'scratch' / 'ep.mkv'
+    src.parent.mkdir()
+    src.write_bytes(b'video')
+    dest = tmp_path / 'library' / 'Season 1' / 'ep.mkv'
+    move_into_library(str(src), str(dest))
+    assert dest.read_bytes() == b'video'
+    assert not src.exists()
+
+
+def test_move_across_filesystems_copies_through_a_partial_file(tmp_path, cross_device):
+    src = tmp_path / 'ep.mkv'
+    src.write_bytes(b'video')
+    dest = tmp_path / 'library' / 'ep.mkv'
+    move_into_library(str(src), str(dest))
+    assert dest.read_bytes() == b'video'
+    assert not src.exists()
+    assert cross_device == [(str(src), str(dest)), (str(dest) + '.partial', str(dest))]
+    assert os.listdir(dest.parent) == ['ep.mkv']
+
+
+def test_failed_copy_leaves_no_partial_file(tmp_path, cross_device, monkeypatch):
+    src = tmp_path / 'ep.mkv'
+    src.write_bytes(b'video')
+    dest = tmp_path / 'library' / 'ep.mkv'
+
+    def copyfile(src, dest):
+        with open(dest, 'wb') as f:
+            f.write(b'vi')
+        raise OSError(errno.ENOSPC, 'No space left on device')
+    monkeypatch.setattr(utils.shutil, 'copyfile', copyfile)
+    with pytest.raises(OSError):
+        move_into_library(str(src), str(dest))
+    assert src.read_bytes() == b'video'
+    assert os.listdir(dest.parent) == []
+
+
+def test_prune_removes_empty_parents_up_to_the_root(tmp_path):
+    season = tmp_path / 'scratch' / 'sonarr_root' / 'Show' / 'Season 1'
+    season.mkdir(parents=True)
+    (tmp_path / 'scratch' / 'sonarr_root' / 'Other Show').mkdir()
+    prune_empty_dirs(str(season), str(tmp_path / 'scratch'))
+    assert not (tmp_path / 'scratch' / 'sonarr_root' / 'Show').exists()
+    # Stops at the first directory that isn't empty, and never removes root
+    assert (tmp_path / 'scratch' / 'sonarr_root' / 'Other Show').is_dir()
+    prune_empty_dirs(str(tmp_path / 'scratch' / 'sonarr_root' / 'Other Show'), str(tmp_path / 'scratch'))
+    assert os.listdir(tmp_path / 'scratch') == []
+
+
+def test_prune_leaves_directories_outside_the_root_alone(tmp_path):
+    (tmp_path / 'scratch').mkdir()
+    outside = tmp_path / 'scratch-other' / 'Show'
+    outside.mkdir(parents=True)
+    prune_empty_dirs(str(outside), str(tmp_path / 'scratch'))
+    assert outside.is_dir()
+    partial = tmp_path / 'scratch' / 'Show'
+    partial.mkdir()
+    (partial / 'ep.mkv.part').write_bytes(b'')
+    prune_empty_dirs(str(partial), str(tmp_path / 'scratch'))
+    assert partial.is_dir()
+
+
+@pytest.mark.parametrize('title, video', [
+    # Punctuation is optional either way round
+    ("Don't Stop!", 'DONT STOP'),
+    ("Don't Stop!", 'Don’t Stop'),
+    ('Don’t Stop', "don't stop!"),
+    ('Who? What.', 'Who What'),
+    ('Part 1: The Start', 'Part 1 The Start'),
+    ('Salt, Fat, Acid', 'Salt Fat Acid'),
+    ("The Chef's Table", 'The Chefs Table'),
+    ('The Chefs Table', 'The Chef’s Table'),
+    ('Cake and Bread', 'Cake & Bread'),
+    ('Cake  and Bread', 'CAKE AND BREAD'),
+    ('Great Britain', 'GreatBritain'),
+    ('Season (2024)', 'Season'),
+    ('Season (2024)', 'Season 2024'),
+    # Regex metacharacters are literal
+    ('1+1=2', '1+1=2'),
+    ('C++ [Live] $5 ^ |x|', 'C++ [Live] $5 ^ |x|'),
+    ('Back\\slash {2} *', 'back\\slash {2} *'),
+    # Decorated and bracketed YouTube titles
+    ('Episode 3', 'Show Name | Episode 3 | Official Video'),
+    ('Episode 3', '【Official】Episode 3 (Full Episode) [HD]'),
+    ('The Finale', '🔴 THE FINALE 🔴 #shorts'),
+    ('Ep. 3', 'EP 3 - The Title'),
+])
+def test_title_pattern_matches(title, video):
+    assert title_pattern(title).search(video)
+
+
+@pytest.mark.parametrize('title, video', [
+    ('1+1=2', '11=2'),
+    ('a.b', 'axb'),
+    ('x*', 'xxxx'),
+    ('a{2}', 'aa'),
+    ('C++ [Live]', 'C [Live]'),
+    ('Cake and Bread', 'Cake or Bread'),
+    ('Cafe', 'Café'),
+])
+def test_title_pattern_does_not_match(title, video):
+    assert not title_pattern(title).search(video)
+
+
+def test_title_pattern_is_compiled_once():
+    assert title_pattern('Episode 3') is title_pattern('Episode 3')
@@ -0,0 +1,36 @@
+import os
+import time
+import signal
+
+
+def test_wake_cuts_the_wait_short_once(harvester):
+    wakeup = harvester.Wakeup()
+    assert wakeup.wait(0) is False
+    wakeup.wake()
+    wakeup.wake()
+    start = time.time()
+    assert wakeup.wait(5) is True
+    assert time.time() - start < 1
+    # Both wake-ups were drained
+    assert wakeup.wait(0) is False
+
+
+def test_a_signal_wakes_the_loop_through_the_wakeup_fd(harvester):
+    wakeup = harvester.Wakeup()
+    received = []
+    previous_fd = signal.set_wakeup_fd(wakeup.write_fd)
+    previous = signal.signal(signal.SIGHUP, lambda signum, frame: received.append(signum))
+    try:
+        os.kill(os.getpid(), signal.SIGHUP)
+        assert wakeup.wait(5) is True
+    finally:
+        signal.signal(signal.SIGHUP, previous)
+        signal.set_wakeup_fd(previous_fd)
+    assert received == [signal.SIGHUP]
+
+
+def test_the_pipe_never_blocks_a_waker(harvester):
+    wakeup = harvester.Wakeup()
+    for _ in range(100000):
+        wakeup.wake()
+    assert wakeup.wait(0) is True
@@ -0,0 +1,73 @@
+import json
+import pytest
+import requests
+from conftest import FakeSession
+
+PAGE = {'page': 1, 'pageSize': 250, 'totalRecords': 1, 'records': [
+    {'id': 11, 'seriesId': 1, 'seasonNumber': 1, 'episodeNumber': 1, 'title': 'Pilot',
+     'airDateUtc': '2020-01-01T00:00:00Z', 'monitored': True, 'hasFile': False},
+]}
+
+
+def wanted_missing(answer):
+    return FakeSession({'/wanted/missing': answer})
+
+
+@pytest.fixture(params=[False, True], ids=['json', 'stream_json'])
+def sonarr(request, client):
+    client.stream_json = request.param
+    client.sonarr_wanted_missing = True
+    return client
+
+
+@pytest.mark.parametrize('wanted', [
+    (404, 'Not Found'),
+    (200, '{"page": 1, "totalRecords": 0}'),
+    (200, '[]'),
+])
+def test_missing_endpoint_is_switched_off(sonarr, wanted):
+    sonarr.session = wanted_missing(wanted)
+    assert sonarr.get_wanted_missing({1}) is None
+    sonarr.getseriesepisodes([{'id': 1, 'title': 'Test Show'}])
+    assert sonarr.sonarr_wanted_missing is False
+
+
+@pytest.mark.parametrize('wanted', [
+    (503, 'Service Unavailable'),
+    requests.ConnectionError('Connection refused'),
+])
+def test_failed_request_falls_back_for_one_scan(sonarr, wanted):
+    sonarr.session = wanted_missing(wanted)
+    with pytest.raises(requests.RequestException):
+        sonarr.get_wanted_missing({1})
+    sonarr.session.paths.clear()
+    sonarr.getseriesepisodes([{'id': 1, 'title': 'Test Show'}])
+    assert sonarr.sonarr_wanted_missing is True
+    assert any(path.endswith('/episode') for path in sonarr.session.paths)
+
+
+def test_wanted_missing_page(sonarr):
+    sonarr.session = wanted_missing((200, json.dumps(PAGE)))
+    wanted = sonarr.get_wanted_missing({1})
+    assert [eps['id'] for eps in wanted[1]] == [11]
+
+
+def test_negative_offset_widens_the_calendar_window(harvester, sonarr):
+    # Airs in a day, but the series is released two days early
+    airs = harvester.datetime.now(harvester.timezone.utc) + harvester.timedelta(days=1)
+    episode = {'id': 21, 'seriesId': 2, 'seasonNumber': 1, 'episodeNumber': 2, 'title': 'Early',
+               'airDateUtc': airs.strftime(harvester.date_format), 'monitored': True, 'hasFile': False}
+    windows = []
+
+    def get_calendar(series_ids, start, end):
+        windows.append(end - start)
+        return {2: [episode]} if start < airs.replace(tzinfo=None) <= end else {}
+    sonarr.get_calendar = get_calendar
+    sonarr.session = wanted_missing((200, json.dumps(dict(PAGE, totalRecords=0, records=[]))))
+    series = [
+        {'id': 1, 'title': 'Test Show'},
+        {'id': 2, 'title': 'Early Show', 'offset': {'days': '-2', 'hours': '-1'}},
+    ]
+    needed = sonarr.getseriesepisodes(series)
+    assert windows[0] >= harvester.timedelta(days=2, hours=1)
+    assert [eps['id'] for eps in needed] == [21]
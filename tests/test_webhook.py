@@ -0,0 +1,74 @@
+import json
+import base64
+import pytest
+from conftest import FakeSession
+
+EVENT = {'eventType': 'SeriesAdd', 'series': {'id': 1, 'title': 'Test Show'}}
+
+
+def basic(password, user='sonarr'):
+    return {'Authorization': 'Basic ' + base64.b64encode('{}:{}'.format(user, password).encode('utf-8')).decode('ascii')}
+
+
+@pytest.fixture
+def webhook(client):
+    client.webhook = True
+    client.webhook_password = None
+    return client
+
+
+@pytest.mark.parametrize('password', ['1234', 'pässwörd'])
+def test_password_accepted(webhook, password):
+    webhook.webhook_password = password
+    assert webhook.webhookevent(basic(password), json.dumps(EVENT).encode('utf-8'))[0] == 202
+    assert webhook.queuedharvests() == {1}
+
+
+@pytest.mark.parametrize('headers', [
+    {},
+    {'Authorization': 'Bearer 1234'},
+    {'Authorization': 'Basic not-base64!'},
+    basic('12345'),
+    basic('pässwörd'),
+])
+def test_password_rejected(webhook, headers):
+    webhook.webhook_password = '1234'
+    assert webhook.webhookevent(headers, json.dumps(EVENT).encode('utf-8'))[0] == 401
+    assert webhook.queuedharvests() == set()
+
+
+@pytest.mark.parametrize('body', [b'', b'{not json', b'[1, 2]', b'"SeriesAdd"'])
+def test_bad_json(webhook, body):
+    assert webhook.webhookevent({}, body)[0] == 400
+
+
+@pytest.mark.parametrize('event', [
+    {'eventType': 'Test'},
+    {'eventType': 'Grab', 'series': {'id': 1}},
+    {'eventType': 'SeriesAdd'},
+    {'eventType': 'SeriesAdd', 'series': {'title': 'No id'}},
+])
+def test_ignored_events(webhook, event):
+    assert webhook.webhookevent({}, json.dumps(event).encode('utf-8'))[0] == 200
+    assert webhook.queuedharvests() == set()
+
+
+def test_episode_file_delete_queues_a_harvest(webhook):
+    event = {'eventType': 'EpisodeFileDelete', 'series': {'id': 7, 'title': 'Other Show'}}
+    assert webhook.webhookevent({}, json.dumps(event).encode('utf-8'))[0] == 202
+    assert webhook.queuedharvests() == {7}
+
+
+def test_numeric_password_from_config(harvester, client, monkeypatch):
+    cfg = harvester.checkconfig()
+    cfg['streamharvestarr'] = dict(cfg['streamharvestarr'], webhook='true', webhook_password=1234)
+    monkeypatch.setattr(harvester, 'checkconfig', lambda: cfg)
+    client.loadconfig()
+    assert client.webhook_password == '1234'
+    assert client.webhookevent(basic('1234'), json.dumps(EVENT).encode('utf-8'))[0] == 202
+
+
+def test_harvest_survives_a_failing_sonarr(harvester, client):
+    client.session = FakeSession({'/series/1': (503, '{"message": "Service Unavailable"}')})
+    harvester.harvest(client, {1})
+    assert any(path.endswith('/series/1') for path in client.session.paths)
@@ -0,0 +1,43 @@
+import os
+import sys
+import subprocess
+import yt_dlp
+from conftest import APP_DIR
+from ytdl import allowed_extractors, youtubedl
+
+STARTUP = '''
+import sys
+sys.path.insert(0, {app!r})
+sys.argv = ['stream_harvestarr.py']
+import stream_harvestarr
+stream_harvestarr.StreamHarvester()
+print('yt_dlp' in sys.modules)
+'''
+
+
+def test_starting_the_app_does_not_import_yt_dlp(tmp_path):
+    config = tmp_path / 'config.yml'
+    with open(os.environ['CONFIGPATH']) as f:
+        config.write_text(f.read())
+    result = subprocess.run(
+        [sys.executable, '-c', STARTUP.format(app=APP_DIR)],
+        env=dict(os.environ, CONFIGPATH=str(config)),
+        capture_output=True, text=True, timeout=60, check=True,
+    )
+    assert result.stdout.strip() == 'False'
+
+
+def test_known_ie_key_sets_up_only_that_extractor():
+    with youtubedl({'quiet': True}, 'Youtube') as ydl:
+        assert isinstance(ydl, yt_dlp.YoutubeDL)
+        assert list(ydl._ies) == ['Youtube']
+        assert ydl.params['allowed_extractors'] == allowed_extractors('Youtube')
+
+
+def test_unknown_ie_key_falls_back_to_every_extractor():
+    assert allowed_extractors('NoSuchExtractor') is None
+    with youtubedl({'quiet': True}, 'NoSuchExtractor') as ydl:
+        assert type(ydl) is yt_dlp.YoutubeDL
+        assert 'allowed_extractors' not in ydl.params
+        assert len(ydl._ies) > 1
+        assert 'Youtube' in ydl._ies
@@ -0,0 +1,98 @@
+import yt_dlp
+from conftest import FakeYoutubeDL
+from playlist import playlist_entry
+from throttle import DomainThrottle
+
+
+def rate_limited_ydl(params, ie_key=None, ydl_class=None):
+    """Crawls fail the way yt-dlp reports a 429 from the site"""
+    error = yt_dlp.utils.DownloadError('ERROR: [youtube:tab] test: HTTP Error 429: Too Many Requests')
+    return FakeYoutubeDL(default=error, params=params)
+
+
+def test_rate_limited_crawl_backs_off_the_site(harvester, client, monkeypatch):
+    monkeypatch.setattr(harvester, 'youtubedl', rate_limited_ydl)
+    rate_limited = []
+    original = DomainThrottle.rate_limited
+
+    def record(throttle):
+        rate_limited.append(throttle.domain)
+        return original(throttle)
+    monkeypatch.setattr(DomainThrottle, 'rate_limited', record)
+
+    playlist = 'https://www.youtube.com/@test'
+    assert client.ytindex(client.ytdl_eps_search_opts(), playlist) is None
+    assert rate_limited == ['youtube.com']
+    assert client.throttle_for(playlist).cooling_down() > 0
+    assert client.store.domain_backoff('youtube.com')['rate_limit_count'] == 1
+
+
+def test_crawl_options_let_errors_raise(client):
+    assert not client.ytdl_eps_search_opts().get('ignoreerrors')
+
+
+def test_missing_from_a_stale_index_is_not_a_miss(harvester, client, monkeypatch):
+    monkeypatch.setattr(harvester, 'youtubedl', rate_limited_ydl)
+    playlist = 'https://www.youtube.com/@test'
+    client.store.save_playlist(playlist, [playlist_entry(
+        {'id': 'c', 'title': 'Episode 3', 'url': 'https://www.youtube.com/watch?v=c'}
+    )], True)
+    series = [{'id': 1, 'title': 'Test Show', 'url': playlist, 'playlistreverse': True}]
+    episodes = [
+        {'id': 11, 'seriesId': 1, 'title': 'Episode 4'},
+        {'id': 12, 'seriesId': 1, 'title': 'Episode 3'},
+    ]
+    # First the crawl is rate limited, then the site is skipped while it
+    # cools down; both times only the cached entries are matched
+    for _ in range(2):
+        jobs = client.findepisodes(series, episodes)
+        assert [job['episode']['id'] for job in jobs] == [12]
+    attempts = client.store.episode_attempts([11, 12])
+    assert 11 not in attempts
+    assert attempts[12]['last_result'] == 'found'
+    assert client.next_due == client.throttle_for(playlist).blocked_until
+
+
+def test_failed_full_refresh_falls_back_to_cached_entries(harvester, client, monkeypatch):
+    error = yt_dlp.utils.DownloadError('ERROR: [youtube:tab] test: This channel does not exist')
+    monkeypatch.setattr(harvester, 'youtubedl',
+                        lambda params, ie_key=None, ydl_class=None: FakeYoutubeDL(default=error, params=params))
+    playlist = 'https://www.youtube.com/@test'
+    client.store.save_playlist(playlist, [playlist_entry(
+        {'id': 'c', 'title': 'Episode 3', 'url': 'https://www.youtube.com/watch?v=c'}
+    )], True)
+    # Full refresh due on every crawl
+    client.playlist_full_refresh = 0
+    index = client.ytindex(client.ytdl_eps_search_opts(), playlist)
+    assert index.stale
+    assert [entry['id'] for entry in index.entries] == ['c']
+    assert client.ytindex(client.ytdl_eps_search_opts(), playlist, cache=False) is None
+
+
+def test_series_can_opt_out_of_incremental_crawls(harvester, client, monkeypatch):
+    # Oldest first: the new upload is at the bottom
+    playlist = 'https://www.youtube.com/playlist?list=PLtest'
+    entries = [{'_type': 'url', 'id': video_id, 'title': 'Episode {}'.format(n),
+                'url': 'https://www.youtube.com/watch?v={}'.format(video_id)}
+               for n, video_id in enumerate(['a', 'b', 'c'], 1)]
+    ydl = FakeYoutubeDL({playlist: {'_type': 'playlist', 'extractor_key': 'YoutubeTab', 'entries': entries}})
+    monkeypatch.setattr(harvester, 'youtubedl', lambda params, ie_key=None, ydl_class=None: ydl)
+    client.playlist_cache_stop_after = 1
+    client.store.save_playlist(playlist, [playlist_entry(entry) for entry in entries[:2]], True)
+    wnt = {'title': 'Test Show', 'url': playlist, 'playlist_cache': 'False'}
+    assert client.seriesconfig(wnt)['playlist_cache'] is False
+
+    series = [dict(client.seriesconfig(wnt), id=1, title='Test Show')]
+    episodes = [{'id': 13, 'seriesId': 1, 'title': 'Episode 3'}]
+    assert [job['url'] for job in client.findepisodes(series, episodes)] == ['https://www.youtube.com/watch?v=c']
+    # Everything else still crawls incrementally and misses it
+    series[0]['playlist_cache'] = True
+    assert client.findepisodes(series, episodes) == []
+
+
+def test_playlist_cache_is_inherited_from_the_service(client):
+    client.services = {'Season Playlists': {'title': 'Season Playlists', 'url': 'https://www.youtube.com/',
+                                            'playlist_cache': 'False'}}
+    merged = client.merge_service_config({'title': 'Test Show', 'service': 'Season Playlists',
+                                          'url': 'playlist?list=PLtest'})
+    assert client.seriesconfig(merged)['playlist_cache'] is False